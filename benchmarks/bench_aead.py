@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+bench_aead.py
+
+Decrypt throughput of sealed data, ChaCha20-Poly1305, against the
+AES-CBC of older files, and how long each record file format takes to reject a wrong key
+once it has been derived.
+
+usage: python benchmarks/bench_aead.py [entries]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import passwordmanager.securestrings as securestrings
+import passwordmanager.records as records
+import passwordmanager.keyslots as keyslots
+from passwordmanager.entry import Entry
+from passwordmanager.records import IndexEntry, RecordFile
+
+SIZES = [64, 1024, 64 * 1024, 2**20] # in bytes
+TOTAL = 64 * 2**20 # bytes decrypted per size
+RUNS = 5
+
+def best(function):
+    """Return the fastest of RUNS calls of function, in seconds."""
+    times = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def throughput(key):
+    print(f"{'bytes':>8} {'cbc MB/s':>9} {'sealed MB/s':>11}")
+    for size in SIZES:
+        data = os.urandom(size)
+        count = max(1, TOTAL // size // 16)
+        encrypted = memoryview(securestrings.encrypt(data, key))
+        sealed = securestrings.seal(data, key)
+
+        def cbc():
+            for i in range(count):
+                securestrings.decrypt(encrypted[16:], key, encrypted[:16])
+
+        def unseal():
+            for i in range(count):
+                securestrings.unseal(sealed, key)
+
+        megabytes = count * size / 2**20
+        print(f"{size:>8} {megabytes / best(cbc):>9.1f} "
+              f"{megabytes / best(unseal):>11.1f}")
+
+def rejection(key, wrong, entries):
+    """Time read_index with the wrong key on a file in each format."""
+    print(f"\n{'entries':>8} {'format':>7} {'reject ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        record_file = RecordFile(os.path.join(directory, "db"))
+        for name, format in (("cbc", records.CBC_VERSION),
+                             ("sealed", records.VERSION)):
+            if format == records.CBC_VERSION:
+                write_cbc(record_file, key, entries)
+            else:
+                record_file.write(key, (
+                    (Entry(f"handle{i}", f"password{i}"), IndexEntry())
+                    for i in range(entries)), keyslots.make_table([]))
+
+            def reject():
+                try:
+                    record_file.read_index(wrong)
+                except ValueError:
+                    return
+                raise AssertionError("wrong key accepted")
+
+            print(f"{entries:>8} {name:>7} {best(reject) * 1000:>10.3f}")
+
+def write_cbc(record_file, key, entries):
+    """Write an old AES-CBC file of entries, as version 3 did."""
+    index = {}
+    with open(record_file.filename, "wb") as fo:
+        fo.write(key.header(records.CBC_VERSION, check=False))
+        for i in range(entries):
+            offset = fo.tell()
+            index[f"handle{i}"] = IndexEntry(0, offset, write_frame(
+                fo, key, records.RECORD,
+                Entry(f"handle{i}", f"password{i}").pack()))
+        position = fo.tell()
+        write_frame(fo, key, records.INDEX,
+                    records.pack_index(index, frecency=False))
+        fo.write(records.TRAILER.pack(records.TRAILER_MAGIC, position))
+
+def write_frame(fo, key, kind, data):
+    payload = securestrings.encrypt(data, key)
+    fo.write(records.FRAME.pack(len(payload), kind))
+    fo.write(payload)
+    return records.FRAME.size + len(payload)
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 10000
+    securestrings.SCRYPT_LOG_N = 10
+    key = securestrings.derive_key("bench_master")
+    wrong = securestrings.derive_key("wrong_master", key.salt)
+    throughput(key)
+    rejection(key, wrong, entries)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+bench_agent.py
+
+Lookup latency through a running agent against starting a new
+interpreter that unlocks the database, as pman does without an agent.
+
+usage: python benchmarks/bench_agent.py [entries]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import subprocess
+
+import passwordmanager.agent as agent
+from passwordmanager.database import Database
+from passwordmanager.controller import MainController
+
+MASTER = "bench_master"
+REQUESTS = 200
+COLD_RUNS = 5
+
+COLD = """
+import sys
+from passwordmanager.database import Database
+Database(sys.argv[1]).get_password("handle0", sys.argv[2])
+"""
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 1000
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchdb")
+        Database(filename).save(
+            {f"handle{i}": [0, f"password{i}"] for i in range(entries)}, MASTER)
+
+        start = time.perf_counter()
+        for i in range(COLD_RUNS):
+            subprocess.run([sys.executable, "-c", COLD, filename, MASTER],
+                           check=True)
+        cold = (time.perf_counter() - start) / COLD_RUNS
+
+        controller = MainController()
+        controller.db = Database(filename)
+        path = os.path.join(directory, "agent.sock")
+        server = agent.Agent(path, controller=controller)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        message = {"op": "password", "handle": "handle0"}
+        agent.request(dict(message, master=MASTER), path)
+        start = time.perf_counter()
+        for i in range(REQUESTS):
+            agent.request(message, path)
+        warm = (time.perf_counter() - start) / REQUESTS
+        server.shutdown()
+        server.server_close()
+
+    print(f"{entries} entries, ms per lookup")
+    print(f"  new interpreter: {cold*1000:10.2f}")
+    print(f"  agent:           {warm*1000:10.2f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
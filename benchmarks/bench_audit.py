@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""
+bench_audit.py
+
+Time to audit a vault: the first audit, which decrypts every record,
+an audit of the unchanged vault, and one after a few passwords change.
+
+usage: python benchmarks/bench_audit.py [entries]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+from passwordmanager.database import Database
+from passwordmanager.password_creator import PasswordCreator
+
+ENTRIES = 100000
+CHANGED = 100
+MASTER = "bench_master"
+
+def measure(function):
+    """Return function's result and the seconds it took."""
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else ENTRIES
+    rng = random.Random(count)
+    creator = PasswordCreator()
+    passwords = creator.create_many((16, True, True, True), count)
+    for i in rng.sample(range(count), count // 100):
+        passwords[i] = passwords[0]
+    for i in rng.sample(range(count), count // 100):
+        passwords[i] = f"password{i % 100}"
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "benchdb"))
+        db.save({f"handle{i}": [0, password]
+                 for i, password in enumerate(passwords)}, MASTER)
+        session = db.unlock(MASTER)
+        results = []
+        report, seconds = measure(session.audit)
+        results.append(("first", seconds))
+        results.append(("unchanged", measure(session.audit)[1]))
+        session.add_handles({f"handle{i}": f"changed{i}"
+                             for i in rng.sample(range(count), CHANGED)})
+        results.append((f"{CHANGED} changed", measure(session.audit)[1]))
+        session.lock(flush=False)
+
+    print(f"{count} entries: {len(report['reused'])} reused groups, "
+          f"{len(report['weak'])} weak")
+    for name, seconds in results:
+        print(f"{name:>12} {seconds * 1000:>9.1f} ms")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+"""
+bench_breach.py
+
+Converting a binary SHA-1 dump to a breach corpus, and checking
+passwords against it: time per lookup, the memory the process allocates
+doing so, and the pages of the mapped corpus brought in, which are page
+cache the kernel can take back and may come in large folios.
+
+usage: python benchmarks/bench_breach.py [hashes] [lookups]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+from passwordmanager import breach
+
+HASHES = 10000000
+LOOKUPS = 10000
+CHUNK = 100000 # hashes generated at once
+
+def write_dump(fo, count, rng):
+    """Write count sorted random SHA-1 sized hashes to fo, spread evenly
+    so they are sorted without sorting them."""
+    step = 2 ** 160 // count
+    for start in range(0, count, CHUNK):
+        fo.write(b"".join((i * step + rng.randrange(step)).to_bytes(20, "big")
+                          for i in range(start, min(start + CHUNK, count))))
+
+def resident():
+    """Return (private, file backed) resident memory of the process in
+    bytes, or None where /proc doesn't say."""
+    try:
+        with open("/proc/self/status") as fo:
+            fields = dict(line.split(":", 1) for line in fo)
+        return tuple(int(fields[name].split()[0]) * 1024
+                     for name in ("RssAnon", "RssFile"))
+    except (OSError, KeyError, ValueError):
+        return None
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else HASHES
+    lookups = int(argv[2]) if len(argv) > 2 else LOOKUPS
+    rng = random.Random(count)
+    with tempfile.TemporaryDirectory() as directory:
+        dump = os.path.join(directory, "dump.bin")
+        path = os.path.join(directory, "corpus")
+        with open(dump, "wb") as fo:
+            write_dump(fo, count, rng)
+        start = time.perf_counter()
+        with open(dump, "rb") as fo:
+            breach.convert(fo, path, binary=True)
+        convert = time.perf_counter() - start
+        os.remove(dump)
+
+        passwords = [f"vault password {i}" for i in range(lookups)]
+        before = resident()
+        with breach.Corpus(path) as corpus:
+            start = time.perf_counter()
+            found = sum(password in corpus for password in passwords)
+            miss = (time.perf_counter() - start) / lookups
+            after = resident()
+            hits = [corpus.map[breach.HEADER.size + i * corpus.size:
+                               breach.HEADER.size + (i + 1) * corpus.size]
+                    for i in rng.sample(range(count), lookups)]
+            start = time.perf_counter()
+            found += sum(corpus.has_digest(sha1) for sha1 in hits)
+            hit = (time.perf_counter() - start) / lookups
+        size = os.path.getsize(path)
+
+    print(f"{count} hashes, corpus {size / 2 ** 20:.0f} MiB, converted in "
+          f"{convert:.1f} s")
+    print(f"lookup: {miss * 1e6:.1f} us not breached, {hit * 1e6:.1f} us "
+          f"breached, {found - lookups} false matches")
+    if before is not None:
+        private, mapped = (now - then for now, then in zip(after, before))
+        print(f"resident memory added by {lookups} lookups: "
+              f"{private / 2 ** 20:.1f} MiB private, "
+              f"{mapped / 2 ** 20:.1f} MiB of mapped corpus")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
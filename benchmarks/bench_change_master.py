@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+"""
+bench_change_master.py
+
+Time to change the master password at several database sizes, by
+rewrapping the data key in its slot and by re-encrypting everything
+under a new data key (rekey, how every change worked before key slots).
+The key derivation for the new master is included in both.
+
+usage: python benchmarks/bench_change_master.py [entries...]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import passwordmanager.securestrings as securestrings
+from passwordmanager.database import Database
+
+SIZES = [100, 1000, 10000, 50000]
+MASTERS = ("bench_master", "other_master")
+RUNS = 3
+
+def best(session, rekey):
+    """Return the fastest of RUNS master changes in seconds, swapping
+    between MASTERS."""
+    times = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        session.change_master(MASTERS[(i + 1) % 2], rekey)
+        times.append(time.perf_counter() - start)
+    session.change_master(MASTERS[0], rekey)
+    return min(times)
+
+def main(argv):
+    sizes = [int(size) for size in argv[1:]] or SIZES
+    securestrings.SCRYPT_LOG_N = 10
+    print(f"{'entries':>8} {'slot ms':>8} {'rekey ms':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for entries in sizes:
+            db = Database(os.path.join(directory, f"db{entries}"))
+            db.save({f"handle{i}": [0, f"password{i}"]
+                     for i in range(entries)}, MASTERS[0])
+            session = db.unlock(MASTERS[0])
+            slot = best(session, False)
+            rekey = best(session, True)
+            session.lock(flush=False)
+            print(f"{entries:>8} {slot * 1000:>8.2f} {rekey * 1000:>9.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
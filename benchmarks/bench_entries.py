@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+bench_entries.py
+
+Decoding and memory of the index and records: the packed formats
+against the same data as JSON.
+
+usage: python benchmarks/bench_entries.py [entries...]
+"""
+
+import sys
+import json
+import time
+import tracemalloc
+
+from passwordmanager.entry import Entry
+from passwordmanager.records import IndexEntry, pack_index, unpack_index
+
+SIZES = [10000, 100000]
+RUNS = 5
+
+def best(function):
+    """Return the fastest of RUNS calls of function, in seconds."""
+    times = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def memory(function):
+    """Return the bytes still allocated by the result of function."""
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+def main(argv):
+    sizes = [int(arg) for arg in argv[1:]] or SIZES
+    print(f"{'entries':>8} {'':>6} {'json ms':>8} {'packed ms':>9} "
+          f"{'json B/entry':>12} {'packed B/entry':>14}")
+    for entries in sizes:
+        handles = [f"site{i}.example.com" for i in range(entries)]
+        index = {handle: IndexEntry(i % 50, 64 * i, 64, 1.6e9 + i)
+                 for i, handle in enumerate(handles)}
+        as_json = json.dumps({handle: [entry.popularity, entry.offset,
+                                       entry.length]
+                              for handle, entry in index.items()}).encode()
+        packed = pack_index(index)
+
+        record = Entry("site.example.com", "correct horse battery",
+                       "me@example.com", "https://site.example.com",
+                       tags=["web"], created=1.6e9, modified=1.6e9)
+        record_json = json.dumps({name: getattr(record, name)
+                                  for name in Entry.__slots__}).encode()
+        record_packed = record.pack()
+
+        rows = [
+            ("index",
+             best(lambda: json.loads(as_json)), best(lambda: unpack_index(packed)),
+             memory(lambda: json.loads(as_json)) / entries,
+             memory(lambda: unpack_index(packed)) / entries),
+            ("record",
+             best(lambda: [Entry(**json.loads(record_json))
+                           for i in range(entries)]),
+             best(lambda: [Entry.unpack(record_packed)
+                           for i in range(entries)]),
+             len(record_json), len(record_packed)),
+        ]
+        for name, json_time, packed_time, json_size, packed_size in rows:
+            print(f"{entries:>8} {name:>6} {json_time * 1000:>8.1f} "
+                  f"{packed_time * 1000:>9.1f} {json_size:>12.0f} "
+                  f"{packed_size:>14.0f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+"""
+bench_frecency.py
+
+Cost of listing handles best first after each action: sorting every
+(popularity, handle) pair, as the controller did, against the frecency
+ranking the session keeps in order, for the top 20 handles and for all
+of them, and the cost of keeping it in order as handles are used.
+
+usage: python benchmarks/bench_frecency.py [handles]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import statistics
+
+from passwordmanager.database import Database
+
+HANDLES = 100000
+RUNS = 50
+TOP = 20
+MASTER = "bench_master"
+
+def median_ms(function, runs=RUNS):
+    """Return the median time of function in milliseconds."""
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else HANDLES
+    rng = random.Random(count)
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "benchdb"))
+        db.save({f"handle{i}": [rng.randrange(100), f"password{i}"]
+                 for i in range(count)}, MASTER)
+        session = db.unlock(MASTER)
+        names = [f"handle{i}" for i in range(count)]
+
+        def sort():
+            handles = session.get_handles()
+            handles.sort(reverse=True)
+            return [handle for popularity, handle in handles]
+
+        now = time.time()
+        results = [
+            ("sort all", median_ms(sort)),
+            (f"top {TOP}", median_ms(lambda: session.top(TOP))),
+            ("top all", median_ms(lambda: session.top())),
+            ("bump", median_ms(lambda: session.ranking.bump(
+                                   rng.choice(names), now), RUNS * 100)),
+            ("lookup", median_ms(lambda: session.get_password(
+                                     rng.choice(names)), RUNS * 10)),
+        ]
+        session.lock(flush=False)
+
+    print(f"{count} handles, median ms")
+    for name, ms in results:
+        print(f"{name:>10} {ms:>9.4f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
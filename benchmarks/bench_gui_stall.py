@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""
+bench_gui_stall.py
+
+Main loop stall per GUI operation: calling the controller directly on
+the main loop, as the GUI used to, against running it through Worker.
+A stand in main loop replaces Tk so no display is needed.
+
+usage: python benchmarks/bench_gui_stall.py [entries]
+"""
+
+import os
+import sys
+import time
+import heapq
+import tempfile
+import itertools
+
+from passwordmanager.database import Database
+from passwordmanager.controller import MainController
+from passwordmanager.worker import Worker
+
+MASTER = "bench_master"
+OPTIONS = [16, 1, 1, 1]
+
+class Loop(object):
+    """Runs callbacks scheduled with after, recording the longest."""
+    def __init__(self):
+        self.queue = []
+        self.order = itertools.count()
+        self.stall = 0
+
+    def after(self, delay, callback):
+        heapq.heappush(self.queue, (time.monotonic() + delay / 1000,
+                                    next(self.order), callback))
+
+    def call(self, callback, *args):
+        start = time.perf_counter()
+        callback(*args)
+        self.stall = max(self.stall, time.perf_counter() - start)
+
+    def run(self, until):
+        while not until():
+            if self.queue and self.queue[0][0] <= time.monotonic():
+                self.call(heapq.heappop(self.queue)[2])
+            else:
+                time.sleep(0.0005)
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "benchdb"))
+        db.save({f"handle{i}": [0, f"password{i}"] for i in range(entries)},
+                MASTER)
+        controller = MainController()
+        controller.db = db
+        controller._copy_to_clipboard = lambda password: None
+        operations = (
+            ("unlock", lambda: controller.list(MASTER)),
+            ("get", lambda: controller.get_password("handle1", MASTER)),
+            ("create", lambda: controller.create("new", OPTIONS, MASTER)),
+            ("delete", lambda: controller.delete("new", MASTER)),
+        )
+
+        stalls = {}
+        for mode in ("direct", "worker"):
+            controller.lock()
+            for name, operation in operations:
+                loop = Loop()
+                if mode == "direct":
+                    loop.call(operation)
+                else:
+                    worker = Worker(loop.after, poll_interval=5)
+                    done = []
+                    loop.call(worker.submit, operation, (), done.append)
+                    loop.run(lambda: done)
+                    worker.shutdown()
+                stalls[name, mode] = loop.stall
+
+    print(f"{entries} entries, longest main loop stall in ms")
+    print(f"{'':>8} {'direct':>8} {'worker':>8}")
+    for name, operation in operations:
+        print(f"{name:>8} {stalls[name, 'direct']*1000:>8.2f} "
+              f"{stalls[name, 'worker']*1000:>8.2f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""
+bench_import.py
+
+Importing a Bitwarden style CSV export into an empty database and
+exporting it again, at growing sizes. Time per entry should stay about
+the same as the number of entries grows.
+
+usage: python benchmarks/bench_import.py [entries...]
+"""
+
+import os
+import sys
+import csv
+import time
+import tempfile
+
+from passwordmanager.database import Database
+from passwordmanager.controller import MainController
+from passwordmanager.transfer import read_entries
+
+MASTER = "bench_master"
+SIZES = [1000, 10000, 100000]
+
+def write_csv(filename, entries):
+    """Write a CSV export of entries made up passwords."""
+    with open(filename, "w", newline="") as fo:
+        writer = csv.writer(fo)
+        writer.writerow(["folder", "favorite", "type", "name", "notes",
+                         "login_uri", "login_username", "login_password"])
+        for i in range(entries):
+            writer.writerow(["", "", "login", f"site{i}.example.com", "",
+                             f"https://site{i}.example.com", "me",
+                             f"password-{i:08d}"])
+
+def main(argv):
+    sizes = [int(arg) for arg in argv[1:]] or SIZES
+    print(f"{'entries':>8} {'import s':>9} {'us/entry':>9} "
+          f"{'export s':>9} {'us/entry':>9}")
+    for entries in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "export.csv")
+            write_csv(filename, entries)
+            controller = MainController()
+            controller.db = Database(os.path.join(directory, "benchdb"))
+            controller.db.create_database(MASTER)
+            controller.list(MASTER)
+
+            start = time.perf_counter()
+            report = controller.import_entries(read_entries(filename),
+                                               "skip", None)
+            imported = time.perf_counter() - start
+            assert report["added"] == entries
+
+            start = time.perf_counter()
+            with open(os.path.join(directory, "export.pman"), "wb") as fo:
+                controller.export(fo, "export", None)
+            exported = time.perf_counter() - start
+            controller.lock()
+        print(f"{entries:>8} {imported:>9.2f} {imported / entries * 1e6:>9.1f}"
+              f" {exported:>9.2f} {exported / entries * 1e6:>9.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""
+bench_kdf.py
+
+Unlock latency and per operation latency at several scrypt work factors.
+
+usage: python benchmarks/bench_kdf.py [entries]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import passwordmanager.securestrings as securestrings
+from passwordmanager.database import Database
+
+MASTER = "bench_master"
+WORK_FACTORS = (12, 14, 15, 16, 17)
+OPERATIONS = 20
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 1000
+    print(f"{entries} entries")
+    print(f"{'log2 n':>6} {'unlock ms':>10} {'add ms':>10} {'get ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "benchdb"))
+        data = {f"handle{i}": [0, f"password{i}"] for i in range(entries)}
+        for log_n in WORK_FACTORS:
+            securestrings.SCRYPT_LOG_N = log_n
+            db.save(data, MASTER)
+
+            start = time.perf_counter()
+            session = db.unlock(MASTER)
+            unlock = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(OPERATIONS):
+                session.add_handle(f"new{i}", "password")
+            add = (time.perf_counter() - start) / OPERATIONS
+
+            start = time.perf_counter()
+            for i in range(OPERATIONS):
+                session.get_password(f"handle{i}")
+            get = (time.perf_counter() - start) / OPERATIONS
+            session.lock(flush=False)
+            db.journal.clear()
+
+            print(f"{log_n:>6} {unlock*1000:>10.2f} {add*1000:>10.2f} "
+                  f"{get*1000:>10.3f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+bench_match.py
+
+Time to resolve partial and misspelled handles against many handles
+with the index built at unlock, as pman does for each lookup.
+
+usage: python benchmarks/bench_match.py [handles]
+"""
+
+import sys
+import time
+import random
+import string
+import statistics
+
+from passwordmanager.search import HandleIndex
+
+HANDLES = 50000
+RUNS = 200
+
+def handles(count):
+    """Return count random handles that look like site names."""
+    rng = random.Random(count)
+    tlds = [".com", ".org", ".net", ".co.uk"]
+    return ["".join(rng.choice(string.ascii_lowercase)
+                    for _ in range(rng.randint(4, 12))) + rng.choice(tlds)
+            for _ in range(count)]
+
+def misspell(handle, rng):
+    """Return handle with two adjacent characters swapped."""
+    i = rng.randrange(len(handle) - 1)
+    return handle[:i] + handle[i+1] + handle[i] + handle[i+2:]
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else HANDLES
+    names = handles(count)
+    popularity = {name: i % 20 for i, name in enumerate(names)}
+    start = time.perf_counter()
+    index = HandleIndex(names)
+    print(f"{count} handles, index built in "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rng = random.Random(1)
+    queries = {
+        "exact": lambda name: name,
+        "prefix": lambda name: name[:max(3, len(name) // 2)],
+        "misspelled": lambda name: misspell(name, rng),
+    }
+    for kind, make in queries.items():
+        times = []
+        found = 0
+        for name in rng.sample(names, RUNS):
+            query = make(name)
+            start = time.perf_counter()
+            matches = index.match(query, popularity.get)
+            times.append(time.perf_counter() - start)
+            found += name in [handle for score, handle in matches]
+        times.sort()
+        print(f"{kind:>10}: median {statistics.median(times) * 1000:.2f} ms, "
+              f"p95 {times[int(len(times) * 0.95)] * 1000:.2f} ms, "
+              f"found {found}/{RUNS}")
+
+if __name__ == "__main__":
+    main(sys.argv)
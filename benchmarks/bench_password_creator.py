@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+bench_password_creator.py
+
+Passwords created per second, one at a time and with create_many, for
+the lengths the GUI offers with every class selected. The previous
+rejection sampling creator, over random.choice, is timed alongside.
+
+usage: python benchmarks/bench_password_creator.py [passwords]
+"""
+
+import sys
+import time
+from random import choice
+
+from passwordmanager.password_creator import PasswordCreator, LOWER, \
+        UPPER, DIGITS, SPECIAL
+
+PASSWORDS = 20000
+LENGTHS = [8, 12, 16]
+
+def rejection(length):
+    """The previous creator: draw from the whole pool until every class
+    is present."""
+    pool = LOWER + UPPER + DIGITS + SPECIAL
+    while True:
+        password = "".join(choice(pool) for i in range(length))
+        if all(any(c in chars for c in password)
+               for chars in (LOWER, UPPER, DIGITS, SPECIAL)):
+            return password
+
+def rate(function, count):
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else PASSWORDS
+    creator = PasswordCreator()
+    print("length   rejection      create  create_many  (passwords/s)")
+    for length in LENGTHS:
+        options = [length, 1, 1, 1]
+        creator.create(options)
+        old = rate(lambda: [rejection(length) for i in range(count)], count)
+        one = rate(lambda: [creator.create(options) for i in range(count)],
+                   count)
+        many = rate(lambda: creator.create_many(options, count), count)
+        print(f"{length:6d} {old:11.0f} {one:11.0f} {many:12.0f}")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+"""
+bench_processes.py
+
+Throughput of concurrent processes sharing one database through the
+file lock, each alternating add_handle and get_password.
+
+usage: python benchmarks/bench_processes.py [operations per process]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+
+from passwordmanager.database import Database
+
+MASTER = "bench_master"
+PROCESS_COUNTS = (1, 2, 4, 8)
+
+def worker(filename, number, operations):
+    session = Database(filename).unlock(MASTER)
+    for i in range(operations):
+        if i % 2:
+            session.add_handle(f"handle{number}-{i}", "password")
+        else:
+            session.get_password("shared")
+    session.lock()
+
+def main(argv):
+    operations = int(argv[1]) if len(argv) > 1 else 200
+    context = multiprocessing.get_context("fork")
+    print(f"{'processes':>9} {'ops/s':>10} {'per process':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in PROCESS_COUNTS:
+            filename = os.path.join(directory, f"benchdb{count}")
+            Database(filename).save({"shared": [0, "password"]}, MASTER)
+            processes = [context.Process(target=worker,
+                                         args=(filename, number, operations))
+                         for number in range(count)]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            seconds = time.perf_counter() - start
+            rate = count * operations / seconds
+            print(f"{count:>9} {rate:>10.1f} {rate / count:>12.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
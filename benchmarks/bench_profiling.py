@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+bench_profiling.py
+
+Cost of the profiling hooks: a lookup in an unlocked session, and a bare
+stage, with profiling off and on.
+
+usage: python benchmarks/bench_profiling.py [lookups]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import passwordmanager.profiling as profiling
+import passwordmanager.securestrings as securestrings
+from passwordmanager.database import Database
+
+RUNS = 5
+
+def best(function, count):
+    """Return the fastest of RUNS calls of function, in microseconds per
+    one of count iterations."""
+    times = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) / count * 1e6
+
+def main(argv):
+    lookups = int(argv[1]) if len(argv) > 1 else 2000
+    securestrings.SCRYPT_LOG_N = 10
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "db"))
+        db.save({f"handle{i}": [0, f"password{i}"] for i in range(1000)},
+                "bench_master")
+        session = db.unlock("bench_master")
+
+        @profiling.operation("get_password")
+        def lookup():
+            for i in range(lookups):
+                session.get_password(f"handle{i % 1000}")
+
+        def stages():
+            for i in range(lookups):
+                with profiling.stage("read"):
+                    pass
+
+        @profiling.operation("stages")
+        def profiled_stages():
+            stages()
+
+        print(f"{'':>8} {'off us':>8} {'on us':>8}")
+        off = best(lookup, lookups), best(stages, lookups)
+        profiling.enable(os.devnull)
+        on = best(lookup, lookups), best(profiled_stages, lookups)
+        profiling.disable()
+        for name, off_time, on_time in zip(("lookup", "stage"), off, on):
+            print(f"{name:>8} {off_time:>8.2f} {on_time:>8.2f}")
+        session.lock(flush=False)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+"""
+bench_rotate.py
+
+Renewing many passwords: one save for all of them against a save per
+handle, as the GUI's Renew does. Prints the time, saves and peak Python
+memory of each, and the time of one whole vault rewrite for scale.
+
+usage: python benchmarks/bench_rotate.py [entries] [rotated]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+from passwordmanager.database import Database
+from passwordmanager.controller import MainController
+
+MASTER = "bench_master"
+OPTIONS = [16, 1, 1, 1]
+
+def measure(function):
+    """Return seconds and peak traced bytes of calling function."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 1000
+    rotated = int(argv[2]) if len(argv) > 2 else entries // 5
+    handles = [f"handle{i}" for i in range(rotated)]
+    with tempfile.TemporaryDirectory() as directory:
+        controller = MainController()
+        controller.db = Database(os.path.join(directory, "benchdb"))
+        controller.db.save({f"handle{i}": [0, f"password{i}"]
+                            for i in range(entries)}, MASTER)
+        session = controller._unlock(MASTER)
+        saves = []
+        append = controller.db.records.append
+        controller.db.records.append = \
+                lambda *args: saves.append(1) or append(*args)
+
+        def one_by_one():
+            for handle in handles:
+                session.add_handle(
+                    handle, controller.password_creator.create(OPTIONS))
+
+        results = []
+        for name, function in (
+                ("per handle", one_by_one),
+                ("rotate", lambda: controller.rotate(handles, OPTIONS, None))):
+            saves.clear()
+            seconds, peak = measure(function)
+            results.append((name, len(saves), seconds, peak))
+        rewrite = measure(lambda: controller.db.records.compact(
+                                      session.key, session.snapshot.index))
+        controller.lock()
+
+    print(f"renewing {rotated} of {entries} entries")
+    print(f"{'':>12} {'saves':>6} {'seconds':>8} {'peak KiB':>9}")
+    for name, count, seconds, peak in results:
+        print(f"{name:>12} {count:>6} {seconds:>8.3f} {peak / 1024:>9.0f}")
+    print(f"{'rewrite':>12} {1:>6} {rewrite[0]:>8.3f} "
+          f"{rewrite[1] / 1024:>9.0f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""
+bench_save.py
+
+Cost of crash safe saves: appends and whole file rewrites with and
+without fsync.
+
+usage: python benchmarks/bench_save.py [entries]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from passwordmanager.database import Database
+
+MASTER = "bench_master"
+OPERATIONS = 50
+
+def time_saves(db, entries):
+    """Return seconds per append and per rewrite."""
+    session = db.unlock(MASTER)
+    start = time.perf_counter()
+    for i in range(OPERATIONS):
+        session.add_handle(f"handle{i % entries}", f"new{i}")
+    append = (time.perf_counter() - start) / OPERATIONS
+
+    start = time.perf_counter()
+    for i in range(OPERATIONS // 10):
+        db.records.compact(session.key, session.snapshot.index)
+    rewrite = (time.perf_counter() - start) / (OPERATIONS // 10)
+    session.lock()
+    return append, rewrite
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 1000
+    fsync = os.fsync
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "benchdb"))
+        db.save({f"handle{i}": [0, f"password{i}"] for i in range(entries)},
+                MASTER)
+        safe = time_saves(db, entries)
+        os.fsync = lambda fd: None
+        try:
+            unsafe = time_saves(db, entries)
+        finally:
+            os.fsync = fsync
+
+    print(f"{entries} entries, ms per save")
+    print(f"{'':>10} {'fsync':>8} {'no fsync':>8} {'added':>8}")
+    for name, with_sync, without in zip(("append", "rewrite"), safe, unsafe):
+        print(f"{name:>10} {with_sync*1000:>8.2f} {without*1000:>8.2f} "
+              f"{(with_sync - without)*1000:>8.2f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""
+bench_search.py
+
+Time per keystroke of searching handles as a query is typed, for
+different numbers of handles. The listbox only shows ROWS rows, so this
+is the part of a keystroke that grows with the database.
+
+usage: python benchmarks/bench_search.py
+"""
+
+import time
+import random
+import string
+
+from passwordmanager.search import HandleIndex
+
+SIZES = [1000, 10000, 100000]
+QUERY = "mail.exa"
+
+def handles(count):
+    """Return count random handles, some containing QUERY."""
+    rng = random.Random(count)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(8))
+             for _ in range(count)]
+    return [word + (".mail.example.com" if i % 100 == 0 else ".org")
+            for i, word in enumerate(words)]
+
+def main():
+    for size in SIZES:
+        start = time.perf_counter()
+        index = HandleIndex(handles(size))
+        build = time.perf_counter() - start
+        times = []
+        for i in range(1, len(QUERY) + 1):
+            start = time.perf_counter()
+            results = index.search(QUERY[:i])
+            times.append(time.perf_counter() - start)
+        index.last = None
+        start = time.perf_counter()
+        index.search(QUERY)
+        cold = time.perf_counter() - start
+        print("%7d handles: build %7.1f ms, keystroke max %6.2f ms, "
+              "last %6.3f ms, pasted query %6.3f ms, %d matches"
+              % (size, build * 1000, max(times) * 1000, times[-1] * 1000,
+                 cold * 1000, len(results)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""
+bench_session.py
+
+Compare lookups through an unlocked Session against the reload per call
+Database methods.
+
+usage: python benchmarks/bench_session.py [entries]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from passwordmanager.database import Database
+
+MASTER = "bench_master"
+
+def ops_per_second(func, seconds=2.0):
+    """Call func repeatedly for about seconds, return calls per second."""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "benchdb"))
+        db.save({f"handle{i}": [0, f"password{i}"] for i in range(entries)},
+                MASTER)
+
+        results = []
+        for name, reload, in_session in (
+                ("get_handles",
+                 lambda: db.get_handles(MASTER),
+                 lambda session: session.get_handles()),
+                ("get_password",
+                 lambda: db.get_password("handle0", MASTER),
+                 lambda session: session.get_password("handle0"))):
+            reload_rate = ops_per_second(reload)
+            session = db.unlock(MASTER)
+            session_rate = ops_per_second(lambda: in_session(session))
+            session.lock()
+            results.append((name, reload_rate, session_rate))
+
+    for name, reload_rate, session_rate in results:
+        print(f"{entries} entries, {name}:")
+        print(f"  reload per call: {reload_rate:12.1f} ops/s")
+        print(f"  session:         {session_rate:12.1f} ops/s")
+        print(f"  speedup:         {session_rate / reload_rate:12.1f}x")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+bench_snapshot.py
+
+Lookup throughput of a session with 1 to 32 reader threads and a writer
+saving in the background, reading from snapshots without a lock against
+reads serialised under the database mutex, as they were.
+
+usage: python benchmarks/bench_snapshot.py [entries] [seconds]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from passwordmanager.database import Database
+
+MASTER = "bench_master"
+THREADS = (1, 2, 4, 8, 16, 32)
+WRITE_INTERVAL = 0.01 # in seconds between the writer's saves
+
+def throughput(session, entries, threads, seconds, lock):
+    """Return lookups per second and the writer's saves.
+
+    Arguments:
+    session -- an unlocked Session.
+    entries -- number of handles in the database.
+    threads -- number of reader threads.
+    seconds -- how long to run for.
+    lock -- function returning a context manager to read under."""
+    running = threading.Event()
+    counts = [0] * threads
+    saves = [0]
+
+    def reader(number):
+        handle_number = number
+        while running.is_set():
+            with lock():
+                session.get_password(f"handle{handle_number % entries}")
+            counts[number] += 1
+            handle_number += threads
+
+    def writer():
+        while running.is_set():
+            session.add_handle("written", f"password{saves[0]}")
+            saves[0] += 1
+            time.sleep(WRITE_INTERVAL)
+
+    running.set()
+    workers = [threading.Thread(target=reader, args=(i,))
+               for i in range(threads)] + [threading.Thread(target=writer)]
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    running.clear()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / seconds, saves[0]
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 1000
+    seconds = float(argv[2]) if len(argv) > 2 else 1.0
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "benchdb"))
+        db.save({f"handle{i}": [0, f"password{i}"] for i in range(entries)},
+                MASTER)
+        session = db.unlock(MASTER)
+
+        print(f"{entries} entries, lookups per second over {seconds:g} s")
+        print(f"{'threads':>8} {'snapshot':>10} {'saves':>6} "
+              f"{'locked':>10} {'saves':>6} {'speedup':>8}")
+        for threads in THREADS:
+            snapshot, snapshot_saves = throughput(
+                    session, entries, threads, seconds, lambda: NULL)
+            locked, locked_saves = throughput(
+                    session, entries, threads, seconds, lambda: db.mutex)
+            print(f"{threads:>8} {snapshot:>10.0f} {snapshot_saves:>6} "
+                  f"{locked:>10.0f} {locked_saves:>6} "
+                  f"{snapshot / locked:>7.2f}x")
+        session.lock()
+
+class Null(object):
+    """Context manager doing nothing."""
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+NULL = Null()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
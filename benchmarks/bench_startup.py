@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""
+bench_startup.py
+
+Cold start time of the pman entry point. Prints the slowest imports
+from python -X importtime and the median wall clock time of running
+pman with no arguments. Exits with status 1 if the median is over
+TARGET_MS.
+
+usage: python benchmarks/bench_startup.py [target ms]
+"""
+
+import sys
+import time
+import statistics
+import subprocess
+
+TARGET_MS = 100
+RUNS = 20
+SLOWEST = 8
+
+COMMAND = [sys.executable, "-c",
+           "from passwordmanager.cli import main; main(['pman'])"]
+
+def import_times():
+    """Return [(cumulative us, module)] from python -X importtime."""
+    stderr = subprocess.run(COMMAND[:1] + ["-X", "importtime"] + COMMAND[1:],
+                            capture_output=True, text=True).stderr
+    times = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            self_time, cumulative, module = line[12:].split("|")
+            if cumulative.strip().isdigit():
+                times.append((int(cumulative), module.strip()))
+    return sorted(times, reverse=True)
+
+def main(argv):
+    target = float(argv[1]) if len(argv) > 1 else TARGET_MS
+    print("slowest imports (cumulative ms):")
+    for cumulative, module in import_times()[:SLOWEST]:
+        print(f"  {cumulative / 1000:8.2f} {module}")
+
+    times = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(COMMAND, check=True, capture_output=True)
+        times.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(times)
+    print(f"pman cold start: median {median:.1f} ms, "
+          f"min {min(times):.1f} ms, target {target:.0f} ms")
+    return 0 if median <= target else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
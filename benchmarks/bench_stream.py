@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+bench_stream.py
+
+Throughput and peak memory of encrypt_stream and decrypt_stream against
+encrypting the whole data in memory.
+
+usage: python benchmarks/bench_stream.py [megabytes...]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+import passwordmanager.securestrings as securestrings
+
+def measure(func):
+    """Return (seconds, peak traced bytes) for calling func."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+def main(argv):
+    sizes = [int(size) for size in argv[1:]] or [1, 16, 64]
+    key = securestrings.derive_key("bench_master")
+    print(f"{'MB':>5} {'method':>8} {'MB/s':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        plain = os.path.join(directory, "plain")
+        encrypted = os.path.join(directory, "encrypted")
+        decrypted = os.path.join(directory, "decrypted")
+        for size in sizes:
+            with open(plain, 'wb') as fo:
+                fo.write(os.urandom(size * 2**20))
+
+            def encrypt():
+                with open(plain, 'rb') as src, open(encrypted, 'wb') as dst:
+                    securestrings.encrypt_stream(src, dst, key)
+
+            def decrypt():
+                with open(encrypted, 'rb') as src, \
+                     open(decrypted, 'wb') as dst:
+                    securestrings.decrypt_stream(src, dst, key)
+
+            def in_memory():
+                with open(plain, 'rb') as fo:
+                    data = securestrings.encrypt(fo.read(), key)
+                securestrings.decrypt(memoryview(data)[16:], key, data[:16])
+
+            for name, func in (("encrypt", encrypt), ("decrypt", decrypt),
+                               ("memory", in_memory)):
+                seconds, peak = measure(func)
+                print(f"{size:>5} {name:>8} {size / seconds:>8.1f} "
+                      f"{peak / 2**20:>8.2f}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
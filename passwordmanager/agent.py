@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+agent.py
+
+Background agent holding the unlocked database, so pman lookups don't
+pay for interpreter start up, key derivation and decryption each time.
+
+The agent listens on a Unix domain socket only the user can reach: the
+socket's directory must belong to the user and be closed to everyone
+else, and each end checks the other is the same user before trusting
+it, so no other user can stand in for the agent and collect the master
+password.
+Each connection sends one JSON request line and gets one JSON response
+line:
+
+{"op": "get", "handle": h}       copy the password to the clipboard
+{"op": "password", "handle": h}  return the password
+{"op": "passwords", "handles": [h, ...]}
+                                 return the passwords that exist
+{"op": "list"}                   return the handles
+{"op": "match", "query": q}      return [[score, handle], ...] for the
+                                 handles q could mean, best first
+{"op": "lock"}                   drop the unlocked database
+
+Requests may include "master" to unlock the database. The database is
+dropped when the controller's timeout expires, after which requests
+without "master" get {"ok": false, "error": "locked"}.
+"""
+
+import os
+import sys
+import stat
+import json
+import socket
+import struct
+import socketserver
+
+AGENT_TIMEOUT = 300 # in seconds
+SOCKET_NAME = "pman-agent.sock"
+
+def socket_path():
+    """Return the agent's socket path: $PMAN_AGENT_SOCK, or a file in a
+    directory private to the user."""
+    path = os.environ.get("PMAN_AGENT_SOCK")
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or \
+                os.path.join("/tmp", f"pman-{os.getuid()}")
+    return os.path.join(directory, SOCKET_NAME)
+
+def check_directory(directory):
+    """Raise OSError unless directory is a directory, not a link, owned by
+    the user and closed to other users."""
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+       info.st_mode & 0o077:
+        raise OSError(f"{directory} isn't private to this user")
+
+def same_user(sock):
+    """Return whether the peer on the Unix socket sock is this user, where
+    the platform can tell."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                  struct.calcsize("3i"))
+    pid, uid, gid = struct.unpack("3i", credentials)
+    return uid == os.getuid()
+
+def request(message, path=None):
+    """Send a request to the agent. Raises OSError if the socket's
+    directory isn't private to the user or the agent is another user.
+
+    Arguments:
+    message -- the request dictionary.
+    path -- the socket path, socket_path() if None.
+    Returns:
+    the response dictionary, or None if no agent is running."""
+    path = path or socket_path()
+    try:
+        check_directory(os.path.dirname(os.path.abspath(path)))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            if not same_user(sock):
+                raise OSError(f"agent on {path} is another user")
+            sock.sendall(json.dumps(message).encode() + b"\n")
+            with sock.makefile('rb') as fo:
+                line = fo.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    return json.loads(line) if line else None
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    """Answers one request."""
+    def handle(self):
+        if not same_user(self.request):
+            return
+        try:
+            message = json.loads(self.rfile.readline())
+            response = self.server.answer(message)
+        except (ValueError, AttributeError):
+            response = {"ok": False, "error": "request"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+class Agent(socketserver.UnixStreamServer):
+    """Unix socket server holding a MainController.
+
+    Requests are answered one at a time."""
+    def __init__(self, path=None, timeout=AGENT_TIMEOUT, controller=None):
+        """Arguments:
+        path -- the socket path, socket_path() if None.
+        timeout -- seconds without a request before the database is
+                   dropped.
+        controller -- the MainController, a new one if None."""
+        from passwordmanager.controller import MainController
+        self.path = path or socket_path()
+        self.controller = controller or MainController(timeout)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        check_directory(directory)
+        if os.path.exists(self.path):
+            if request({"op": "ping"}, self.path) is not None:
+                raise OSError(f"agent already running on {self.path}")
+            os.remove(self.path)
+        umask = os.umask(0o177)
+        try:
+            super().__init__(self.path, AgentHandler)
+        finally:
+            os.umask(umask)
+
+    def answer(self, message):
+        """Return the response to a request."""
+        op = message.get("op")
+        master = message.get("master")
+        controller = self.controller
+        if op == "ping":
+            return {"ok": True}
+        if op == "lock":
+            controller.lock()
+            return {"ok": True}
+        if op not in ("get", "password", "passwords", "list", "match"):
+            return {"ok": False, "error": "request"}
+        if master is None and not controller.unlocked:
+            return {"ok": False, "error": "locked"}
+
+        controller.timeout.trigger()
+        try:
+            if op == "list":
+                result = controller.list(master, message.get("limit"))
+            elif op == "match":
+                result = controller.match(message["query"], master)
+            elif op == "get":
+                result = controller.get(message["handle"], master)
+            elif op == "passwords":
+                result = controller.get_passwords(message["handles"], master)
+            else:
+                result = controller.get_password(message["handle"], master)
+        except KeyError:
+            return {"ok": False, "error": "handle"}
+        if result is None:
+            return {"ok": False, "error": "password"}
+        if op == "list":
+            return {"ok": True, "handles": list(result)}
+        if op == "password":
+            return {"ok": True, "password": result}
+        if op == "passwords":
+            return {"ok": True, "passwords": result}
+        if op == "match":
+            return {"ok": True, "matches": result}
+        return {"ok": True}
+
+    def server_close(self):
+        """Close the socket and remove its file."""
+        super().server_close()
+        self.controller.lock()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    timeout = int(argv[1]) if len(argv) > 1 else AGENT_TIMEOUT
+    agent = Agent(timeout=timeout)
+    print(f"PMAN_AGENT_SOCK={agent.path}")
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
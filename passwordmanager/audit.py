@@ -0,0 +1,148 @@
+"""
+audit.py
+
+Vault health report: reused, weak and old passwords.
+
+An audit is one pass over the index. Reuse is found by grouping handles
+on a keyed hash of their passwords, so no password is compared with
+another or kept in the clear. Strength is a rough entropy estimate: the
+bits each character adds for the classes of character used, with a
+character that repeats or continues a run of the one before adding a
+bit. Age is the time since the password was set.
+
+What each record gave is remembered by its tag, the last bytes of its
+frame, which are new for every record written and stay with it when the
+file is compacted. Estimates are remembered by password hash. So
+auditing again reads each record's tag, but decrypts only the records
+written since and estimates only new passwords. Tags aren't remembered
+by where records are: a file rewritten can reuse the inode, offsets and
+lengths of the one it replaces for different records.
+"""
+
+import hmac
+import hashlib
+from math import log2
+from collections import defaultdict
+from passwordmanager.password_creator import CHARACTER_CLASS
+
+MAX_AGE = 365 * 24 * 60 * 60 # in seconds before a password is flagged old
+WEAK_BITS = 60 # estimated entropy below which a password is weak
+ASCII_OTHER_SIZE = 8 # printable ASCII characters not in our classes
+OTHER_SIZE = 100 # characters assumed in the class of any not ASCII
+DAY = 24 * 60 * 60 # in seconds
+
+def entropy(password):
+    """Return a rough estimate of the bits of entropy in password."""
+    sizes = {}
+    for char in set(password):
+        chars = CHARACTER_CLASS.get(char)
+        if chars is not None:
+            sizes[chars] = len(chars)
+        elif char.isascii():
+            sizes["ascii"] = ASCII_OTHER_SIZE
+        else:
+            sizes["other"] = OTHER_SIZE
+    pool = sum(sizes.values())
+    if not pool:
+        return 0.0
+    per_char = log2(pool)
+    bits = 0.0
+    step = None
+    previous = None
+    for char in password:
+        difference = None if previous is None else ord(char) - ord(previous)
+        if difference is not None and abs(difference) <= 1 and \
+           step in (None, difference):
+            bits += 1
+            step = difference
+        else:
+            bits += per_char
+            step = None
+        previous = char
+    return bits
+
+class Auditor(object):
+    """Audits the index of a session, remembering what it has worked out
+    so unchanged records aren't decrypted or estimated again."""
+    def __init__(self, key):
+        """Arguments:
+        key -- bytes to key the password hash with, secret to the
+               session."""
+        self.key = key
+        self.records = {} # record tag -> (hash, bits, time set)
+        self.bits = {} # password hash -> estimated bits
+
+    def digest(self, password):
+        """Return the keyed hash of password."""
+        return hmac.new(self.key, password.encode(), hashlib.sha256).digest()
+
+    def audit(self, index, read, tag, now, max_age=MAX_AGE):
+        """Return the report for index.
+
+        Arguments:
+        index -- {handle: IndexEntry}.
+        read -- function returning the Entry for an IndexEntry.
+        tag -- function returning the tag of the record for an
+               IndexEntry.
+        now -- the time to measure ages from.
+        max_age -- seconds after which a password is old.
+
+        Returns:
+        dictionary of
+        entries -- the number of handles.
+        reused -- lists of the handles sharing a password, sorted.
+        weak -- [{"handle": handle, "bits": estimate}], weakest first.
+        old -- [{"handle": handle, "days": age}], oldest first.
+        undated -- handles whose password has no time it was set."""
+        records = {}
+        groups = defaultdict(list)
+        weak = []
+        old = []
+        undated = []
+        for handle, position in index.items():
+            record = tag(position)
+            facts = self.records.get(record)
+            if facts is None:
+                entry = read(position)
+                digest = self.digest(entry.password)
+                bits = self.bits.get(digest)
+                if bits is None:
+                    bits = self.bits[digest] = entropy(entry.password)
+                facts = (digest, bits, entry.modified or entry.created)
+            records[record] = facts
+            digest, bits, changed = facts
+            groups[digest].append(handle)
+            if bits < WEAK_BITS:
+                weak.append({"handle": handle, "bits": round(bits, 1)})
+            if not changed:
+                undated.append(handle)
+            elif now - changed > max_age:
+                old.append({"handle": handle,
+                            "days": int((now - changed) // DAY)})
+        self.records = records
+        self.bits = {digest: self.bits[digest] for digest in groups}
+        weak.sort(key=lambda item: (item["bits"], item["handle"]))
+        old.sort(key=lambda item: (-item["days"], item["handle"]))
+        return {
+            "entries": len(index),
+            "reused": sorted(sorted(handles) for handles in groups.values()
+                             if len(handles) > 1),
+            "weak": weak,
+            "old": old,
+            "undated": sorted(undated),
+        }
+
+def table(report):
+    """Return report as lines of text, a summary and a row per finding."""
+    lines = [f"{report['entries']} entries: {len(report['reused'])} "
+             f"reused, {len(report['weak'])} weak, {len(report['old'])} old"]
+    for handles in report["reused"]:
+        lines.append(f"{'reused':<8} {', '.join(handles)}")
+    for item in report["weak"]:
+        lines.append(f"{'weak':<8} {item['handle']} ({item['bits']:g} bits)")
+    for item in report["old"]:
+        lines.append(f"{'old':<8} {item['handle']} ({item['days']} days)")
+    if report["undated"]:
+        lines.append(f"{'undated':<8} {len(report['undated'])} entries "
+                     f"with no time set")
+    return "\n".join(lines)
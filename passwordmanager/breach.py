@@ -0,0 +1,199 @@
+"""
+breach.py
+
+Offline check of passwords against a list of breached password hashes.
+
+A breached password dump, such as Pwned Passwords, lists the SHA-1 of
+each password sorted by hash, as text lines of hex digits with an
+optional ":count", or as 20 byte binary hashes one after another. It is
+converted once to a corpus file:
+
+magic (4) | version (1) | record size (1) | count (8) | records
+
+where each record is the first RECORD_SIZE bytes of a hash, in sorted
+order with no repeats. Ten bytes keep the corpus half the size of the
+hashes, and a password not in the dump matches one of several hundred
+million records by chance about once in 10 ** 15 lookups.
+
+The corpus is memory mapped and searched without reading it into
+memory. Hashes are spread evenly, so a lookup first guesses where the
+hash would be from its value, as in a dictionary, which narrows the
+search to a few records within a handful of guesses, and then bisects.
+A lookup so reads a few pages of the file, where bisection alone would
+read one for each of the last twenty or so of its log2(count) steps.
+"""
+
+import os
+import mmap
+import struct
+import hashlib
+from passwordmanager.filename import FILENAME
+from passwordmanager.fileutils import atomic_write
+
+MAGIC = b"PMBR"
+VERSION = 1
+HEADER = struct.Struct(">4sBBQ")
+RECORD_SIZE = 10 # leading bytes of each SHA-1 kept
+DIGEST_SIZE = 20 # bytes in a SHA-1
+CHUNK_SIZE = 1024 * 1024 # in bytes read from the dump at once
+GUESSES = 8 # most guesses from a hash's value before bisecting
+BISECT_RECORDS = 64 # records left to search when bisection takes over
+KEY_SIZE = 8 # leading bytes of a record guesses are made from
+ENVIRONMENT = "PMAN_BREACH_CORPUS"
+CORPUS = FILENAME + ".breach"
+
+def corpus_path():
+    """Return the corpus file name, from PMAN_BREACH_CORPUS if set."""
+    return os.environ.get(ENVIRONMENT) or CORPUS
+
+def open_corpus():
+    """Return the Corpus at corpus_path, None if there isn't one."""
+    path = corpus_path()
+    return Corpus(path) if os.path.exists(path) else None
+
+def digest(password):
+    """Return the SHA-1 of password, as the dump lists it."""
+    return hashlib.sha1(password.encode()).digest()
+
+def dump_digests(fo, binary=False):
+    """Yield the hashes in a dump, in the order they are listed.
+
+    Arguments:
+    fo -- the dump, opened in binary mode.
+    binary -- whether it holds 20 byte hashes rather than text lines."""
+    if binary:
+        while True:
+            data = fo.read(CHUNK_SIZE - CHUNK_SIZE % DIGEST_SIZE)
+            if len(data) % DIGEST_SIZE:
+                raise ValueError("truncated hash in dump")
+            if not data:
+                return
+            for i in range(0, len(data), DIGEST_SIZE):
+                yield data[i:i + DIGEST_SIZE]
+    while True:
+        lines = fo.readlines(CHUNK_SIZE)
+        if not lines:
+            return
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield bytes.fromhex(line[:DIGEST_SIZE * 2].decode())
+
+def convert(src, dst, binary=False):
+    """Convert the dump src to the corpus file dst, written atomically.
+    Raises ValueError if the dump isn't sorted by hash.
+
+    Arguments:
+    src -- the dump, opened in binary mode.
+    dst -- the corpus file name.
+    binary -- whether the dump holds 20 byte hashes rather than text.
+
+    Returns:
+    the number of records written."""
+    count = 0
+    previous = b""
+    buffer = bytearray()
+    with atomic_write(dst) as fo:
+        fo.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, 0))
+        for sha1 in dump_digests(src, binary):
+            record = sha1[:RECORD_SIZE]
+            if record <= previous:
+                if record == previous:
+                    continue
+                raise ValueError("dump isn't sorted by hash")
+            buffer += record
+            previous = record
+            count += 1
+            if len(buffer) >= CHUNK_SIZE:
+                fo.write(buffer)
+                buffer.clear()
+        fo.write(buffer)
+        fo.seek(0)
+        fo.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, count))
+    return count
+
+class Corpus(object):
+    """A memory mapped corpus file. password in corpus is whether
+    password is breached."""
+    def __init__(self, filename):
+        """Raises ValueError if filename isn't a corpus file."""
+        with open(filename, 'rb') as fo:
+            header = fo.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError("not a corpus file")
+            magic, version, self.size, self.count = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or \
+               not 0 < self.size <= DIGEST_SIZE:
+                raise ValueError("not a corpus file")
+            if os.fstat(fo.fileno()).st_size != \
+               HEADER.size + self.size * self.count:
+                raise ValueError("truncated corpus file")
+            self.map = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ) \
+                       if self.count else b""
+        if self.count and hasattr(mmap, "MADV_RANDOM"):
+            self.map.madvise(mmap.MADV_RANDOM)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, password):
+        return self.has_digest(digest(password))
+
+    def has_digest(self, sha1):
+        """Return whether the SHA-1 hash sha1 is in the corpus."""
+        record = sha1[:self.size]
+        size = self.size
+        data = self.map
+        low = 0
+        high = self.count
+        key_size = min(size, KEY_SIZE)
+        key = int.from_bytes(record[:key_size], "big")
+        low_key = 0
+        high_key = 256 ** key_size
+        for i in range(GUESSES):
+            if high - low <= BISECT_RECORDS:
+                break
+            guess = low + (key - low_key) * (high - low) \
+                          // max(high_key - low_key, 1)
+            guess = min(max(guess, low), high - 1)
+            start = HEADER.size + guess * size
+            found = data[start:start + size]
+            if found < record:
+                low = guess + 1
+                low_key = int.from_bytes(found[:key_size], "big")
+            elif found > record:
+                high = guess
+                high_key = int.from_bytes(found[:key_size], "big")
+            else:
+                return True
+        while low < high:
+            middle = (low + high) // 2
+            start = HEADER.size + middle * size
+            found = data[start:start + size]
+            if found < record:
+                low = middle + 1
+            elif found > record:
+                high = middle
+            else:
+                return True
+        return False
+
+    def close(self):
+        """Unmap the file."""
+        if self.count:
+            self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def check(passwords, corpus):
+    """Return the handles whose passwords are in corpus, sorted.
+
+    Arguments:
+    passwords -- iterable of (handle, password).
+    corpus -- a Corpus."""
+    return sorted(handle for handle, password in passwords
+                  if password in corpus)
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+
+"""
+cli.py
+
+The pman command.
+
+pman handle
+    copy the password for handle to the clipboard. Part of a handle, or
+    a misspelling, is enough if it clearly means one handle; otherwise
+    the closest handles are listed to pick from.
+pman batch [--format json|env] [handle ...]
+    print the passwords for several handles, read from standard input
+    if none are given, unlocking the database once.
+pman rotate [--match pattern] [--length n] [--no-upper] [--no-digits]
+            [--no-special] [--show-passwords] [handle ...]
+    create new passwords for the handles, and those matching the glob
+    patterns, in a single save and print a JSON report.
+pman import [--format csv|jsonl|json|pman] [--policy skip|replace|rename]
+            file
+    add the passwords in another password manager's export, or a pman
+    export, in a single save and print a JSON report.
+pman export file
+    write every password to file, encrypted with an export password.
+pman top [-n count]
+    list the handles used most, and most recently, best first.
+pman audit [--format table|json] [--max-age days]
+    report reused and weak passwords, and those older than max-age
+    days. Exits with 1 if anything was found.
+pman breach-check [--corpus file] [--format table|json]
+    list the handles whose passwords are in the breached password
+    corpus. Exits with 1 if any are.
+pman breach-check [--corpus file] --convert dump [--binary]
+    convert a sorted SHA-1 breached password dump to the corpus.
+
+The master password is prompted for on the terminal. A running
+pman-agent is used when there is one.
+
+pman --profile ... prints the time each stage of the command took, see
+profiling.py. When an agent does the work, start the agent with
+PMAN_PROFILE set to profile it instead.
+
+Start up time matters here, so modules that are slow to import (the
+controller, and through it pycryptodome and pyperclip) are only
+imported by the commands that use them.
+"""
+
+import sys
+import json
+import getpass
+
+from passwordmanager.strings import ENTER_FAIL, HANDLE_FAIL, \
+                                    HANDLE_AMBIGUOUS, HANDLE_PICK, \
+                                    COPY_SUCCESS, EXPORT_MISMATCH
+
+USAGE = """Usage: pman [--profile] handle
+       pman batch [--format json|env] [handle ...]
+       pman rotate [--match pattern] [options] [handle ...]
+       pman import [--format format] [--policy policy] file
+       pman export file
+       pman top [-n count]
+       pman audit [--format table|json] [--max-age days]
+       pman breach-check [--corpus file] [--convert dump [--binary]]
+Then enter master password at prompt.
+"""
+CLEAR_MARGIN = 0.15 # score lead that makes the best match the handle meant
+PICK_MAX = 9 # matches listed to pick from
+ROTATE_LENGTH = 16 # characters in rotated passwords
+ROTATE_MAX_LENGTH = 256 # most characters pman rotate will make
+EXPORT_PROMPT = "Export password: "
+TOP_COUNT = 10 # handles listed by pman top
+AUDIT_MAX_AGE = 365 # in days before pman audit flags a password
+
+def agent_request(message):
+    """Send a request to the agent, with the master password if the
+    agent is locked.
+
+    Returns:
+    the response dictionary, or None if no agent is running or it can't
+    be trusted, which is reported."""
+    from passwordmanager import agent
+    try:
+        reply = agent.request(message)
+        if reply is not None and reply.get("error") == "locked":
+            reply = agent.request(dict(message, master=getpass.getpass()))
+    except OSError as error:
+        print(f"pman-agent: {error}", file=sys.stderr)
+        return None
+    return reply
+
+def controller():
+    """Return a new MainController."""
+    from passwordmanager.controller import MainController
+    return MainController()
+
+def pick(matches):
+    """Return the handle meant from a list of matches. The best match
+    is used if it is clearly better than the next, otherwise the user
+    picks from a numbered list when standard input is a terminal.
+
+    Arguments:
+    matches -- [(score, handle)], best first.
+    Returns:
+    the handle, or None."""
+    if not matches:
+        print(HANDLE_FAIL)
+        return None
+    if len(matches) == 1 or matches[0][0] - matches[1][0] >= CLEAR_MARGIN:
+        return matches[0][1]
+    handles = [handle for score, handle in matches[:PICK_MAX]]
+    for number, handle in enumerate(handles, 1):
+        print(f"{number}) {handle}")
+    if sys.stdin.isatty():
+        choice = input(HANDLE_PICK).strip()
+        if choice.isdigit() and 0 < int(choice) <= len(handles):
+            return handles[int(choice) - 1]
+    print(HANDLE_AMBIGUOUS)
+    return None
+
+def get(query):
+    """Copy the password for the handle query means to the clipboard."""
+    reply = agent_request({"op": "match", "query": query})
+    if reply is None:
+        local = controller()
+        matches = local.match(query, getpass.getpass())
+        if matches is None:
+            print(ENTER_FAIL)
+            return 1
+        handle = pick(matches)
+        if handle is None:
+            return 1
+        try:
+            if local.get(handle, None) is None:
+                print(ENTER_FAIL)
+                return 1
+        except KeyError:
+            print(HANDLE_FAIL)
+            return 1
+    else:
+        if reply["ok"]:
+            handle = pick(reply["matches"])
+            if handle is None:
+                return 1
+            reply = agent_request({"op": "get", "handle": handle}) or {}
+        if not reply.get("ok"):
+            print(HANDLE_FAIL if reply.get("error") == "handle"
+                  else ENTER_FAIL)
+            return 1
+    if handle != query:
+        print(f"{handle}: {COPY_SUCCESS}")
+
+def env_name(handle):
+    """Return handle as an environment variable name."""
+    name = "".join(c if c.isalnum() else "_" for c in handle.upper())
+    return name if name[:1].isalpha() else "_" + name
+
+def batch(argv):
+    """Print passwords for many handles, one per line, as JSON objects
+    or env file assignments. The clipboard isn't used and popularity
+    values are saved once at the end."""
+    import shlex
+    import argparse
+    parser = argparse.ArgumentParser(prog="pman batch",
+                                     description=batch.__doc__)
+    parser.add_argument("handles", nargs="*",
+                        help="handles, read one per line from standard "
+                             "input if none are given")
+    parser.add_argument("--format", choices=("json", "env"), default="json")
+    args = parser.parse_args(argv)
+    handles = args.handles or [line.strip() for line in sys.stdin
+                               if line.strip()]
+
+    reply = agent_request({"op": "passwords", "handles": handles})
+    if reply is None:
+        passwords = controller().get_passwords(handles, getpass.getpass())
+    elif reply["ok"]:
+        passwords = reply["passwords"]
+    else:
+        passwords = None
+    if passwords is None:
+        print(ENTER_FAIL, file=sys.stderr)
+        return 1
+
+    for handle in handles:
+        password = passwords.get(handle)
+        if args.format == "env":
+            if password is None:
+                print(f"# {handle}: {HANDLE_FAIL}")
+            else:
+                print(f"{env_name(handle)}={shlex.quote(password)}")
+        elif password is None:
+            print(json.dumps({"handle": handle, "error": HANDLE_FAIL}))
+        else:
+            print(json.dumps({"handle": handle, "password": password}))
+    return 0 if len(passwords) == len(set(handles)) else 1
+
+def rotate(argv):
+    """Create new passwords for many handles and save them at once,
+    printing a JSON report of the handles renewed and those not found.
+    The new passwords are only printed with --show-passwords."""
+    import argparse
+    parser = argparse.ArgumentParser(prog="pman rotate",
+                                     description=rotate.__doc__)
+    parser.add_argument("handles", nargs="*", help="handles to renew")
+    parser.add_argument("--match", action="append", default=[],
+                        metavar="PATTERN",
+                        help="also renew handles matching this glob "
+                             "pattern, may be repeated")
+    parser.add_argument("--length", type=int, default=ROTATE_LENGTH)
+    parser.add_argument("--no-upper", action="store_true")
+    parser.add_argument("--no-digits", action="store_true")
+    parser.add_argument("--no-special", action="store_true")
+    parser.add_argument("--show-passwords", action="store_true")
+    args = parser.parse_args(argv)
+    options = [args.length, not args.no_upper, not args.no_digits,
+               not args.no_special]
+    if not args.handles and not args.match:
+        parser.error("no handles or patterns given")
+    if args.length < 1 + sum(options[1:]):
+        parser.error("length shorter than the number of character classes")
+    if args.length > ROTATE_MAX_LENGTH:
+        parser.error(f"length longer than {ROTATE_MAX_LENGTH}")
+
+    passwords = controller().rotate(args.handles, options, getpass.getpass(),
+                                    args.match)
+    if passwords is None:
+        print(ENTER_FAIL, file=sys.stderr)
+        return 1
+    report = {
+        "rotated": sorted(passwords),
+        "missing": [handle for handle in dict.fromkeys(args.handles)
+                    if handle not in passwords],
+        "length": args.length,
+        "classes": [name for name, on in zip(
+                        ("lower", "upper", "digits", "special"),
+                        [True] + options[1:]) if on],
+    }
+    if args.show_passwords:
+        report["passwords"] = passwords
+    print(json.dumps(report, indent=2))
+    return 1 if report["missing"] else 0
+
+def import_file(argv):
+    """Add the passwords from another password manager's CSV, JSON or
+    JSON lines export, or from a pman export, in a single save. The file
+    is read a row at a time. Prints a JSON report of the handles added,
+    replaced, skipped and renamed."""
+    import csv
+    import argparse
+    from passwordmanager import transfer
+    parser = argparse.ArgumentParser(prog="pman import",
+                                     description=import_file.__doc__)
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=transfer.FORMATS,
+                        help="guessed from the file name if not given")
+    parser.add_argument("--policy", choices=transfer.POLICIES,
+                        default="skip",
+                        help="for handles already in the database")
+    args = parser.parse_args(argv)
+
+    try:
+        format = args.format or transfer.guess_format(args.file)
+        password = getpass.getpass(EXPORT_PROMPT) if format == "pman" \
+                   else None
+        report = controller().import_entries(
+            transfer.read_entries(args.file, format, password),
+            args.policy, getpass.getpass())
+    except (OSError, ValueError, KeyError, csv.Error) as e:
+        print(f"{args.file}: {e}", file=sys.stderr)
+        return 1
+    if report is None:
+        print(ENTER_FAIL, file=sys.stderr)
+        return 1
+    print(json.dumps(report, indent=2))
+    return 0
+
+def export_file(argv):
+    """Write every password to a file, encrypted with an export password,
+    for pman import to read."""
+    import argparse
+    from passwordmanager.fileutils import atomic_write
+    parser = argparse.ArgumentParser(prog="pman export",
+                                     description=export_file.__doc__)
+    parser.add_argument("file")
+    args = parser.parse_args(argv)
+
+    local = controller()
+    if local.list(getpass.getpass()) is None:
+        print(ENTER_FAIL, file=sys.stderr)
+        return 1
+    password = getpass.getpass(EXPORT_PROMPT)
+    if getpass.getpass(EXPORT_PROMPT) != password:
+        print(EXPORT_MISMATCH, file=sys.stderr)
+        return 1
+    with atomic_write(args.file) as fo:
+        count = local.export(fo, password, None)
+    print(json.dumps({"exported": count}))
+    return 0
+
+def top(argv):
+    """List handles in order of frecency, how often and how recently
+    they were used, best first."""
+    import argparse
+    parser = argparse.ArgumentParser(prog="pman top",
+                                     description=top.__doc__)
+    parser.add_argument("-n", type=int, default=TOP_COUNT,
+                        help="handles to list, 0 for all of them")
+    args = parser.parse_args(argv)
+    limit = args.n or None
+
+    reply = agent_request({"op": "list", "limit": limit})
+    if reply is None:
+        handles = controller().list(getpass.getpass(), limit)
+    elif reply["ok"]:
+        handles = reply["handles"]
+    else:
+        handles = None
+    if handles is None:
+        print(ENTER_FAIL, file=sys.stderr)
+        return 1
+    for handle in handles:
+        print(handle)
+    return 0
+
+def audit(argv):
+    """Report passwords shared by several handles, passwords with little
+    entropy, and passwords not changed for max-age days, as a table or
+    JSON."""
+    import argparse
+    parser = argparse.ArgumentParser(prog="pman audit",
+                                     description=audit.__doc__)
+    parser.add_argument("--format", choices=("table", "json"),
+                        default="table")
+    parser.add_argument("--max-age", type=float, default=AUDIT_MAX_AGE,
+                        help="days before a password is old")
+    args = parser.parse_args(argv)
+
+    from passwordmanager.audit import DAY, table
+    report = controller().audit(args.max_age * DAY, getpass.getpass())
+    if report is None:
+        print(ENTER_FAIL, file=sys.stderr)
+        return 1
+    if args.format == "json":
+        print(json.dumps(report))
+    else:
+        print(table(report))
+    return 1 if report["reused"] or report["weak"] or report["old"] else 0
+
+def breach_check(argv):
+    """Check every password against a local corpus of breached password
+    hashes, without the network, or convert a sorted SHA-1 dump, such
+    as Pwned Passwords, to that corpus."""
+    import argparse
+    from passwordmanager import breach
+    parser = argparse.ArgumentParser(prog="pman breach-check",
+                                     description=breach_check.__doc__)
+    parser.add_argument("--corpus", default=breach.corpus_path(),
+                        help="the corpus file")
+    parser.add_argument("--convert", metavar="dump",
+                        help="convert dump to the corpus")
+    parser.add_argument("--binary", action="store_true",
+                        help="the dump holds binary hashes, not text")
+    parser.add_argument("--format", choices=("table", "json"),
+                        default="table")
+    args = parser.parse_args(argv)
+
+    if args.convert:
+        try:
+            with open(args.convert, "rb") as fo:
+                count = breach.convert(fo, args.corpus, args.binary)
+        except (OSError, ValueError) as error:
+            print(f"{args.convert}: {error}", file=sys.stderr)
+            return 1
+        print(json.dumps({"converted": count, "corpus": args.corpus}))
+        return 0
+    try:
+        corpus = breach.Corpus(args.corpus)
+    except (OSError, ValueError) as error:
+        print(f"{args.corpus}: {error}", file=sys.stderr)
+        return 1
+    with corpus:
+        handles = controller().breach_check(corpus, getpass.getpass())
+    if handles is None:
+        print(ENTER_FAIL, file=sys.stderr)
+        return 1
+    if args.format == "json":
+        print(json.dumps({"breached": handles}))
+    else:
+        for handle in handles:
+            print(handle)
+    return 1 if handles else 0
+
+COMMANDS = {
+    "batch": batch,
+    "rotate": rotate,
+    "import": import_file,
+    "export": export_file,
+    "top": top,
+    "audit": audit,
+    "breach-check": breach_check,
+}
+
+def main(argv=None):
+    argv = sys.argv if argv is None else argv
+    if len(argv) > 1 and argv[1] == "--profile":
+        from passwordmanager import profiling
+        profiling.enable()
+        argv = argv[:1] + argv[2:]
+    if len(argv) > 1 and argv[1] in COMMANDS:
+        return COMMANDS[argv[1]](argv[2:])
+    if len(argv) != 2:
+        print(USAGE)
+        return
+    return get(argv[1])
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -6,24 +6,43 @@ controller.py
 Main controller class and classes for contolling the ui windows.
 """
 
+import warnings
+from fnmatch import fnmatchcase
+
 from passwordmanager.database import Database, PasswordError
 from passwordmanager.password_creator import PasswordCreator
 from passwordmanager.filename import FILENAME
-from passwordmanager.timeout import Timeout
-from passwordmanager.filename import FILENAME
-
-import sys
-import getpass
-import pyperclip
+from passwordmanager.timeout import Scheduler, Timeout
+from passwordmanager.profiling import operation
 
 TIMEOUT = 20 # in seconds 
+CLIPBOARD_TIMEOUT = TIMEOUT # in seconds a copied password is left
 
 class MainController(object):
-    """Program controller"""
-    def __init__(self):
+    """Program controller
+
+    Methods taking master accept None to use the database already
+    unlocked by an earlier call.
+
+    The scheduler holds the "lock" deadline, timeout seconds after the
+    last trigger, and the "clipboard" deadline, CLIPBOARD_TIMEOUT seconds
+    after a password is copied, however long the lock timeout is.
+    Callers may add deadlines of their own.
+
+    The methods working on the database are timed as operations when
+    profiling is on, see profiling.py.
+
+    New passwords that are in the breached password corpus, see
+    breach.py, are replaced before they are used. The corpus is opened
+    when the first password is made, and if it can't be the passwords
+    are made unchecked, with a warning."""
+    def __init__(self, timeout=TIMEOUT):
         self.db = Database(FILENAME)
+        self.session = None
         self.password_creator = PasswordCreator()
-        self.timeout = Timeout(TIMEOUT, self.empty_clipboard)
+        self.corpus_opened = False
+        self.scheduler = Scheduler()
+        self.timeout = Timeout(timeout, self.lock, self.scheduler, "lock")
         self.password_on_clipboard = False
 
     @property
@@ -31,27 +50,63 @@ class MainController(object):
         """Return whether db exists."""
         return self.db.db_exists
 
-    def list(self, master):
-        """Return list of handles."""
+    @property
+    def unlocked(self):
+        """Return whether the database is held unlocked."""
+        session = self.session
+        return session is not None and session.unlocked
+
+    @operation("list")
+    def list(self, master, limit=None):
+        """Return handles in order of frecency, the first limit of them
+        if limit isn't None."""
         try:
-            handles = self._get_handles(master)
+            handles = self._get_handles(self._unlock(master), limit)
             return handles
         except PasswordError:
             return None
 
+    @operation("get")
     def get(self, handle, master):
         """Copy password for selected handle to clipboard."""
         try:
-            password = self.db.get_password(handle, master)
+            session = self._unlock(master)
+            password = session.get_password(handle)
             self._copy_to_clipboard(password)
-            handles = self._get_handles(master)
+            handles = self._get_handles(session)
             return handles
         except PasswordError:
             return None
 
+    @operation("match")
+    def match(self, query, master):
+        """Return [(score, handle)] for the handles query could mean,
+        best first."""
+        try:
+            return self._unlock(master).match(query)
+        except PasswordError:
+            return None
+
+    @operation("get_password")
+    def get_password(self, handle, master):
+        """Return password for selected handle."""
+        try:
+            return self._unlock(master).get_password(handle)
+        except PasswordError:
+            return None
+
+    @operation("get_passwords")
+    def get_passwords(self, handles, master):
+        """Return dictionary of passwords for the handles that exist."""
+        try:
+            return self._unlock(master).get_passwords(handles)
+        except PasswordError:
+            return None
+
+    @operation("get_chars")
     def get_chars(self, handle, characters, master):
         """Return requested characters from password"""
-        password = self.db.get_password(handle, master)
+        password = self._unlock(master).get_password(handle)
         indexes = []
         for c in characters:
             try:
@@ -66,23 +121,100 @@ class MainController(object):
     
         return(output_string)
     
+    @operation("create")
     def create(self, handle, options, master):
         """Create and save password for handle.
         Create new handle if it doesn't exist."""
-        password = self.password_creator.create(options)
+        password = self._creator().create(options)
         try:
-            self.db.add_handle(
-                            handle,
-                            password,
-                            master
-                        )
-        
+            session = self._unlock(master)
+            session.add_handle(handle, password)
             self._copy_to_clipboard(password)
-            handles = self._get_handles(master)
+            handles = self._get_handles(session)
             return handles
         except PasswordError:
             return None
         
+    @operation("rotate")
+    def rotate(self, handles, options, master, patterns=()):
+        """Create new passwords for existing handles, and those matching
+        any of the glob patterns, saving them all at once.
+
+        Returns:
+        dictionary of {handle: new password}, None if master is wrong."""
+        try:
+            session = self._unlock(master)
+            selected = dict.fromkeys(handles)
+            if patterns:
+                for popularity, handle in session.get_handles():
+                    if any(fnmatchcase(handle, pattern)
+                           for pattern in patterns):
+                        selected[handle] = None
+            passwords = dict(zip(selected, self._creator().create_many(
+                                               options, len(selected))))
+            written = session.add_handles(passwords, existing=True)
+            return {handle: passwords[handle] for handle in written}
+        except PasswordError:
+            return None
+
+    @operation("import_entries")
+    def import_entries(self, entries, policy, master):
+        """Add imported passwords in a single save, merging with existing
+        handles by policy (see transfer.merge).
+
+        Returns:
+        dictionary of counts of what was done, None if master is wrong."""
+        from passwordmanager.transfer import merge
+        try:
+            session = self._unlock(master)
+            existing = {handle for popularity, handle
+                        in session.get_handles()}
+            passwords, report = merge(entries, existing, policy)
+            session.add_handles(passwords)
+            return report
+        except PasswordError:
+            return None
+
+    @operation("export")
+    def export(self, dst, password, master):
+        """Write every password to the binary file dst, encrypted with
+        password.
+
+        Returns:
+        the number of passwords written, None if master is wrong."""
+        from passwordmanager.transfer import write_export
+        try:
+            return write_export(self._unlock(master).passwords(), dst,
+                                password)
+        except PasswordError:
+            return None
+
+    @operation("audit")
+    def audit(self, max_age, master):
+        """Return the report of reused, weak and old passwords, see
+        audit.py, None if master is wrong.
+
+        Arguments:
+        max_age -- seconds after which a password is old."""
+        try:
+            return self._unlock(master).audit(max_age)
+        except PasswordError:
+            return None
+
+    @operation("breach_check")
+    def breach_check(self, corpus, master):
+        """Return the handles whose passwords are in the breached password
+        corpus, sorted, None if master is wrong.
+
+        Arguments:
+        corpus -- a breach.Corpus."""
+        from passwordmanager.breach import check
+        try:
+            return check(self._unlock(master).passwords(), corpus)
+        except PasswordError:
+            return None
+
+    @operation("change_master")
     def change_master(self, new_master, old_master):
         """Create new database if none exists
         or change master on current one."""
@@ -91,52 +223,73 @@ class MainController(object):
             return True
         else:
             try:
-                self.db.change_master(new_master, old_master)
+                self._unlock(old_master).change_master(new_master)
                 return True
             except PasswordError:
                 return False
  
+    @operation("delete")
     def delete(self, handle, master):
         """Delete selected handle from database."""
         try:
-            self.db.delete_handle(handle, master)
-            handles = self._get_handles(master)
+            session = self._unlock(master)
+            session.delete_handle(handle)
+            handles = self._get_handles(session)
             return handles
         except PasswordError:
             return None
 
-    def _get_handles(self, master):
-        """Get and sort handles from database and display in order of
-        popularity."""
-        handles = self.db.get_handles(master)
-        handles.sort(reverse=True)
-        return(tuple(map(lambda x: x[1], handles)))
+    def lock(self):
+        """Drop the unlocked database from memory."""
+        session, self.session = self.session, None
+        if session:
+            session.lock()
+
+    def _unlock(self, master):
+        """Return the unlocked session for master, decrypting the
+        database only if it isn't already held in memory. A session for
+        another master is only dropped once master has opened the
+        database, so a wrong master doesn't lock it."""
+        session = self.session
+        if master is None:
+            if session is None or not session.unlocked:
+                raise PasswordError
+        elif session is None or not session.matches(master):
+            session = self.db.unlock(master)
+            self.lock()
+            self.session = session
+        return session
+
+    def _creator(self):
+        """Return the password creator, giving it the breached password
+        corpus the first time."""
+        if not self.corpus_opened:
+            from passwordmanager.breach import corpus_path, open_corpus
+            self.corpus_opened = True
+            try:
+                self.password_creator.breached = open_corpus()
+            except (OSError, ValueError) as error:
+                warnings.warn(f"{corpus_path()}: {error}, new passwords "
+                              f"aren't checked against breached passwords")
+        return self.password_creator
+
+    def _get_handles(self, session, limit=None):
+        """Get handles from session in order of frecency, which the
+        session keeps them in rather than sorting them here."""
+        return tuple(session.top(limit))
 
     def _copy_to_clipboard(self, password):
         """Copy pass word to clipboard."""
+        import pyperclip
         pyperclip.copy(password)
         self.password_on_clipboard = True
+        self.scheduler.set("clipboard", CLIPBOARD_TIMEOUT,
+                           self.empty_clipboard)
         self.timeout.trigger()
         
     def empty_clipboard(self):
         """Copy a blank space to clipboard."""
         if self.password_on_clipboard:
+            import pyperclip
             pyperclip.copy(" ")
             self.password_on_clipboard = False
-
-def main(argv):
-    controller = MainController()
-    if len(argv) != 2:
-        print("Usage: pman handle\nThen enter master password at prompt.\n")
-    else:
-        controller.get(argv[1], getpass.getpass())
-
-if __name__ == "__main__":
-    sys.exit(main(sys.argv))
-
-
-
-
-
-
-    
@@ -1,4 +1,3 @@
-
 """
 database.py
 
@@ -7,16 +6,42 @@ class for controlling the encrypted database of passwords.
 
 import os
 import json
-from passwordmanager.securestrings import save_string, load_string
-from threading import Lock
+import hmac
+import time
+import hashlib
+from passwordmanager.securestrings import Key, load_string, load_key, \
+                                          derive_key
+from passwordmanager.records import RecordFile, IndexEntry, SLOTS_VERSION
+from passwordmanager.keyslots import MASTER, new_data_key, make_slot, \
+                                     make_table
+from passwordmanager.entry import Entry
+from passwordmanager.journal import PopularityJournal, handle_tag
+from passwordmanager.search import HandleIndex, MATCH_LIMIT
+from passwordmanager.frecency import Ranking
+from passwordmanager.audit import Auditor, MAX_AGE
+from passwordmanager.fileutils import FileLock
+from passwordmanager.profiling import stage, waited
+from threading import Lock, RLock
+from collections import Counter
+from contextlib import contextmanager
+
+JOURNAL_BATCH = 50 # popularity increments merged per save
 
 class Database(object):
     """Secure password database manager."""
-    def __init__(self, filename):
-        """check data file exists"""
+    def __init__(self, filename, backups=0):
+        """check data file exists
+
+        Arguments:
+        filename -- the database file.
+        backups -- number of previous versions to keep when the whole
+                   file is rewritten."""
         self.filename = filename
         self.db_exists = os.path.isfile(self.filename)
-        self.mutex = Lock()
+        self.records = RecordFile(self.filename, backups)
+        self.journal = PopularityJournal(self.filename + ".journal")
+        self.file_lock = FileLock(self.filename + ".lock")
+        self.mutex = RLock()
 
     def create_database(self, master):
         """Create new database.
@@ -24,27 +49,118 @@ class Database(object):
         Arguments:
         master - the master password."""
         self.save({}, master)
+        self.journal.clear()
+        self.db_exists = True
 
     def save(self, data, master):
-        """save dictionary to file.
+        """save dictionary to file, one encrypted record per handle,
+        under a new data key with a key slot for master.
 
         Arguments:
-        data - the dictionary with all the data.
-        master - the master password."""
-        save_string(self.filename, master, json.dumps(data))
+        data - the dictionary with all the data,
+               {handle: Entry or [popularity, password]}.
+        master - the master password or a Key derived from it.
+        Returns:
+        the index of the saved file."""
+        if not isinstance(master, Key):
+            master = derive_key(master)
+        with self.file_lock.exclusive():
+            return self._write(data, master)[1]
+
+    def _write(self, data, key):
+        """save dictionary to file, the caller holding the file lock."""
+        def entries():
+            for handle, value in data.items():
+                if isinstance(value, Entry):
+                    yield value, IndexEntry(last_used=value.last_used)
+                else:
+                    yield Entry(handle, value[1]), IndexEntry(value[0])
+        return self._write_entries(entries(), key)
+
+    def _write_entries(self, entries, key):
+        """Write a new file of entries under a new data key, wrapped by
+        key in the master slot, the caller holding the file lock.
+
+        Arguments:
+        entries -- iterable of (Entry, IndexEntry).
+        key -- the Key derived from the master password.
+        Returns:
+        (the data key, the index of the new file)"""
+        data_key = new_data_key()
+        slots = make_table([make_slot(MASTER, data_key, key)])
+        return data_key, self.records.write(data_key, entries, slots)
             
     def load(self, master):
-        """load dictionary from file.
+        """load dictionary from file, decrypting every record.
+
+        Arguments:
+        master - the master password or the Key the file is encrypted
+                 with, from RecordFile.load_key.
+        Returns:
+        the dictionary with all the data,
+        {handle: [popularity, password]}."""
+        try:
+            if not isinstance(master, Key):
+                master = self.records.load_key(master)
+            with self.file_lock.shared():
+                if self.records.format() is None:
+                    string = load_string(self.filename, master)
+                    with stage("parse"):
+                        return json.loads(string)
+                index = self.records.read_index(master)
+                return {entry.handle: [position.popularity, entry.password]
+                        for entry, position
+                        in self.records.read_records(master, index)}
+        except ValueError:
+            raise PasswordError
+
+    def unlock(self, master):
+        """Derive the key and decrypt the index once and hold them in
+        memory. A database saved by an earlier version, as a single
+        encrypted string or as records without key slots, is converted.
+        A wrong master is rejected by the key check in its slot without
+        decrypting anything, except in the earliest formats.
 
         Arguments:
         master - the master password.
         Returns:
-        the dictionary with all the data."""
+        an unlocked Session."""
         try:
-            return json.loads(load_string(self.filename, master))
-        except (AttributeError, ValueError):
+            if self.records.is_current():
+                key = self.records.load_key(master)
+            else:
+                with self.file_lock.exclusive():
+                    key = self._upgrade(master)
+            with waited(self.mutex), waited(self.file_lock.shared()):
+                return Session(self, master, key,
+                               self.records.read_index(key))
+        except ValueError:
             raise PasswordError
 
+    def _upgrade(self, master):
+        """Convert a database saved by an earlier version, unless another
+        process has already, the caller holding the file lock.
+
+        Returns:
+        the Key the database is now encrypted with."""
+        if self.records.is_current():
+            return self.records.load_key(master)
+        if self.records.format() == SLOTS_VERSION:
+            key = self.records.load_key(master)
+            self.records.compact(key, self.records.read_index(key))
+            return key
+        key = load_key(self.filename, master)
+        if self.records.format() is None:
+            entries = json.loads(load_string(self.filename, key))
+            write = self._write
+        else:
+            entries = self.records.read_records(
+                key, self.records.read_index(key))
+            write = self._write_entries
+        if key.legacy:
+            key = derive_key(master)
+        return write(entries, key)[0]
+
     def get_handles(self, master):
         """Get all handles in database in tuple with popularity value.
 
@@ -53,9 +169,11 @@ class Database(object):
         Reurns:
         a list of tuples, one for each password
         [(popularity value, password)]"""
-        data = self.load(master)
-        return [(data[handle][0], handle) for handle in data.keys()] 
-
+        session = self.unlock(master)
+        try:
+            return session.get_handles()
+        finally:
+            session.lock(flush=False)
       
     def get_password(self, handle, master):
         """Return the password for given handle.
@@ -66,12 +184,11 @@ class Database(object):
         Returns:
         the password.
         """
-        self.mutex.acquire()
-        data = self.load(master)
-        data[handle] = [data[handle][0]+1, data[handle][1]]
-        self.save(data, master)
-        self.mutex.release()
-        return data[handle][1]
+        session = self.unlock(master)
+        try:
+            return session.get_password(handle)
+        finally:
+            session.lock(flush=False)
     
     def add_handle(self, handle, password, master):
         """Add or replace handle in database.
@@ -79,15 +196,11 @@ class Database(object):
         Arguments:
         handle -- the handle to add/replace.
         """
-        self.mutex.acquire()
-        data = self.load(master)
-        if handle in data:
-            data[handle] = [data[handle][0], password]
-        else:
-            data[handle] = [0, password]
-        self.save(data, master)
-        self.mutex.release()
-
+        session = self.unlock(master)
+        try:
+            session.add_handle(handle, password)
+        finally:
+            session.lock()
     
     def delete_handle(self, handle, master):
         """Delete handle from database.
@@ -95,25 +208,637 @@ class Database(object):
         Arguments:
         handle -- the handle to delete.
         """
-        self.mutex.acquire()
-        data = self.load(master)
-        del data[handle]
-        self.save(data, master)
-        self.mutex.release()
-
+        session = self.unlock(master)
+        try:
+            session.delete_handle(handle)
+        finally:
+            session.lock()
     
-    def change_master(self, old_master, new_master):
+    def change_master(self, old_master, new_master, rekey=False):
         """Change the master password.
         
         Arguments:
         old_master -- the old master password
         new_master -- the new master password
+        rekey -- re-encrypt everything under a new data key, see
+                 Session.change_master.
         """
-        self.mutex.acquire()
-        data = self.load(old_master)
-        self.save(data, new_master)
-        self.mutex.release()
+        session = self.unlock(old_master)
+        try:
+            session.change_master(new_master, rekey)
+        finally:
+            session.lock()
+
+class Snapshot(object):
+    """One version of an unlocked database, read without any lock.
+
+    The index, and the IndexEntry objects in it, never change once the
+    snapshot is published; writers build a new snapshot and swap it in.
+    The file is held open so the records the index points at can still
+    be read after the file is compacted or rewritten. The session closes
+    it once a newer snapshot reads another file and no read from it is in
+    progress.
+
+    The uses and used attributes collect the popularity increments and
+    last use times of lookups made since the snapshot was published.
+    They change only under the session's stats lock."""
+    __slots__ = ("index", "key", "version", "file", "format", "uses",
+                 "used", "handle_index")
+
+    def __init__(self, index, key, version, file, format, uses=None,
+                 used=None, handle_index=None):
+        """Arguments:
+        index -- {handle: IndexEntry}.
+        key -- the Key the file is encrypted with.
+        version -- RecordFile.version() of the file index was read from.
+        file, format -- the file and its format, from RecordFile.open.
+        uses -- Counter of lookups per handle not in index yet.
+        used -- {handle: time} of the last lookups not in index yet.
+        handle_index -- the HandleIndex of index's handles, built when
+                        first needed if None."""
+        self.index = index
+        self.key = key
+        self.version = version
+        self.file = file
+        self.format = format
+        self.uses = Counter() if uses is None else uses
+        self.used = {} if used is None else used
+        self.handle_index = handle_index
+
+    def popularity(self, handle):
+        """Return handle's popularity including lookups since the
+        snapshot was published."""
+        return self.index[handle].popularity + self.uses.get(handle, 0)
+
+class Session(object):
+    """An unlocked database.
+
+    The key is derived and the index of handles decrypted once by
+    Database.unlock and held until lock is called. A lookup decrypts only
+    the handle's record, and writes append records and a new index with
+    the cached key rather than rewriting the database.
+
+    Popularity increments are written behind: they are appended to the
+    database's journal and merged into the encrypted file every
+    JOURNAL_BATCH increments, with the next write, or on lock.
+
+    Handles are also ranked by frecency, see frecency.py. The ranking is
+    kept in order as lookups and writes change it, under the stats lock,
+    so top doesn't sort.
+
+    A session may be shared by threads. Reads use the current Snapshot
+    without taking a lock, so they run side by side and never wait for a
+    write. Writes are serialised by the database's mutex: a writer copies
+    the index, saves, and publishes the new Snapshot with one
+    assignment, so a reader sees the database either before or after a
+    write, never part way through. Lookups count themselves in the
+    snapshot under a stats lock held only for the count.
+
+    A lookup appends to the journal holding the file lock shared, so
+    another process's write, which folds the journal into the file and
+    clears it, can't lose it. While this process is writing, lookups
+    leave the journal to the writer instead of waiting for it.
+
+    Other processes may use the database at the same time. Writes hold
+    the database's file lock exclusively, and the snapshot is reloaded,
+    holding it shared, whenever another process has written."""
+    def __init__(self, db, master, key, index):
+        """Arguments:
+        db -- the Database the index was loaded from, which the caller
+              holds the file lock for.
+        master -- the master password.
+        key -- the Key the database is encrypted with.
+        index -- the decrypted index, {handle: IndexEntry}."""
+        self.db = db
+        self.stats = Lock()
+        self.snapshot = None
+        self.merged = Counter()
+        self.pending = 0
+        self.next = None # the index being written
+        self.saved = False
+        self.writing = False
+        self.unjournaled = Counter() # lookups during a write, by handle
+        self.changed = set() # handles added or deleted by the write
+        self.ranking = None
+        self.readers = Counter() # open files -> reads from them in progress
+        self.retired = set() # files no snapshot reads, open for readers
+        self._set_key(master, key)
+        self._load(index)
+
+    @property
+    def unlocked(self):
+        """Return whether the session still holds the database."""
+        return self.snapshot is not None
+
+    def matches(self, master):
+        """Return whether master is the password this session was
+        unlocked with."""
+        return self.unlocked and hmac.compare_digest(
+            self.master_digest, self._digest(master))
+
+    def _digest(self, master):
+        """Return a digest of master keyed with the session key."""
+        return hmac.new(self.key.key, master.encode(), hashlib.sha256)\
+                   .digest()
+
+    def _set_key(self, master, key):
+        """Use key, derived from master, for saves and the journal."""
+        self.key = key
+        self.master_digest = self._digest(master)
+        self.tag_key = hmac.new(key.key, b"journal", hashlib.sha256).digest()
+        self.tags = {}
+        self.auditor = Auditor(
+            hmac.new(key.key, b"audit", hashlib.sha256).digest())
+
+    def _tag(self, handle):
+        """Return the journal tag for handle."""
+        tag = self.tags.get(handle)
+        if tag is None:
+            tag = self.tags[handle] = handle_tag(self.tag_key, handle)
+        return tag
+
+    def _load(self, index):
+        """Publish a snapshot of index, just read from the file, with
+        every journalled increment applied. Call holding the file lock."""
+        records = self.db.records
+        file, format = records.open()
+        snapshot = Snapshot(index, self.key, records.version(), file, format)
+        with self.stats:
+            self.merged = Counter()
+            self.ranking = Ranking({handle: entry.frecency
+                                    for handle, entry in index.items()})
+            snapshot.index = self._fold(snapshot)[0]
+            now = time.time()
+            for handle, count in self.unjournaled.items():
+                if handle in self.ranking:
+                    self.ranking.bump(handle, now, count)
+            snapshot.uses.update(self.unjournaled)
+            if self.snapshot is not None:
+                self._retire(self.snapshot.file)
+            self.snapshot = snapshot
+
+    def _fold(self, snapshot):
+        """Return a copy of the snapshot's index with its lookups, and the
+        increments other processes have journalled, applied. Entries that
+        change are replaced, not changed, and take their frecency from the
+        ranking. Call holding the stats lock.
+
+        Returns:
+        (the index, the uses applied, the last use times applied)"""
+        uses = Counter(snapshot.uses)
+        used = dict(snapshot.used)
+        increments = Counter(uses)
+        counts = self.db.journal.read()
+        if counts:
+            now = time.time()
+            for handle in snapshot.index:
+                tag = self._tag(handle)
+                others = counts.get(tag, 0) - self.merged.get(tag, 0)
+                if others:
+                    increments[handle] += others
+                if others > 0:
+                    self.ranking.bump(handle, now, others)
+        self.merged = counts
+        self.pending = sum(counts.values())
+        index = dict(snapshot.index)
+        for handle in increments.keys() | used.keys():
+            entry = index.get(handle)
+            if entry is not None:
+                index[handle] = IndexEntry(
+                    entry.popularity + increments[handle], entry.offset,
+                    entry.length, used.get(handle, entry.last_used),
+                    self.ranking.score(handle))
+        return index, uses, used
+
+    def _refresh(self):
+        """Return the current snapshot, reloading it if another process
+        has written the database. Call holding the mutex and the file
+        lock. Raises PasswordError if the session has been locked or the
+        database was re-encrypted with another key."""
+        snapshot = self._check()
+        if self.db.records.version() != snapshot.version:
+            try:
+                self._load(self.db.records.read_index(self.key))
+            except ValueError:
+                raise PasswordError
+            snapshot = self.snapshot
+        return snapshot
+
+    def _current(self):
+        """Return the snapshot to read, reloading it first if another
+        process has written the database. A write in progress in this
+        process changes the file too, but is not waited for; the old
+        snapshot can still be read until the write publishes its own."""
+        snapshot = self._check()
+        if self.db.records.version() != snapshot.version and \
+           self.db.mutex.acquire(blocking=False):
+            try:
+                with waited(self.db.file_lock.shared()):
+                    snapshot = self._refresh()
+            finally:
+                self.db.mutex.release()
+        return snapshot
+
+    @contextmanager
+    def _writing(self):
+        """Hold the locks for writing and yield a copy of the index, with
+        every increment applied, for the caller to change. It is
+        published as the new snapshot when the block ends, having been
+        saved if the caller called _save."""
+        with waited(self.db.mutex):
+            with self.stats:
+                self.writing = True
+            try:
+                with waited(self.db.file_lock.exclusive()):
+                    snapshot = self._refresh()
+                    with self.stats:
+                        index, uses, used = self._fold(snapshot)
+                    self.next = index
+                    self.saved = False
+                    self.changed = set()
+                    try:
+                        yield index
+                        self._publish(snapshot, uses, used)
+                    finally:
+                        self.next = None
+                        with self.stats:
+                            self._journal(self.unjournaled)
+                            self.unjournaled = Counter()
+                            self.writing = False
+            finally:
+                self.writing = False
+
+    def _publish(self, old, uses, used):
+        """Swap in the index being written as the snapshot, keeping the
+        lookups made on old while it was written.
+
+        Arguments:
+        old -- the snapshot the write started from.
+        uses, used -- the lookups on old that the index includes."""
+        records = self.db.records
+        version = records.version()
+        if version[0] == old.version[0]:
+            file, format = old.file, old.format
+        else:
+            file, format = records.open()
+        handle_index = None if self.changed else old.handle_index
+        with self.stats:
+            for handle in self.changed:
+                entry = self.next.get(handle)
+                if entry is None:
+                    self.ranking.remove(handle)
+                elif handle not in self.ranking:
+                    self.ranking.set(handle, entry.frecency)
+            snapshot = Snapshot(self.next, self.key, version, file, format,
+                                old.uses - uses,
+                                {handle: time for handle, time
+                                 in old.used.items()
+                                 if used.get(handle) != time},
+                                handle_index)
+            if self.saved:
+                self.db.journal.clear()
+                self.merged = Counter()
+                self.pending = 0
+                self._journal(snapshot.uses)
+                self.unjournaled = Counter()
+            if file is not old.file:
+                self._retire(old.file)
+            self.snapshot = snapshot
+
+    def _retire(self, file):
+        """Close file, which the current snapshot no longer reads, or
+        leave it to the last read from it in progress to close. Call
+        holding the stats lock."""
+        if self.readers[file]:
+            self.retired.add(file)
+        else:
+            file.close()
+
+    @contextmanager
+    def _reading(self):
+        """Yield the snapshot to read records from, keeping its file open
+        until the block ends."""
+        self._current()
+        with self.stats:
+            snapshot = self._check()
+            file = snapshot.file
+            self.readers[file] += 1
+        try:
+            yield snapshot
+        finally:
+            with self.stats:
+                self.readers[file] -= 1
+                if not self.readers[file]:
+                    del self.readers[file]
+                    if file in self.retired:
+                        self.retired.remove(file)
+                        file.close()
+
+    def _journal(self, uses):
+        """Append lookups to the journal, holding the stats lock and the
+        file lock."""
+        for handle, count in uses.items():
+            tag = self._tag(handle)
+            for i in range(count):
+                self.db.journal.append(tag)
+            self.merged[tag] += count
+            self.pending += count
+
+    def _save(self, records=None):
+        """Append records and the index being written, which includes
+        every journalled increment. Call while _writing.
+
+        Arguments:
+        records -- dictionary of {handle: Entry} to write."""
+        self.next = self.db.records.append(self.key, self.next,
+                                           records or {})
+        self.saved = True
+
+    def _check(self):
+        """Return the current snapshot. Raise PasswordError if the
+        session has been locked."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise PasswordError
+        return snapshot
+
+    def _read(self, snapshot, handle):
+        """Return the Entry for handle in snapshot."""
+        position = snapshot.index.get(handle)
+        if position is None:
+            raise HandleError(handle)
+        return self.db.records.read_record_at(snapshot.file, snapshot.key,
+                                              position, snapshot.format)
+
+    def _use(self, handle):
+        """Count a lookup of handle.
+
+        Returns:
+        whether enough increments are pending to flush them."""
+        with self.stats:
+            snapshot = self.snapshot
+            if snapshot is None:
+                return False
+            now = time.time()
+            snapshot.uses[handle] += 1
+            snapshot.used[handle] = now
+            if handle in self.ranking:
+                self.ranking.bump(handle, now)
+            if self.writing:
+                self.unjournaled[handle] += 1
+            else:
+                with self.db.file_lock.shared():
+                    self._journal({handle: 1})
+            return self.pending >= JOURNAL_BATCH
+
+    def get_handles(self):
+        """Get all handles in tuple with popularity value.
+
+        Returns:
+        a list of tuples, one for each password
+        [(popularity value, handle)]"""
+        snapshot = self._current()
+        return [(snapshot.popularity(handle), handle)
+                for handle in snapshot.index]
+
+    def top(self, k=None):
+        """Return the handles with the highest frecency, best first.
+
+        Arguments:
+        k -- most handles to return, None for all of them."""
+        self._current()
+        with self.stats:
+            if self.ranking is None:
+                raise PasswordError
+            return self.ranking.top(k)
+
+    def get_password(self, handle):
+        """Return the password for given handle.
+        Increment handle's popularity value.
+
+        Arguments:
+        handle - the handle for the password.
+        Returns:
+        the password.
+        """
+        with self._reading() as snapshot:
+            password = self._read(snapshot, handle).password
+        if self._use(handle) and self.db.mutex.acquire(blocking=False):
+            try:
+                self.flush()
+            finally:
+                self.db.mutex.release()
+        return password
+
+    def get_passwords(self, handles):
+        """Return the passwords for several handles, incrementing their
+        popularity values in a single save.
+
+        Arguments:
+        handles -- iterable of handles.
+        Returns:
+        dictionary of {handle: password} for the handles that exist."""
+        with self._writing() as index:
+            passwords = {}
+            for handle in handles:
+                entry = index.get(handle)
+                if entry is not None:
+                    if handle not in passwords:
+                        passwords[handle] = self.db.records.read_record(
+                            self.key, entry).password
+                    now = time.time()
+                    with self.stats:
+                        frecency = self.ranking.bump(handle, now)
+                    index[handle] = IndexEntry(entry.popularity + 1,
+                                               entry.offset, entry.length,
+                                               now, frecency)
+            if passwords:
+                self._save()
+            return passwords
+
+    def add_handle(self, handle, password):
+        """Add or replace handle.
+
+        Arguments:
+        handle -- the handle to add/replace.
+        password -- the password for the handle.
+        """
+        self.add_handles({handle: password})
+
+    def add_handles(self, passwords, existing=False):
+        """Add or replace several handles in a single save. Replaced
+        passwords are kept in their entry's history.
+
+        Arguments:
+        passwords -- dictionary of {handle: password}.
+        existing -- only replace handles already in the database.
+        Returns:
+        list of the handles written."""
+        now = time.time()
+        with self._writing() as index:
+            written = {}
+            for handle, password in passwords.items():
+                position = index.get(handle)
+                if position is not None:
+                    entry = self.db.records.read_record(self.key, position)
+                    entry.set_password(password, now)
+                elif existing:
+                    continue
+                else:
+                    entry = Entry(handle, password, created=now,
+                                  modified=now)
+                    index[handle] = IndexEntry()
+                    self.changed.add(handle)
+                written[handle] = entry
+            if written:
+                self._save(written)
+            return list(written)
+
+    def get_entry(self, handle):
+        """Return the Entry for handle, without counting a use."""
+        with self._reading() as snapshot:
+            entry = self._read(snapshot, handle)
+        entry.last_used = snapshot.used.get(
+            handle, snapshot.index[handle].last_used)
+        return entry
+
+    def edit_entry(self, handle, **fields):
+        """Change the details of handle's entry. Use add_handle to change
+        the password, so the old one is kept.
+
+        Arguments:
+        handle -- the handle.
+        fields -- new values for username, url, notes or tags."""
+        unknown = set(fields) - {"username", "url", "notes", "tags"}
+        if unknown:
+            raise TypeError(f"can't edit {', '.join(sorted(unknown))}")
+        with self._writing() as index:
+            position = index.get(handle)
+            if position is None:
+                raise HandleError(handle)
+            entry = self.db.records.read_record(self.key, position)
+            for name, value in fields.items():
+                setattr(entry, name, list(value) if name == "tags" else value)
+            entry.modified = time.time()
+            self._save({handle: entry})
+
+    def delete_handle(self, handle):
+        """Delete handle.
+
+        Arguments:
+        handle -- the handle to delete.
+        """
+        with self._writing() as index:
+            if handle not in index:
+                raise HandleError(handle)
+            del index[handle]
+            self.changed.add(handle)
+            self._save()
+
+    def passwords(self):
+        """Yield (handle, password) for every handle, decrypting one
+        record at a time, all from the snapshot current at the first."""
+        with self._reading() as snapshot:
+            for handle in snapshot.index:
+                yield handle, self._read(snapshot, handle).password
+
+    def match(self, query, limit=MATCH_LIMIT):
+        """Find the handles a partial or misspelled handle could mean,
+        ranked by how well they match and their popularity. The match
+        index is built on the first call and kept until handles are added
+        or deleted.
+
+        Arguments:
+        query -- part or all of a handle.
+        limit -- most matches to return.
+        Returns:
+        list of (score, handle), best first."""
+        snapshot = self._current()
+        if snapshot.handle_index is None:
+            snapshot.handle_index = HandleIndex(snapshot.index)
+        return snapshot.handle_index.match(query, snapshot.popularity, limit)
+
+    def audit(self, max_age=MAX_AGE):
+        """Report reused, weak and old passwords, see audit.py. Records
+        unchanged since the last audit aren't decrypted again, even if
+        the file has been compacted.
+
+        Arguments:
+        max_age -- seconds after which a password is old.
+        Returns:
+        the report dictionary, see Auditor.audit."""
+        with self._reading() as snapshot:
+            with self.stats:
+                auditor = self.auditor
+            if auditor is None:
+                raise PasswordError
+            records = self.db.records
+            return auditor.audit(
+                snapshot.index,
+                lambda position: records.read_record_at(
+                    snapshot.file, snapshot.key, position, snapshot.format),
+                lambda position: records.record_tag(snapshot.file, position),
+                time.time(), max_age)
+
+    def change_master(self, new_master, rekey=False):
+        """Change the master password by rewrapping the data key in the
+        master key slot, which takes the same time whatever the size of
+        the database.
+
+        The data key stays the same, so a copy of the file taken before
+        the change can still be opened with the old master, and would
+        give the key to this one. Pass rekey to re-encrypt everything
+        under a new data key instead.
+
+        Arguments:
+        new_master -- the new master password
+        rekey -- whether to re-encrypt with a new data key.
+        """
+        with self._writing() as index:
+            key = derive_key(new_master)
+            if not rekey:
+                self.db.records.set_slot(MASTER, self.key, key)
+                self.master_digest = self._digest(new_master)
+                return
+            data_key, self.next = self.db._write_entries(
+                self.db.records.read_records(self.key, index), key)
+            self.saved = True
+            with self.stats:
+                self._set_key(new_master, data_key)
+
+    def flush(self):
+        """Merge pending popularity increments into the database."""
+        with self.db.mutex:
+            if self.snapshot is None or not self.pending:
+                return
+            with self._writing():
+                if self.pending:
+                    self._save()
+
+    def lock(self, flush=True):
+        """Drop the decrypted data and master password from memory.
+
+        Arguments:
+        flush -- merge pending popularity increments first, otherwise
+                 they stay in the journal for the next session."""
+        with self.db.mutex:
+            try:
+                if flush:
+                    self.flush()
+            finally:
+                with self.stats:
+                    snapshot, self.snapshot = self.snapshot, None
+                    if snapshot is not None:
+                        self._retire(snapshot.file)
+                    self.key = None
+                    self.master_digest = None
+                    self.tag_key = None
+                    self.tags = None
+                    self.ranking = None
+                    self.auditor = None
 
 class PasswordError(Exception):
     pass
 
+class HandleError(KeyError):
+    """Raised for a handle that isn't in the database."""
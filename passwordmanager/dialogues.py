@@ -2,7 +2,7 @@
 from tkinter import Frame, Entry, Label, Button, Toplevel, Spinbox, IntVar, \
                     Checkbutton, StringVar, LEFT, RIGHT, W, messagebox
 
-from strings import *
+from passwordmanager.strings import *
 
 class PasswordDisplayDialogue():
     """A user interface to display parts or all of a password."""
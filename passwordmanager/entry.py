@@ -0,0 +1,114 @@
+
+"""
+entry.py
+
+A password with its details, and its binary serialisation.
+
+Layout, all numbers big endian:
+version (1) | created (8) | modified (8) | last used (8) |
+number of tags (2) | number of old passwords (2) |
+length of each string (4 each) | time each old password was replaced
+(8 each) | strings
+
+Times are float seconds since the epoch, 0 if unknown. The strings are
+the handle, password, username, url, notes, tags and old passwords,
+joined as UTF-8, with their lengths in characters. Decoding takes a few
+struct calls and one UTF-8 decode whatever the number of fields.
+"""
+
+import time
+import struct
+from itertools import accumulate
+
+ENTRY_VERSION = 1
+HISTORY_SIZE = 10 # old passwords kept per entry
+FIELDS = 5 # strings before the tags
+
+HEAD = struct.Struct(">BdddHH")
+
+class Entry(object):
+    """A password and what is known about it."""
+    __slots__ = ("handle", "password", "username", "url", "notes", "tags",
+                 "created", "modified", "last_used", "history")
+
+    def __init__(self, handle, password, username="", url="", notes="",
+                 tags=(), created=0.0, modified=0.0, last_used=0.0,
+                 history=()):
+        """Arguments:
+        handle -- the name of the password.
+        password -- the password.
+        username, url, notes -- strings, empty if not known.
+        tags -- iterable of strings.
+        created, modified, last_used -- times, 0 if not known.
+        history -- iterable of (time replaced, old password), oldest
+                   first."""
+        self.handle = handle
+        self.password = password
+        self.username = username
+        self.url = url
+        self.notes = notes
+        self.tags = list(tags)
+        self.created = created
+        self.modified = modified
+        self.last_used = last_used
+        self.history = [tuple(item) for item in history]
+
+    def __eq__(self, other):
+        return isinstance(other, Entry) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Entry({self.handle!r})"
+
+    def set_password(self, password, now=None):
+        """Replace the password, keeping the old one in history.
+
+        Arguments:
+        password -- the new password.
+        now -- the time, time.time() if None."""
+        now = time.time() if now is None else now
+        if password != self.password:
+            self.history.append((now, self.password))
+            del self.history[:-HISTORY_SIZE]
+        self.password = password
+        self.modified = now
+
+    def pack(self):
+        """Return the entry as bytes."""
+        strings = [self.handle, self.password, self.username, self.url,
+                   self.notes] + self.tags \
+                  + [password for replaced, password in self.history]
+        return b"".join([
+            HEAD.pack(ENTRY_VERSION, self.created, self.modified,
+                      self.last_used, len(self.tags), len(self.history)),
+            struct.pack(f">{len(strings)}I", *map(len, strings)),
+            struct.pack(f">{len(self.history)}d",
+                        *[replaced for replaced, password in self.history]),
+            "".join(strings).encode(),
+        ])
+
+    @classmethod
+    def unpack(cls, data):
+        """Return the Entry packed in data. Raises ValueError if data
+        isn't a packed entry."""
+        try:
+            version, created, modified, last_used, tags, history = \
+                    HEAD.unpack_from(data)
+            if version != ENTRY_VERSION:
+                raise ValueError("unknown entry version")
+            count = FIELDS + tags + history
+            lengths = struct.unpack_from(f">{count}I", data, HEAD.size)
+            position = HEAD.size + 4 * count
+            replaced = struct.unpack_from(f">{history}d", data, position)
+            text = str(data[position + 8 * history:], "utf-8")
+        except struct.error:
+            raise ValueError("truncated entry")
+        ends = list(accumulate(lengths))
+        if ends[-1] != len(text):
+            raise ValueError("entry length doesn't match")
+        strings = [text[end - length:end]
+                   for end, length in zip(ends, lengths)]
+        return cls(*strings[:FIELDS], strings[FIELDS:FIELDS + tags],
+                   created, modified, last_used,
+                   zip(replaced, strings[FIELDS + tags:]))
@@ -0,0 +1,133 @@
+"""
+fileutils.py
+
+Crash safe file writing and locking between processes.
+"""
+
+import os
+import time
+import random
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # not available on Windows, locks do nothing
+    fcntl = None
+
+LOCK_TIMEOUT = 10 # in seconds
+RETRY_DELAY = 0.001 # in seconds, doubled after every failed attempt
+MAX_RETRY_DELAY = 0.1 # in seconds
+
+@contextmanager
+def atomic_write(filename, backups=0):
+    """Replace a file so that it is either completely written or left
+    as it was.
+
+    Yields a binary file object for a temporary file in the same
+    directory. When the block finishes the temporary file is fsynced,
+    renamed over filename and the directory fsynced. If the block raises
+    the temporary file is removed and filename is untouched.
+
+    Arguments:
+    filename -- the file to replace.
+    backups -- number of previous versions to keep, as filename.1 (the
+               newest) to filename.N."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp = tempfile.mkstemp(dir=directory,
+                                prefix=os.path.basename(filename) + ".",
+                                suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as fo:
+            yield fo
+            fo.flush()
+            os.fsync(fo.fileno())
+        if backups:
+            rotate_backups(filename, backups)
+        os.replace(temp, filename)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except FileNotFoundError:
+            pass
+        raise
+    fsync_directory(directory)
+
+def fsync_directory(directory):
+    """fsync a directory so renames in it are durable."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def rotate_backups(filename, backups):
+    """Move filename.1 to filename.2 and so on, dropping the oldest, and
+    make filename.1 a copy of filename.
+
+    Arguments:
+    filename -- the file about to be replaced.
+    backups -- number of backups to keep."""
+    if not os.path.exists(filename):
+        return
+    for number in range(backups - 1, 0, -1):
+        older = f"{filename}.{number}"
+        if os.path.exists(older):
+            os.replace(older, f"{filename}.{number+1}")
+    newest = f"{filename}.1"
+    try:
+        os.remove(newest)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(filename, newest)
+    except OSError:
+        shutil.copy2(filename, newest)
+
+class FileLock(object):
+    """Advisory lock shared between processes.
+
+    The lock is taken with flock on its own lock file, so it still works
+    when the file it protects is replaced by a rename. Locks are not
+    re-entrant: don't take one while already holding one."""
+    def __init__(self, filename, timeout=LOCK_TIMEOUT):
+        """Arguments:
+        filename -- the lock file, created if it doesn't exist.
+        timeout -- seconds to keep retrying before raising LockError."""
+        self.filename = filename
+        self.timeout = timeout
+
+    def shared(self):
+        """Context manager holding the lock shared, for reading."""
+        return self._locked(fcntl and fcntl.LOCK_SH)
+
+    def exclusive(self):
+        """Context manager holding the lock exclusively, for writing."""
+        return self._locked(fcntl and fcntl.LOCK_EX)
+
+    @contextmanager
+    def _locked(self, operation):
+        """Take the lock, retrying with jittered exponential backoff."""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            deadline = time.monotonic() + self.timeout
+            delay = RETRY_DELAY
+            while True:
+                try:
+                    fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        raise LockError(self.filename)
+                    time.sleep(random.uniform(delay / 2, delay))
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+            yield
+        finally:
+            os.close(fd)
+
+class LockError(Exception):
+    pass
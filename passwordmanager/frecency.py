@@ -0,0 +1,102 @@
+"""
+frecency.py
+
+Time decayed scores ranking handles by how often and how recently they
+are used, and an ordered index of them.
+
+Each use adds a weight that halves every HALF_LIFE, so a handle used a
+lot long ago sinks below one used a little lately. Rather than decaying
+every score as time passes, a score is kept as the log of its weights
+scaled to EPOCH:
+
+score = log(sum of 2 ** ((time of use - EPOCH) / HALF_LIFE))
+
+Every score would decay by the same factor, so the order of handles only
+changes when one is used, and a use only changes that handle's score.
+The weight a score stands for now is decayed(score, now). Handles never
+used score NEVER.
+"""
+
+from math import exp, log, log1p, inf
+from bisect import bisect_left, insort
+
+HALF_LIFE = 30 * 24 * 60 * 60 # in seconds for a use to count half as much
+EPOCH = 1.6e9 # in seconds since 1970, when a use weighs 1
+RATE = log(2) / HALF_LIFE
+NEVER = -inf
+
+def weight(when, count=1):
+    """Return the score of count uses at when."""
+    return RATE * (when - EPOCH) + log(count)
+
+def bump(score, when, count=1):
+    """Return score with count more uses at when."""
+    new = weight(when, count)
+    if score < new:
+        score, new = new, score
+    if new == NEVER:
+        return score
+    return score + log1p(exp(new - score))
+
+def initial(popularity, last_used):
+    """Return a score for an entry saved before scores were kept, as if
+    its uses were all at its last use."""
+    if popularity <= 0:
+        return NEVER
+    return weight(last_used, popularity)
+
+def decayed(score, now):
+    """Return the weight score stands for at now, the number of uses it
+    is worth had they all been then."""
+    return exp(score - RATE * (now - EPOCH))
+
+class Ranking(object):
+    """Handles in order of score, best first, kept in order as scores
+    change instead of being sorted for each listing.
+
+    A change costs a binary search and a move of the list behind it, and
+    the top k handles are a slice."""
+    def __init__(self, scores=()):
+        """Arguments:
+        scores -- {handle: score}."""
+        self.scores = dict(scores)
+        self.order = sorted((-score, handle)
+                            for handle, score in self.scores.items())
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, handle):
+        return handle in self.scores
+
+    def score(self, handle):
+        """Return handle's score."""
+        return self.scores[handle]
+
+    def set(self, handle, score):
+        """Add handle, or move it to its place for a new score."""
+        old = self.scores.get(handle)
+        if old is not None:
+            del self.order[bisect_left(self.order, (-old, handle))]
+        self.scores[handle] = score
+        insort(self.order, (-score, handle))
+
+    def bump(self, handle, when, count=1):
+        """Add count uses of handle at when.
+
+        Returns:
+        the handle's new score."""
+        score = bump(self.scores[handle], when, count)
+        self.set(handle, score)
+        return score
+
+    def remove(self, handle):
+        """Remove handle, if it's there."""
+        score = self.scores.pop(handle, None)
+        if score is not None:
+            del self.order[bisect_left(self.order, (-score, handle))]
+
+    def top(self, k=None):
+        """Return the k best handles, or all of them, best first. Ties are
+        in order of handle."""
+        return [handle for score, handle in self.order[:k]]
@@ -0,0 +1,52 @@
+"""
+journal.py
+
+Append-only journal of popularity increments that have not yet been
+merged into the encrypted database. Handles are stored as keyed hashes
+so the journal does not reveal them.
+"""
+
+import os
+import hmac
+import hashlib
+from collections import Counter
+
+TAG_SIZE = 16 # in bytes
+
+def handle_tag(key, handle):
+    """Return the journal tag for handle.
+
+    Arguments:
+    key -- bytes to key the hash with.
+    handle -- the handle to tag."""
+    return hmac.new(key, handle.encode(), hashlib.sha256)\
+               .hexdigest()[:TAG_SIZE*2]
+
+class PopularityJournal(object):
+    """Side file of pending popularity increments."""
+    def __init__(self, filename):
+        self.filename = filename
+
+    def append(self, tag):
+        """Record one increment for tag."""
+        fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0o600)
+        try:
+            os.write(fd, (tag + "\n").encode())
+        finally:
+            os.close(fd)
+
+    def read(self):
+        """Return a Counter of increments per tag."""
+        try:
+            with open(self.filename) as fo:
+                return Counter(line.strip() for line in fo if line.strip())
+        except FileNotFoundError:
+            return Counter()
+
+    def clear(self):
+        """Forget all increments, once they are saved in the database."""
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,95 @@
+"""
+keyslots.py
+
+Key slots, holding the key a record file is encrypted with wrapped by
+keys derived from passwords.
+
+The records are encrypted with a random data key, which never changes
+with the master password. Each slot holds the data key sealed under a
+key derived from a password, with the scrypt parameters and salt to
+derive it again, so the master password is changed by rewriting one
+slot rather than re-encrypting every record. A file has room for
+SLOT_COUNT slots so that, for example, a recovery key can sit beside the
+master password.
+
+Slot table: slot * SLOT_COUNT
+slot: kind (1) | log2 n (1) | r (1) | p (1) | salt (16) |
+      key check (16) | wrapped key (60)
+
+The wrapped key is sealed (see securestrings.seal) with the salt of the
+data key, which is in the file header, as associated data so a slot
+can't be moved to another file. Unused slots are all zero.
+"""
+
+import hmac
+import struct
+from Crypto.Random import get_random_bytes
+from passwordmanager.securestrings import Key, SALT_SIZE, CHECK_SIZE, \
+        NONCE_SIZE, TAG_SIZE, derive_key, seal, unseal
+
+FREE = 0
+MASTER = 1
+RECOVERY = 2
+
+KEY_SIZE = 32 # in bytes
+SLOT_COUNT = 4
+SLOT = struct.Struct(">BBBB%ds%ds%ds" % (SALT_SIZE, CHECK_SIZE,
+                                        NONCE_SIZE + KEY_SIZE + TAG_SIZE))
+TABLE_SIZE = SLOT.size * SLOT_COUNT
+EMPTY = bytes(SLOT.size)
+
+def new_data_key():
+    """Return a random data Key for a new file. Its salt identifies the
+    file, it isn't derived from anything."""
+    return Key(get_random_bytes(KEY_SIZE), get_random_bytes(SALT_SIZE),
+               0, 0, 0)
+
+def make_slot(kind, data_key, key):
+    """Return a slot holding data_key wrapped by key.
+
+    Arguments:
+    kind -- MASTER or RECOVERY.
+    data_key -- the file's data Key.
+    key -- the Key derived from the slot's password."""
+    return SLOT.pack(kind, key.log_n, key.r, key.p, key.salt, key.check,
+                     seal(data_key.key, key, data_key.salt))
+
+def make_table(slots):
+    """Return the slot table holding slots, a list of slots from
+    make_slot, with the rest of the table free."""
+    if len(slots) > SLOT_COUNT:
+        raise ValueError("too many key slots")
+    return b"".join(slots) + EMPTY * (SLOT_COUNT - len(slots))
+
+def split_table(table):
+    """Return the slots of a slot table as a list."""
+    if len(table) != TABLE_SIZE:
+        raise ValueError("truncated key slots")
+    return [table[i:i + SLOT.size] for i in range(0, TABLE_SIZE, SLOT.size)]
+
+def slot_kind(slot):
+    """Return the kind of a slot, FREE if it's unused."""
+    return slot[0]
+
+def open_table(table, password, header):
+    """Return the data Key from the first slot password opens. Slots are
+    tried in order, each costing a key derivation, and a slot whose key
+    check doesn't match is skipped without unsealing it. Raises
+    ValueError if password opens none of them.
+
+    Arguments:
+    table -- the slot table.
+    password -- the password string.
+    header -- the file header, from securestrings.read_header."""
+    version, salt, log_n, r, p, size, check = header
+    for slot in split_table(table):
+        kind, log_n, r, p, slot_salt, slot_check, wrapped = \
+                SLOT.unpack(slot)
+        if kind == FREE:
+            continue
+        key = derive_key(password, slot_salt, log_n, r, p)
+        if hmac.compare_digest(key.check, slot_check):
+            data_key = Key(unseal(wrapped, key, salt), salt, 0, 0, 0)
+            data_key.verify(header)
+            return data_key
+    raise ValueError("key does not match file")
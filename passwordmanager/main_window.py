@@ -1,7 +1,11 @@
 
 from tkinter import Frame, Listbox, Scrollbar, Frame, Entry, Button, \
-                    Label, RIGHT, LEFT, BOTH, END, DISABLED, NORMAL, \
-                    SUNKEN, W, X
+                    Label, StringVar, RIGHT, LEFT, BOTH, END, DISABLED, \
+                    NORMAL, SUNKEN, W, X
+
+from passwordmanager.search import HandleIndex
+
+ROWS = 10 # handles shown in the scrollbox at once
 
 class MainWindow(object):
     """The graphical user interface for the app."""
@@ -15,7 +19,7 @@ class MainWindow(object):
         # ---- Window Setup: ---- #
         
         self.root.title("Password Manager")
-        self.root.geometry("260x320+200+200")       
+        self.root.geometry("260x350+200+200")       
 
         # ---- UI Elements: ---- #
         # Main frame:
@@ -33,17 +37,47 @@ class MainWindow(object):
         self.master_entry.pack(side = RIGHT)
         self.master_frame.pack()
 
+        # Handle search entry:
+
+        self.search_frame = Frame(self.mainframe)
+        Label(self.search_frame, text="Search:").pack(side = LEFT)
+        self.search = StringVar()
+        self.search_entry = Entry(self.search_frame,
+                                  textvariable=self.search)
+        self.search_entry.bind('<Return>', self.on_get)
+        self.search_entry.bind('<Up>', lambda e: self.move_selection(-1))
+        self.search_entry.bind('<Down>', lambda e: self.move_selection(1))
+        self.search_entry.pack(side = RIGHT)
+        self.search_frame.pack(pady=(10, 0))
+        self.search.trace_add('write', self.on_search)
+
         # Handle selector scroll box:
+        # Only the visible rows are kept in the listbox, the scrollbar
+        # scrolls through self.items.
+
+        self.index = HandleIndex()
+        self.items = [] # handles matching the search
+        self.shown = [] # handles in the listbox rows
+        self.top = 0 # position in items of the first row
+        self.selection = 0 # position in items of the selected handle
         
         self.selecter_frame = Frame(self.mainframe)
-        self.box = Listbox(self.selecter_frame)
+        self.box = Listbox(self.selecter_frame, height=ROWS)
         self.box.pack(side = LEFT)
         self.scrollbar = Scrollbar(self.selecter_frame)
         self.scrollbar.pack(side = RIGHT, fill = BOTH)
-        self.box.config(yscrollcommand = self.scrollbar.set) 
-        self.scrollbar.config(command = self.box.yview)
+        self.scrollbar.config(command = self.on_scroll)
         self.box.bind('<Return>', self.on_get)
         self.box.bind('<Double-Button-1>', self.on_get)
+        self.box.bind('<<ListboxSelect>>', self.on_select)
+        self.box.bind('<Up>', lambda e: self.move_selection(-1))
+        self.box.bind('<Down>', lambda e: self.move_selection(1))
+        self.box.bind('<Prior>', lambda e: self.move_selection(-ROWS))
+        self.box.bind('<Next>', lambda e: self.move_selection(ROWS))
+        self.box.bind('<MouseWheel>',
+                      lambda e: self.scroll_to(self.top - e.delta // 120))
+        self.box.bind('<Button-4>', lambda e: self.scroll_to(self.top - 1))
+        self.box.bind('<Button-5>', lambda e: self.scroll_to(self.top + 1))
         self.selecter_frame.pack(pady=(10))
 
         # Action buttons:
@@ -114,14 +148,86 @@ class MainWindow(object):
         self.on_command('CHG')
 
     def fill_box(self, handles):
-        """Display handles in scrollbox."""
-        self.box.delete(0, END)
-        if handles:
-            for handle in handles:
-                self.box.insert(END, handle)
-            self.box.select_set(0)
+        """Display handles matching the search in scrollbox."""
+        self.index.update(handles or [])
+        self.top = self.selection = 0
+        self.filter()
+        if self.items:
             self.enable_selection_buttons()
-            self.box.focus_set()
+            if self.root.focus_get() is not self.search_entry:
+                self.box.focus_set()
+
+    def on_search(self, *args):
+        """Filter the handles as the search text changes."""
+        self.top = self.selection = 0
+        self.filter()
+
+    def filter(self):
+        """Find the handles matching the search and show them."""
+        self.items = self.index.search(self.search.get())
+        self.render()
+
+    def render(self):
+        """Show the visible part of items in the listbox.
+        Only rows that differ from what is shown are replaced."""
+        rows = self.items[self.top:self.top + ROWS]
+        for i, handle in enumerate(rows):
+            if i >= len(self.shown):
+                self.box.insert(END, handle)
+            elif self.shown[i] != handle:
+                self.box.delete(i)
+                self.box.insert(i, handle)
+        if len(self.shown) > len(rows):
+            self.box.delete(len(rows), END)
+        self.shown = rows
+
+        self.box.selection_clear(0, END)
+        if self.top <= self.selection < self.top + len(rows):
+            self.box.select_set(self.selection - self.top)
+        if self.items:
+            self.scrollbar.set(self.top / len(self.items),
+                               (self.top + len(rows)) / len(self.items))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def selected(self):
+        """Return the selected handle, None if there isn't one."""
+        if 0 <= self.selection < len(self.items):
+            return self.items[self.selection]
+        return None
+
+    def scroll_to(self, top):
+        """Show items from position top."""
+        self.top = max(0, min(top, len(self.items) - ROWS))
+        self.render()
+        return "break"
+
+    def on_scroll(self, *args):
+        """Scroll for the scrollbar."""
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.items)))
+        elif args[0] == 'scroll':
+            step = ROWS if args[2] == 'pages' else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def on_select(self, *args):
+        """Record a selection made with the mouse."""
+        selection = self.box.curselection()
+        if selection:
+            self.selection = self.top + selection[0]
+
+    def move_selection(self, amount):
+        """Move the selection, scrolling to keep it visible."""
+        if not self.items:
+            return "break"
+        self.selection = max(0, min(self.selection + amount,
+                                    len(self.items) - 1))
+        if self.selection < self.top:
+            self.top = self.selection
+        elif self.selection >= self.top + ROWS:
+            self.top = self.selection - ROWS + 1
+        self.render()
+        return "break"
 
     def disable_all_buttons(self):
         """Disable all buttons."""
@@ -1,18 +1,135 @@
 
-from random import choice
+"""
+password_creator.py
+
+Random passwords with characters from chosen classes.
+"""
+
+import bisect
+import secrets
+from math import factorial
+from functools import lru_cache
+
+LOWER = "abcdefghijklmnopqrstuvwxyz"
+UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+DIGITS = "0123456789"
+SPECIAL = "!#$%&'()*+,-./<=>?@[\\]^_`"
+BUFFER_SIZE = 4096 # random bytes read at once
+TABLE_LENGTH = 32 # longest password whose class counts are tabulated
+
+# character -> the class it belongs to
+CHARACTER_CLASS = {char: chars for chars in (LOWER, UPPER, DIGITS, SPECIAL)
+                   for char in chars}
+
+def compositions(length, parts):
+    """Yield every tuple of parts positive integers adding up to length."""
+    if parts == 1:
+        yield (length,)
+        return
+    for first in range(1, length - parts + 2):
+        for rest in compositions(length - first, parts - 1):
+            yield (first,) + rest
+
+@lru_cache(maxsize=None)
+def class_counts(length, sizes):
+    """Return how many characters each class can get, with cumulative
+    weights for picking one. Each is weighted by the number of passwords
+    having those counts, so picking counts, then characters, then their
+    order is uniform over all passwords with every class.
+
+    Arguments:
+    length -- length of password.
+    sizes -- tuple of the number of characters in each class.
+    Returns:
+    (cumulative weights, [counts tuple])"""
+    if length < len(sizes):
+        raise ValueError("password shorter than its number of classes")
+    counts = list(compositions(length, len(sizes)))
+    cumulative = []
+    total = 0
+    for count in counts:
+        weight = factorial(length)
+        for n, size in zip(count, sizes):
+            weight = weight // factorial(n) * size ** n
+        total += weight
+        cumulative.append(total)
+    return cumulative, counts
 
 class PasswordCreator(object):
-    """Creates a random password.""" 
-    lower_chars = list(range(97, 123))
-    upper_chars = list(range(65, 91))
-    digits = list(range(48,57))
-    special_chars = [33] + list(range(35, 48)) + list(range(60, 65))\
-                    + list(range(91, 97))
-        
+    """Creates a random password.
+
+    Random bytes are read BUFFER_SIZE at a time and turned into choices
+    by rejecting the bytes that would make some choices more likely.
+
+    Up to TABLE_LENGTH characters, the counts of each class are picked
+    from a table of them all, which grows with length to the power of
+    the number of classes. A longer password is drawn from all the
+    classes at once and drawn again if it misses one, which is rare at
+    those lengths and just as uniform.
+
+    A password found in the breached passwords is thrown away and
+    another made in its place."""
+    def __init__(self, randbytes=secrets.token_bytes, breached=None):
+        """Arguments:
+        randbytes -- function returning n random bytes, from secrets
+                     unless testing.
+        breached -- container of breached passwords, such as a
+                    breach.Corpus, or None."""
+        self.randbytes = randbytes
+        self.breached = breached
+        self.buffer = b""
+        self.position = 0
+
+    def _bytes(self, n):
+        """Return the next n random bytes."""
+        if self.position + n > len(self.buffer):
+            self.buffer = self.buffer[self.position:] \
+                          + self.randbytes(max(n, BUFFER_SIZE))
+            self.position = 0
+        self.position += n
+        return self.buffer[self.position - n:self.position]
+
+    def _below(self, n):
+        """Return a random integer from 0 to n - 1."""
+        size = (n.bit_length() + 7) // 8
+        limit = 256 ** size - 256 ** size % n
+        while True:
+            value = int.from_bytes(self._bytes(size), "big")
+            if value < limit:
+                return value % n
+
+    def _choices(self, chars, n):
+        """Return a list of n characters from chars, which has at most
+        256."""
+        limit = 256 - 256 % len(chars)
+        choices = []
+        while len(choices) < n:
+            choices += [chars[byte % len(chars)]
+                        for byte in self._bytes(n - len(choices) + 4)
+                        if byte < limit]
+        return choices[:n]
+
+    def _shuffle(self, items):
+        """Shuffle items in place, each order equally likely."""
+        j = len(items) - 1
+        while j >= 256:
+            k = self._below(j + 1)
+            items[j], items[k] = items[k], items[j]
+            j -= 1
+        while j > 0:
+            for byte in self._bytes(j):
+                n = j + 1
+                if byte < 256 - 256 % n:
+                    k = byte % n
+                    items[j], items[k] = items[k], items[j]
+                    j -= 1
+                    if not j:
+                        break
+        return items
+
     def create(self, options):
-        """Create password from pool.
-        Check password has at least one character from each selected
-        category.
+        """Create password with at least one character from each
+        selected category, uniformly from all such passwords.
 
         Attributes: from options list:
         length - length of password
@@ -20,41 +137,39 @@ class PasswordCreator(object):
         digits - include digits
         special - include special characters
         """
+        return self.create_many(options, 1)[0]
+
+    def create_many(self, options, count):
+        """Create count passwords with the same options as create."""
         length, uppercase, digits, special = options
-        
-        pool = []
-        pool += self.lower_chars
+        classes = [LOWER]
         if uppercase:
-            pool += self.upper_chars
+            classes.append(UPPER)
         if digits:
-            pool += self.digits
+            classes.append(DIGITS)
         if special:
-            pool += self.special_chars
-        
-        valid_password = False
-        while not valid_password:
-            password = ""
-            lowercase_included = False
-            uppercase_included = False
-            digit_included = False
-            special_included = False
-
-            for i in range(length):
-                char = choice(pool)
-                if char in self.lower_chars:
-                    lowercase_included = True
-                elif char in self.upper_chars:
-                    uppercase_included = True
-                elif char in self.digits:
-                    digit_included = True
-                elif char in self.special_chars:
-                    special_included = True
-                password += chr(char)
-
-            if  (lowercase_included) \
-                and (not uppercase or uppercase_included) \
-                and (not digits or digit_included) \
-                and (not special or special_included):
-                valid_password = True
-                
-        return password
+            classes.append(SPECIAL)
+        if length < len(classes):
+            raise ValueError("password shorter than its number of classes")
+        if length <= TABLE_LENGTH:
+            cumulative, counts = class_counts(
+                length, tuple(len(chars) for chars in classes))
+        pool = "".join(classes)
+
+        passwords = []
+        while len(passwords) < count:
+            if length <= TABLE_LENGTH:
+                pick = bisect.bisect_right(cumulative,
+                                           self._below(cumulative[-1]))
+                password = []
+                for chars, n in zip(classes, counts[pick]):
+                    password += self._choices(chars, n)
+                password = "".join(self._shuffle(password))
+            else:
+                password = "".join(self._choices(pool, length))
+                if len({CHARACTER_CLASS[c] for c in password}) \
+                   < len(classes):
+                    continue
+            if self.breached is None or password not in self.breached:
+                passwords.append(password)
+        return passwords
@@ -0,0 +1,183 @@
+"""
+profiling.py
+
+Opt in timing of where the time goes in each controller operation.
+
+Set PMAN_PROFILE, or pass --profile to pman, to turn it on. Each
+operation, such as MainController.get, then records the time and number
+of calls of each stage it goes through: key derivation, file reads,
+decryption, parsing, waiting for locks and saving. A JSON line is
+written for each operation, to the file PMAN_PROFILE names or to
+standard error if it is "-" or "1", and a summary table is printed to
+standard error at exit.
+
+Stages may nest, saving includes the decryption it does, so their times
+are inclusive and need not add up to the operation's. Stages outside an
+operation aren't recorded, and an operation called by another is
+counted as part of it.
+
+When profiling is off, operation wrappers make one extra call and stage
+returns a shared do nothing context manager, so the cost is a few
+hundred nanoseconds per stage.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from functools import wraps
+from contextlib import nullcontext
+from collections import defaultdict
+
+ENVIRONMENT = "PMAN_PROFILE"
+STAGES = ("kdf", "read", "decrypt", "parse", "lock wait", "save")
+
+NULL = nullcontext()
+
+enabled = False
+output = None # file object for JSON lines
+totals = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+current = threading.local()
+
+class Stage(object):
+    """Context manager adding its time to the current operation."""
+    __slots__ = ("name", "counts", "start")
+
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        count = self.counts[self.name]
+        count[0] += 1
+        count[1] += time.perf_counter() - self.start
+
+class Waited(object):
+    """Context manager timing how long entering another one takes."""
+    __slots__ = ("context", "counts")
+
+    def __init__(self, context, counts):
+        self.context = context
+        self.counts = counts
+
+    def __enter__(self):
+        with Stage("lock wait", self.counts):
+            return self.context.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.context.__exit__(*exc_info)
+
+def stage(name):
+    """Return a context manager timing a stage of the current
+    operation."""
+    if not enabled:
+        return NULL
+    counts = getattr(current, "counts", None)
+    if counts is None:
+        return NULL
+    return Stage(name, counts)
+
+def waited(context):
+    """Return context, timing how long entering it takes as lock wait.
+
+    Arguments:
+    context -- a lock or a context manager acquiring one."""
+    if not enabled:
+        return context
+    counts = getattr(current, "counts", None)
+    if counts is None:
+        return context
+    return Waited(context, counts)
+
+def operation(name):
+    """Decorator recording a call of the function as an operation.
+
+    Arguments:
+    name -- the operation's name in the output."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled or getattr(current, "counts", None) is not None:
+                return function(*args, **kwargs)
+            current.counts = counts = defaultdict(lambda: [0, 0.0])
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                current.counts = None
+                record(name, seconds, counts)
+        return wrapper
+    return decorate
+
+def record(name, seconds, counts):
+    """Add an operation to the totals and write its JSON line."""
+    operation_totals = totals[name]
+    stages = {"total": (1, seconds)}
+    stages.update(counts)
+    for stage_name, (count, stage_seconds) in stages.items():
+        total = operation_totals[stage_name]
+        total[0] += count
+        total[1] += stage_seconds
+    if output is not None:
+        output.write(json.dumps({
+            "op": name, "ms": round(seconds * 1000, 3),
+            "stages": {stage_name: {"count": count,
+                                    "ms": round(stage_seconds * 1000, 3)}
+                       for stage_name, (count, stage_seconds)
+                       in counts.items()}}) + "\n")
+        output.flush()
+
+def summary():
+    """Return the table of total times, one row per operation and
+    stage."""
+    lines = [f"{'operation':<14} {'stage':<10} {'calls':>6} {'total ms':>10}"
+             f" {'mean ms':>9}"]
+    for name, stages in sorted(totals.items()):
+        for stage_name in ["total"] + [stage_name for stage_name in STAGES
+                                       if stage_name in stages] \
+                        + sorted(set(stages) - set(STAGES) - {"total"}):
+            count, seconds = stages[stage_name]
+            lines.append(f"{name:<14} {stage_name:<10} {count:>6} "
+                         f"{seconds * 1000:>10.2f} "
+                         f"{seconds * 1000 / count:>9.3f}")
+    return "\n".join(lines)
+
+def print_summary():
+    """Print the summary to standard error, if anything was recorded."""
+    if totals:
+        print(summary(), file=sys.stderr)
+
+def enable(destination="-"):
+    """Turn profiling on.
+
+    Arguments:
+    destination -- file name to append JSON lines to, "-" or "1" for
+                   standard error."""
+    global enabled, output
+    if enabled:
+        return
+    if destination in ("-", "1"):
+        output = sys.stderr
+    else:
+        output = open(destination, "a")
+    enabled = True
+    atexit.register(print_summary)
+
+def disable():
+    """Turn profiling off and forget what was recorded."""
+    global enabled, output
+    if output is not None and output is not sys.stderr:
+        output.close()
+    enabled = False
+    output = None
+    totals.clear()
+    atexit.unregister(print_summary)
+
+if os.environ.get(ENVIRONMENT):
+    enable(os.environ[ENVIRONMENT])
@@ -0,0 +1,504 @@
+"""
+records.py
+
+File of individually encrypted records.
+
+Each password is stored in its own encrypted record so a lookup only
+decrypts the index and one record, and a change appends records and a
+new index instead of rewriting the whole file.
+
+File format:
+header (see securestrings) | key slots (see keyslots) | frame... |
+trailer
+
+The frames are encrypted with the file's data key, which the key slots
+hold wrapped by keys derived from the master password and any others.
+Changing the master password rewrites one slot in place, see set_slot.
+
+frame: length (4) | kind (1) | sealed data
+trailer: magic (8) | offset of the current index frame (8)
+
+Frames are sealed with ChaCha20-Poly1305 (see securestrings.seal) with
+their kind as associated data, so a record can't be passed off as an
+index. A wrong password is rejected by the key checks in the slots, and
+a wrong data key by the key check in the header, before any frame is
+read.
+
+A record frame holds a packed Entry (see entry.py). An index frame holds
+a column for each field of the index entries, so it is decoded with a
+few array operations rather than field by field:
+
+count (8) | popularity (8 each) | offset (8 each) | length (8 each) |
+last used (8 each) | frecency (8 each) |
+handle length in characters (8 each) | handles
+
+with little endian integers and doubles, and the handles joined as
+UTF-8. Every change appends its frames followed by a new trailer
+pointing at the latest index. Replaced records, deleted records and old
+indexes are left in place as garbage until the file is compacted.
+
+The frecency is the handle's time decayed score, see frecency.py.
+
+Older files can still be read, so they can be upgraded. Version 5 files
+had no frecency column in the index; it is worked out from the
+popularity and last use. Version 4 files had no key slots, the frames
+were encrypted with the key derived from the master password. Version 3
+files were the same again but had the frames encrypted with AES-CBC and
+no MAC (iv (16) | ciphertext), under a header without the key check. Version 2 files were
+like version 3 but held the record [handle, password] and the index
+{handle: [popularity, offset, length]} as JSON.
+
+Writes are crash safe. A new file is written to a temporary file and
+renamed over the old one. An append is fsynced before its trailer is
+written, so a crash part way through leaves frames with no trailer after
+them; they are ignored when reading and truncated by the next append.
+"""
+
+import os
+import sys
+import json
+import struct
+import threading
+from array import array
+from itertools import accumulate
+from passwordmanager.securestrings import HEADER, OLD_HEADER, TAG_SIZE, \
+        read_file_header, load_key, decrypt, seal, unseal
+from passwordmanager import keyslots
+from passwordmanager.fileutils import atomic_write
+from passwordmanager.entry import Entry
+from passwordmanager.frecency import initial
+from passwordmanager.profiling import stage
+
+VERSION = 6
+SLOTS_VERSION = 5
+MASTER_KEY_VERSION = 4
+CBC_VERSION = 3
+JSON_VERSION = 2
+RECORD = 1
+INDEX = 2
+
+FRAME = struct.Struct(">IB")
+TRAILER = struct.Struct(">8sQ")
+TRAILER_MAGIC = b"PMANTAIL"
+
+COMPACT_RATIO = 0.5 # compact when this fraction of the file is garbage
+COMPACT_MIN = 64 * 1024 # in bytes, never compact smaller files
+COUNT = struct.Struct("<q")
+
+class IndexEntry(object):
+    """Where a handle's record is, with what is updated without
+    rewriting it."""
+    __slots__ = ("popularity", "offset", "length", "last_used", "frecency")
+
+    def __init__(self, popularity=0, offset=0, length=0, last_used=0.0,
+                 frecency=None):
+        self.popularity = popularity
+        self.offset = offset
+        self.length = length
+        self.last_used = last_used
+        self.frecency = initial(popularity, last_used) \
+                        if frecency is None else frecency
+
+def _column(typecode, values):
+    """Return values as little endian bytes."""
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+def _read_column(typecode, data, position, count):
+    """Return count values from data at position, and the position after
+    them."""
+    column = array(typecode)
+    end = position + count * column.itemsize
+    column.frombytes(data[position:end])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, end
+
+def pack_index(index, frecency=True):
+    """Return index, {handle: IndexEntry}, as bytes.
+
+    Arguments:
+    frecency -- whether to include the frecency column, False for the
+                index of a version 5 or older file."""
+    entries = index.values()
+    return b"".join([
+        COUNT.pack(len(index)),
+        _column("q", [entry.popularity for entry in entries]),
+        _column("q", [entry.offset for entry in entries]),
+        _column("q", [entry.length for entry in entries]),
+        _column("d", [entry.last_used for entry in entries]),
+        _column("d", [entry.frecency for entry in entries]
+                     if frecency else []),
+        _column("q", [len(handle) for handle in index]),
+        "".join(index).encode(),
+    ])
+
+def unpack_index(data, frecency=True):
+    """Return the index packed in data.
+
+    Arguments:
+    frecency -- whether data has the frecency column, which files
+                before this version don't."""
+    try:
+        count, = COUNT.unpack_from(data)
+    except struct.error:
+        raise ValueError("truncated index")
+    position = COUNT.size
+    columns = []
+    for typecode in "qqqddq" if frecency else "qqqdq":
+        column, position = _read_column(typecode, data, position, count)
+        columns.append(column)
+    if len(columns[-1]) != count:
+        raise ValueError("truncated index")
+    text = str(data[position:], "utf-8")
+    lengths = columns.pop()
+    handles = [text[end - length:end]
+               for end, length in zip(accumulate(lengths), lengths)]
+    return dict(zip(handles, map(IndexEntry, *columns)))
+
+_pread_lock = None if hasattr(os, "pread") else threading.Lock()
+
+def _pread(fo, length, offset):
+    """Read length bytes at offset from fo without using its position,
+    where os.pread isn't available by holding a lock while seeking."""
+    if _pread_lock is None:
+        return os.pread(fo.fileno(), length, offset)
+    with _pread_lock:
+        fo.seek(offset)
+        return fo.read(length)
+
+class RecordFile(object):
+    """Reads and writes a file of encrypted records."""
+    def __init__(self, filename, backups=0):
+        """Arguments:
+        filename -- the file to read and write.
+        backups -- number of previous versions to keep when the file is
+                   rewritten, see fileutils.rotate_backups."""
+        self.filename = filename
+        self.backups = backups
+
+    def format(self):
+        """Return the version of the file's format, None for an older
+        single encrypted string."""
+        with open(self.filename, 'rb') as fo:
+            header = read_file_header(fo)
+            return header and header[0]
+
+    def is_current(self):
+        """Return whether the file is in this format, rather than an
+        older one."""
+        return self.format() == VERSION
+
+    def load_key(self, password):
+        """Return the Key the file is encrypted with, opening its key
+        slots with password. Raises ValueError if password is wrong.
+
+        For files in older formats, the Key derived from password."""
+        with open(self.filename, 'rb') as fo:
+            header = read_file_header(fo)
+            if header is not None and header[0] >= SLOTS_VERSION:
+                return keyslots.open_table(fo.read(keyslots.TABLE_SIZE),
+                                           password, header)
+        return load_key(self.filename, password)
+
+    def write(self, key, entries, slots):
+        """Write a new file.
+
+        Arguments:
+        key -- the data Key to encrypt with, from keyslots.new_data_key.
+        entries -- iterable of (Entry, IndexEntry), the index entries
+                   giving the popularity and last use.
+        slots -- the key slot table, from keyslots.make_table.
+        Returns:
+        the index of the new file."""
+        index = {}
+        with stage("save"), atomic_write(self.filename, self.backups) as fo:
+            fo.write(key.header(VERSION))
+            fo.write(slots)
+            for entry, old in entries:
+                offset = fo.tell()
+                length = self._write_frame(fo, key, RECORD, entry.pack())
+                index[entry.handle] = IndexEntry(old.popularity, offset,
+                                                 length, old.last_used,
+                                                 old.frecency)
+            self._write_index(fo, key, index)
+        return index
+
+    def set_slot(self, kind, data_key, key):
+        """Wrap the data key with key in a slot of kind, replacing any
+        other slots of that kind, without rewriting the rest of the file.
+
+        The new slot is written to a free slot and synced before the
+        slots it replaces are cleared, and each write changes only the
+        bytes of one slot, so after a crash the file still opens with
+        either the old or the new key. Raises ValueError if there's no
+        free slot.
+
+        Arguments:
+        kind -- keyslots.MASTER or keyslots.RECOVERY.
+        data_key -- the Key the file is encrypted with.
+        key -- the Key derived from the slot's password."""
+        with open(self.filename, 'r+b') as fo:
+            if self._format(fo, data_key) < SLOTS_VERSION:
+                raise ValueError("file has no key slots")
+            position = fo.tell()
+            slots = keyslots.split_table(fo.read(keyslots.TABLE_SIZE))
+            kinds = [keyslots.slot_kind(slot) for slot in slots]
+            if keyslots.FREE not in kinds:
+                raise ValueError("no free key slot")
+            new = kinds.index(keyslots.FREE)
+            slots[new] = keyslots.make_slot(kind, data_key, key)
+            self._write_slots(fo, position, slots)
+            for i, slot_kind in enumerate(kinds):
+                if slot_kind == kind:
+                    slots[i] = keyslots.EMPTY
+            self._write_slots(fo, position, slots)
+
+    def version(self):
+        """Return a value that changes whenever the file is written."""
+        info = os.stat(self.filename)
+        return info.st_ino, info.st_size, info.st_mtime_ns
+
+    def read_index(self, key):
+        """Return the current index.
+
+        Arguments:
+        key -- the Key to decrypt with."""
+        with open(self.filename, 'rb') as fo:
+            return self._find_index(fo, key)[0]
+
+    def read_record(self, key, entry):
+        """Return the Entry for an IndexEntry."""
+        with open(self.filename, 'rb') as fo:
+            return self._read_record(fo, key, entry, self._format(fo, key))
+
+    def open(self):
+        """Return the file opened for read_record_at, with its format. It
+        keeps reading the same version of the file even after it is
+        compacted or rewritten, which replace the file.
+
+        Returns:
+        (file object, format)"""
+        fo = open(self.filename, 'rb')
+        header = read_file_header(fo)
+        return fo, header and header[0]
+
+    def read_record_at(self, fo, key, entry, format):
+        """Return the Entry for an IndexEntry from a file from open.
+        The file position isn't used, so threads may share fo."""
+        with stage("read"):
+            data = _pread(fo, entry.length, entry.offset)
+        if len(data) < FRAME.size:
+            raise ValueError("truncated frame")
+        length, kind = FRAME.unpack_from(data)
+        if kind != RECORD or length != len(data) - FRAME.size:
+            raise ValueError("unexpected frame")
+        plain = self._open_frame(memoryview(data)[FRAME.size:], key, kind,
+                                 format)
+        with stage("parse"):
+            if format == JSON_VERSION:
+                return Entry(*json.loads(plain))
+            return Entry.unpack(plain)
+
+    def record_tag(self, fo, entry):
+        """Return the last TAG_SIZE bytes of the record for an IndexEntry,
+        from a file from open. They are new for every record written and
+        stay with it when the file is compacted, so they identify it
+        without decrypting it."""
+        return _pread(fo, TAG_SIZE, entry.offset + entry.length - TAG_SIZE)
+
+    def read_records(self, key, index):
+        """Yield (Entry, IndexEntry) for every entry in index."""
+        with open(self.filename, 'rb') as fo:
+            format = self._format(fo, key)
+            for entry in index.values():
+                yield self._read_record(fo, key, entry, format), entry
+
+    def append(self, key, index, records):
+        """Append records and a new index. Compact the file if it has
+        become mostly garbage.
+
+        Arguments:
+        key -- the Key to encrypt with.
+        index -- the index, which already has entries for the records.
+                 It isn't changed, so readers may go on using it.
+        records -- dictionary of {handle: Entry} to write.
+
+        Returns:
+        the new index, with new IndexEntry objects for the records
+        written."""
+        index = dict(index)
+        with stage("save"), open(self.filename, 'r+b') as fo:
+            fo.seek(0, os.SEEK_END)
+            if not self._trailer_at(fo, fo.tell()):
+                fo.truncate(self._find_index(fo, key)[1])
+            fo.seek(0, os.SEEK_END)
+            for handle, record in records.items():
+                entry = index[handle]
+                offset = fo.tell()
+                index[handle] = IndexEntry(
+                    entry.popularity, offset,
+                    self._write_frame(fo, key, RECORD, record.pack()),
+                    entry.last_used, entry.frecency)
+            index_offset = fo.tell()
+            self._write_index(fo, key, index, sync=True)
+            size = fo.tell()
+        live = HEADER.size + keyslots.TABLE_SIZE + size - index_offset \
+               + sum(entry.length for entry in index.values())
+        if size > COMPACT_MIN and size - live > size * COMPACT_RATIO:
+            return self.compact(key, index)
+        return index
+
+    def compact(self, key, index):
+        """Rewrite the file with only the records in index. Records are
+        copied still encrypted. A version 5 file is upgraded, as only its
+        index differs.
+
+        Arguments:
+        key -- the Key the file is encrypted with.
+        index -- the current index, which isn't changed.
+
+        Returns:
+        the index of the new file."""
+        compacted = {}
+        with open(self.filename, 'rb') as src, \
+             atomic_write(self.filename, self.backups) as dst:
+            if self._format(src, key) < SLOTS_VERSION:
+                raise ValueError("file has no key slots")
+            dst.write(key.header(VERSION))
+            dst.write(src.read(keyslots.TABLE_SIZE))
+            for handle, entry in index.items():
+                src.seek(entry.offset)
+                compacted[handle] = IndexEntry(entry.popularity, dst.tell(),
+                                               entry.length, entry.last_used,
+                                               entry.frecency)
+                dst.write(src.read(entry.length))
+            self._write_index(dst, key, compacted)
+        return compacted
+
+    def _trailer_at(self, fo, end):
+        """Return the index offset from a trailer ending at end, or None
+        if there isn't one."""
+        if end < OLD_HEADER.size + TRAILER.size:
+            return None
+        fo.seek(end - TRAILER.size)
+        magic, offset = TRAILER.unpack(fo.read(TRAILER.size))
+        if magic != TRAILER_MAGIC or \
+           not OLD_HEADER.size <= offset < end - TRAILER.size:
+            return None
+        return offset
+
+    def _find_index(self, fo, key):
+        """Find the index of the last complete write.
+
+        If the file doesn't end with a trailer a write was interrupted,
+        so search back for the last trailer pointing at an index that
+        decrypts.
+
+        Returns:
+        (index, end of the trailer)"""
+        format = self._format(fo, key)
+        fo.seek(0, os.SEEK_END)
+        end = fo.tell()
+        offset = self._trailer_at(fo, end)
+        if offset is not None:
+            return self._read_index(fo, key, offset, format), end
+
+        fo.seek(0)
+        data = fo.read()
+        while True:
+            position = data.rfind(TRAILER_MAGIC, OLD_HEADER.size,
+                                  end - 1 - TRAILER.size + len(TRAILER_MAGIC))
+            if position < 0:
+                raise ValueError("no index")
+            end = position + TRAILER.size
+            offset = self._trailer_at(fo, end)
+            if offset is not None:
+                try:
+                    return self._read_index(fo, key, offset, format), end
+                except (ValueError, struct.error):
+                    pass
+
+    def _write_slots(self, fo, position, slots):
+        """Write the key slot table at position and sync it."""
+        fo.seek(position)
+        fo.write(keyslots.make_table(slots))
+        fo.flush()
+        os.fsync(fo.fileno())
+
+    def _format(self, fo, key):
+        """Return the format version from the header of fo. Raises
+        ValueError if the header shows fo isn't encrypted with key."""
+        fo.seek(0)
+        header = read_file_header(fo)
+        if header is None:
+            raise ValueError("not a record file")
+        key.verify(header)
+        return header[0]
+
+    def _read_index(self, fo, key, offset, format):
+        """Read the index frame at offset from a file in format."""
+        plain = self._read_frame(fo, key, offset, INDEX, format)
+        with stage("parse"):
+            if format == JSON_VERSION:
+                return {handle: IndexEntry(*entry)
+                        for handle, entry in json.loads(plain).items()}
+            return unpack_index(plain, format >= VERSION)
+
+    def _read_record(self, fo, key, entry, format):
+        """Read the record for an IndexEntry from a file in format."""
+        plain = self._read_frame(fo, key, entry.offset, RECORD, format)
+        with stage("parse"):
+            if format == JSON_VERSION:
+                return Entry(*json.loads(plain))
+            return Entry.unpack(plain)
+
+    def _write_index(self, fo, key, index, sync=False):
+        """Write index and a trailer pointing at it.
+
+        Arguments:
+        sync -- fsync before and after writing the trailer, so the
+                trailer is never on disk without the frames before it."""
+        offset = fo.tell()
+        self._write_frame(fo, key, INDEX, pack_index(index))
+        if sync:
+            fo.flush()
+            os.fsync(fo.fileno())
+        fo.write(TRAILER.pack(TRAILER_MAGIC, offset))
+        if sync:
+            fo.flush()
+            os.fsync(fo.fileno())
+
+    def _write_frame(self, fo, key, kind, data):
+        """Encrypt data and write it as a frame.
+
+        Returns:
+        the length of the frame."""
+        payload = seal(data, key, bytes((kind,)))
+        fo.write(FRAME.pack(len(payload), kind))
+        fo.write(payload)
+        return FRAME.size + len(payload)
+
+    def _read_frame(self, fo, key, offset, kind, format):
+        """Read and decrypt the frame at offset from a file in format.
+
+        Raises ValueError if the frame isn't of the expected kind, has
+        been changed or doesn't decrypt with key.
+
+        Returns:
+        the decrypted bytes."""
+        with stage("read"):
+            fo.seek(offset)
+            length, found = FRAME.unpack(fo.read(FRAME.size))
+            if found != kind:
+                raise ValueError("unexpected frame")
+            payload = memoryview(fo.read(length))
+        return self._open_frame(payload, key, kind, format)
+
+    def _open_frame(self, payload, key, kind, format):
+        """Decrypt the payload of a frame from a file in format."""
+        if format >= MASTER_KEY_VERSION:
+            return unseal(payload, key, bytes((kind,)))
+        return decrypt(payload[16:], key, payload[:16])
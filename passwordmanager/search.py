@@ -0,0 +1,154 @@
+"""
+search.py
+
+Index of handles for searching as the user types, and for finding the
+handle meant by a partial or misspelled name.
+"""
+
+import heapq
+from math import log1p
+from collections import Counter
+
+GRAM = 3 # characters per indexed substring
+EXACT_SCORE = 2 # beats any other match, plus one if the case matches too
+SUBSTRING_SCORE = 0.5 # up to 1 as the query covers more of the handle
+MIN_SCORE = 0.4 # trigram similarity needed for a misspelled match
+COMMON_SHARE = 0.05 # of handles containing a trigram to ignore it
+COMMON_MIN = 100 # handles containing a trigram before it can be ignored
+POPULARITY_WEIGHT = 0.1 # added for the most popular handle matched
+MATCH_LIMIT = 10
+
+def grams(text):
+    """Return the set of GRAM character substrings of text."""
+    return {text[i:i+GRAM] for i in range(len(text) - GRAM + 1)}
+
+def padded(text):
+    """Return text padded so its first and last characters start and
+    end trigrams of their own."""
+    return "  " + text + " "
+
+class HandleIndex(object):
+    """Case insensitive substring search over handles.
+
+    Handles are indexed by trigram, so a search only checks handles that
+    share every trigram of the query, and match only scores handles that
+    share at least one. A query containing the previous
+    query only filters the previous results, so each keystroke while
+    typing gets cheaper. Results keep the order handles were given in."""
+    def __init__(self, handles=()):
+        self.grams = {} # trigram -> set of handles
+        self.lower = {} # handle -> handle in lower case
+        self.sizes = {} # handle -> number of trigrams
+        self.order = {} # handle -> position
+        self.handles = []
+        self.last = None # (query, results)
+        self.update(handles)
+
+    def update(self, handles):
+        """Set the handles, in display order. Only handles that weren't
+        there before are indexed."""
+        handles = list(handles)
+        current = set(handles)
+        for handle in [handle for handle in self.lower
+                       if handle not in current]:
+            for gram in grams(padded(self.lower.pop(handle))):
+                self.grams[gram].discard(handle)
+            del self.sizes[handle]
+        for handle in handles:
+            if handle not in self.lower:
+                lower = self.lower[handle] = handle.lower()
+                handle_grams = grams(padded(lower))
+                for gram in handle_grams:
+                    self.grams.setdefault(gram, set()).add(handle)
+                self.sizes[handle] = len(handle_grams)
+        self.handles = handles
+        self.order = {handle: i for i, handle in enumerate(handles)}
+        self.last = None
+
+    def search(self, query):
+        """Return the handles containing query, in display order."""
+        query = query.lower()
+        if not query:
+            return list(self.handles)
+        if self.last is not None and self.last[0] in query:
+            candidates = self.last[1]
+        elif len(query) >= GRAM:
+            postings = sorted((self.grams.get(gram, set())
+                               for gram in grams(query)), key=len)
+            candidates = sorted(set.intersection(*postings),
+                                key=self.order.__getitem__)
+        else:
+            candidates = self.handles
+        lower = self.lower
+        results = [handle for handle in candidates if query in lower[handle]]
+        self.last = (query, results)
+        return results
+
+    def match(self, query, popularity=None, limit=MATCH_LIMIT):
+        """Find the handles query could mean. Exact matches score
+        highest, then handles containing query, then handles sharing
+        enough trigrams with it to be a misspelling. The popularity of a
+        handle adds up to POPULARITY_WEIGHT to its score.
+
+        Arguments:
+        query -- part or all of a handle.
+        popularity -- function returning the popularity of a handle.
+        limit -- most matches to return.
+        Returns:
+        list of (score, handle), best first."""
+        lower = query.lower()
+        if not lower:
+            return []
+        scores = {}
+        for handle in self.search(lower):
+            if self.lower[handle] == lower:
+                scores[handle] = EXACT_SCORE + (handle == query)
+            else:
+                scores[handle] = SUBSTRING_SCORE + (1 - SUBSTRING_SCORE) \
+                                 * len(lower) / len(handle)
+
+        if not scores:
+            self._misspelled(lower, scores)
+
+        if popularity is not None and scores:
+            weights = {handle: log1p(max(popularity(handle), 0))
+                       for handle in scores}
+            top = max(weights.values()) or 1
+            for handle, weight in weights.items():
+                scores[handle] += POPULARITY_WEIGHT * weight / top
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, handle) for handle, score in best]
+
+    def _misspelled(self, lower, scores):
+        """Score the handles sharing enough trigrams with lower to be what
+        a misspelled query meant. The score is the mean of the share of
+        the query's trigrams the handle has, so part of a handle still
+        matches, and their Dice coefficient, so closer lengths rank
+        higher.
+
+        Trigrams found in more than COMMON_SHARE of the handles, like
+        those of ".com", say little about which handle is meant. They
+        are left out of the similarity, so their long postings are never
+        counted."""
+        limit = max(COMMON_MIN, COMMON_SHARE * len(self.lower))
+        index = self.grams
+
+        def informative(text):
+            return [gram for gram in grams(padded(text))
+                    if len(index.get(gram, ())) <= limit]
+
+        query_grams = informative(lower)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(index.get(gram, ()))
+        # A handle sharing count trigrams has at least count of its own,
+        # so both halves of its score are at most 2 count / (size + count).
+        size = len(query_grams)
+        needed = MIN_SCORE * size / (2 - MIN_SCORE)
+        for handle, count in shared.items():
+            if count >= needed:
+                dice = 2 * count / (size + len(informative(
+                                                    self.lower[handle])))
+                score = (count / size + dice) / 2
+                if score >= MIN_SCORE:
+                    scores[handle] = score
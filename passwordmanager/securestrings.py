@@ -5,19 +5,223 @@ securestrings.py
 A python library for saving and loading encrypted strings for securing 
 passwords, etc. with AES256 bit encryption using pycryptodome. 
 
-Tom Clayton 2020.
+Keys are derived from the password with scrypt. The salt and work factor
+are stored in a header at the start of the file so the key can be
+derived once with load_key and passed in place of the password to save
+and load without deriving it again. The header ends with a key check
+value, an HMAC of a constant under the key, so a wrong password is
+rejected as soon as the key is derived, before anything is decrypted.
+
+File format:
+magic (4) | version (1) | log2 n (1) | r (1) | p (1) | salt (16) |
+key check (16) | nonce (12) | ciphertext | tag (16)
+
+The data is sealed with ChaCha20-Poly1305 by seal, so a wrong key or a
+changed file fails the tag check instead of decrypting to garbage. It is
+used rather than AES-GCM because pycryptodome sets up a GCM cipher more
+slowly, which dominates for small records. Other
+formats, such as the record file in records.py, use the same header with
+their own version.
+
+Older files can still be loaded. They were encrypted with AES-CBC and
+no MAC, under a header without the key check (magic OLD_MAGIC) or, at
+first, no header at all (iv | ciphertext, key is the sha256 of the
+password).
+
+Large data such as notes and key files can be encrypted from one file
+object to another with encrypt_stream and decrypt_stream, which work in
+fixed size chunks so memory use does not grow with the size of the data.
+
+Stream format:
+magic (4) | version (1) | chunk size (4) | salt (16) | chunk...
+chunk: length (4) | final (1) | ciphertext | tag (16)
 
-TODO change key generation.
+Each chunk is sealed with AES-GCM under a key derived from the Key and
+the stream's salt. The nonce is the chunk number and the final flag, and
+the stream header is authenticated with every chunk, so reordered,
+dropped or truncated chunks fail to decrypt.
 
+Tom Clayton 2020.
 """
 
+import hmac
 import hashlib
-from Crypto.Cipher import AES
+import struct
+from Crypto.Cipher import AES, ChaCha20_Poly1305
+from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad, unpad
+from passwordmanager.fileutils import atomic_write
+from passwordmanager.profiling import stage
+
+MAGIC = b"PMAK"
+OLD_MAGIC = b"PMAN" # header without a key check, data in AES-CBC
+VERSION = 2
+SALT_SIZE = 16
+CHECK_SIZE = 16 # in bytes, of the key check value
+NONCE_SIZE = 12
+SCRYPT_LOG_N = 15 # work factor, n = 2**SCRYPT_LOG_N
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+OLD_HEADER = struct.Struct(">4sBBBB%ds" % SALT_SIZE)
+HEADER = struct.Struct(">4sBBBB%ds%ds" % (SALT_SIZE, CHECK_SIZE))
+
+STREAM_MAGIC = b"PMST"
+STREAM_VERSION = 1
+CHUNK_SIZE = 64 * 1024 # in bytes
+TAG_SIZE = 16
+STREAM_HEADER = struct.Struct(">4sBI%ds" % SALT_SIZE)
+CHUNK = struct.Struct(">IB")
+NONCE = struct.Struct(">QI")
+
+class Key(object):
+    """A key derived from a password, with the parameters used."""
+    def __init__(self, key, salt=None, log_n=None, r=None, p=None):
+        """Arguments:
+        key -- the 32 byte key.
+        salt, log_n, r, p -- the scrypt parameters, None for a key in
+                             the old unsalted sha256 format."""
+        self.key = key
+        self.salt = salt
+        self.log_n = log_n
+        self.r = r
+        self.p = p
+        self.check = hmac.new(key, b"key check", hashlib.sha256)\
+                         .digest()[:CHECK_SIZE]
+
+    @property
+    def legacy(self):
+        """Return whether this key is for the old headerless format."""
+        return self.salt is None
+
+    def header(self, version=VERSION, check=True):
+        """Return the file header for this key.
+
+        Arguments:
+        version -- the format version of the data following the header.
+        check -- whether to include the key check, False for the header
+                 of older formats."""
+        if not check:
+            return OLD_HEADER.pack(OLD_MAGIC, version, self.log_n, self.r,
+                                   self.p, self.salt)
+        return HEADER.pack(MAGIC, version, self.log_n, self.r, self.p,
+                           self.salt, self.check)
+
+    def verify(self, header):
+        """Raise ValueError if this isn't the key for a file.
+
+        Arguments:
+        header -- the file's header, from read_header."""
+        version, salt, log_n, r, p, size, check = header
+        if self.salt != salt or \
+           check is not None and not hmac.compare_digest(self.check, check):
+            raise ValueError("key does not match file")
+
+def derive_key(password, salt=None, log_n=None, r=None, p=None):
+    """Derive a key from password with scrypt.
+
+    Arguments:
+    password -- the password string.
+    salt -- salt bytes, a new random salt if None.
+    log_n, r, p -- scrypt parameters, module defaults if None.
+    Returns:
+    a Key."""
+    salt = salt or get_random_bytes(SALT_SIZE)
+    log_n = log_n or SCRYPT_LOG_N
+    r = r or SCRYPT_R
+    p = p or SCRYPT_P
+    with stage("kdf"):
+        key = hashlib.scrypt(password.encode(), salt=salt, n=2**log_n, r=r,
+                             p=p, maxmem=129 * r * p * 2**log_n + 2**20,
+                             dklen=32)
+    return Key(key, salt, log_n, r, p)
+
+def legacy_key(password):
+    """Return the key used by files without a header."""
+    return Key(hashlib.sha256(password.encode()).digest())
+
+def read_header(data):
+    """Read the header from the start of data.
+
+    Returns:
+    (version, salt, log_n, r, p, header size, key check), or None if data
+    has no header. The key check is None for the older header."""
+    magic = data[:len(MAGIC)]
+    if magic == MAGIC and len(data) >= HEADER.size:
+        magic, version, log_n, r, p, salt, check = HEADER.unpack_from(data)
+        return version, salt, log_n, r, p, HEADER.size, check
+    if magic == OLD_MAGIC and len(data) >= OLD_HEADER.size:
+        magic, version, log_n, r, p, salt = OLD_HEADER.unpack_from(data)
+        return version, salt, log_n, r, p, OLD_HEADER.size, None
+    return None
+
+def read_file_header(fo):
+    """Read the header from the start of a file object, reading no
+    further than its end so fo can be a stream.
+
+    Returns:
+    as read_header, with fo after the header if there is one."""
+    data = fo.read(OLD_HEADER.size)
+    if data[:len(MAGIC)] == MAGIC:
+        data += fo.read(HEADER.size - OLD_HEADER.size)
+    return read_header(data)
+
+def load_key(filename, password):
+    """Derive the key for an existing file.
+
+    Raises ValueError if the file's key check shows password is wrong.
+
+    Arguments:
+    filename -- the encrypted file.
+    password -- the password string.
+    Returns:
+    a Key that can be passed to save_string and load_string."""
+    with open(filename, 'rb') as fo:
+        header = read_file_header(fo)
+    if header is None:
+        return legacy_key(password)
+    version, salt, log_n, r, p, size, check = header
+    key = derive_key(password, salt, log_n, r, p)
+    key.verify(header)
+    return key
+
+def _key(password):
+    """Return key bytes for a Key or a password string."""
+    if isinstance(password, Key):
+        return password.key
+    return legacy_key(password).key
+
+def seal(data, key, associated=b""):
+    """Encrypt and authenticate data with ChaCha20-Poly1305.
+
+    Arguments:
+    data -- the bytes to encrypt.
+    key -- a Key.
+    associated -- bytes authenticated along with data but not
+                  encrypted, which must be given again to unseal.
+    Returns:
+    nonce | ciphertext | tag"""
+    nonce = get_random_bytes(NONCE_SIZE)
+    cipher = ChaCha20_Poly1305.new(key=key.key, nonce=nonce)
+    cipher.update(associated)
+    ciphertext, tag = cipher.encrypt_and_digest(data)
+    return b"".join((nonce, ciphertext, tag))
+
+def unseal(data, key, associated=b""):
+    """Decrypt data sealed by seal. Raises ValueError if data was not
+    sealed with key and associated, or has been changed."""
+    if len(data) < NONCE_SIZE + TAG_SIZE:
+        raise ValueError("truncated data")
+    with stage("decrypt"):
+        cipher = ChaCha20_Poly1305.new(key=key.key,
+                                       nonce=data[:NONCE_SIZE])
+        cipher.update(associated)
+        return cipher.decrypt_and_verify(data[NONCE_SIZE:-TAG_SIZE],
+                                         data[-TAG_SIZE:])
 
 def encrypt(data, password, iv=None):
-    """encrypt data"""
-    key = hashlib.sha256(password.encode()).digest() 
+    """encrypt data with AES-CBC, as in files of older formats"""
+    key = _key(password)
     
     if iv:
         cipher = AES.new(key, AES.MODE_CBC, iv=iv)
@@ -30,25 +234,155 @@ def encrypt(data, password, iv=None):
         
             
 def decrypt(data, password, iv):
-    """decrypt data"""
-    key = hashlib.sha256(password.encode()).digest()
-    cipher = AES.new(key, AES.MODE_CBC, iv=iv)
-    try:
+    """decrypt data encrypted by encrypt. Raises ValueError if the
+    padding is wrong, which a wrong key usually but not always causes."""
+    key = _key(password)
+    with stage("decrypt"):
+        cipher = AES.new(key, AES.MODE_CBC, iv=iv)
         return unpad(cipher.decrypt(data), 16)
-    except Exception as e: 
-        return None
 
 def save_string(filename, password, string):
-    """save encrypted string"""
-    with open(filename, 'wb') as fo:
-        fo.write(encrypt(string.encode(), password))
+    """save encrypted string
+
+    password may be a password string, for which a new salted key is
+    derived, or a Key from load_key or derive_key. The file is replaced
+    atomically, see fileutils.atomic_write."""
+    if not isinstance(password, Key):
+        password = derive_key(password)
+    with atomic_write(filename) as fo:
+        if password.legacy:
+            fo.write(encrypt(string.encode(), password))
+        else:
+            fo.write(password.header())
+            fo.write(seal(string.encode(), password))
 
 def load_string(filename, password):
-    """load encrypted string"""
-    with open(filename, 'rb') as fo:
+    """load encrypted string
+
+    password may be a password string or a Key from load_key."""
+    with stage("read"), open(filename, 'rb') as fo:
         load_data = fo.read()
+
+    header = read_header(load_data)
+    if header is None:
+        offset = 0
+        check = None
+        key = legacy_key(password) if isinstance(password, str) else password
+        if not key.legacy:
+            raise ValueError("key does not match file")
+    else:
+        version, salt, log_n, r, p, offset, check = header
+        if not isinstance(password, Key):
+            password = derive_key(password, salt, log_n, r, p)
+        key = password
+        key.verify(header)
     
-    iv = load_data[:16]       
-    data = load_data[16:]
-    return decrypt(data, password, iv).decode()
+    load_data = memoryview(load_data)
+    if check is not None:
+        return unseal(load_data[offset:], key).decode()
+    iv = load_data[offset:offset+16]       
+    data = load_data[offset+16:]
+    return decrypt(data, key, iv).decode()
+
+def _stream_key(key, salt):
+    """Return the key for the stream with salt."""
+    return hmac.new(key.key, b"stream" + salt, hashlib.sha256).digest()
+
+def _stream_cipher(stream_key, header, counter, final):
+    """Return the cipher for one chunk of a stream."""
+    cipher = AES.new(stream_key, AES.MODE_GCM,
+                     nonce=NONCE.pack(counter, final))
+    cipher.update(header)
+    return cipher
+
+def _read_full(src, view):
+    """Fill view from src, stopping early only at end of file.
+
+    Returns:
+    the number of bytes read."""
+    total = 0
+    while total < len(view):
+        count = src.readinto(view[total:])
+        if not count:
+            break
+        total += count
+    return total
+
+def encrypt_stream(src, dst, key, chunk_size=None):
+    """Encrypt everything read from src and write it to dst.
+
+    Arguments:
+    src -- binary file object to read plain data from.
+    dst -- binary file object to write the stream to.
+    key -- a Key.
+    chunk_size -- bytes of plain data per chunk, CHUNK_SIZE if None.
+    Returns:
+    the number of plain bytes encrypted."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    salt = get_random_bytes(SALT_SIZE)
+    header = STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size,
+                                salt)
+    dst.write(header)
+    stream_key = _stream_key(key, salt)
+
+    plain = memoryview(bytearray(chunk_size))
+    encrypted = memoryview(bytearray(chunk_size))
+    total = 0
+    counter = 0
+    final = False
+    while not final:
+        length = _read_full(src, plain)
+        final = length < chunk_size
+        cipher = _stream_cipher(stream_key, header, counter, final)
+        cipher.encrypt(plain[:length], output=encrypted[:length])
+        dst.write(CHUNK.pack(length, final))
+        dst.write(encrypted[:length])
+        dst.write(cipher.digest())
+        total += length
+        counter += 1
+    return total
+
+def decrypt_stream(src, dst, key):
+    """Decrypt a stream written by encrypt_stream.
+
+    Each chunk is verified before it is written to dst. Raises
+    ValueError if the stream is truncated, has been tampered with or was
+    not encrypted with key, in which case anything already written to
+    dst should be discarded.
+
+    Arguments:
+    src -- binary file object to read the stream from.
+    dst -- binary file object to write plain data to.
+    key -- a Key.
+    Returns:
+    the number of plain bytes decrypted."""
+    header = src.read(STREAM_HEADER.size)
+    if len(header) < STREAM_HEADER.size:
+        raise ValueError("truncated stream")
+    magic, version, chunk_size, salt = STREAM_HEADER.unpack(header)
+    if magic != STREAM_MAGIC or version != STREAM_VERSION:
+        raise ValueError("not a stream")
+    stream_key = _stream_key(key, salt)
 
+    encrypted = memoryview(bytearray(chunk_size + TAG_SIZE))
+    plain = memoryview(bytearray(chunk_size))
+    total = 0
+    counter = 0
+    final = False
+    while not final:
+        chunk_header = src.read(CHUNK.size)
+        if len(chunk_header) < CHUNK.size:
+            raise ValueError("truncated stream")
+        length, final = CHUNK.unpack(chunk_header)
+        if length > chunk_size:
+            raise ValueError("chunk too long")
+        chunk = encrypted[:length + TAG_SIZE]
+        if _read_full(src, chunk) < len(chunk):
+            raise ValueError("truncated stream")
+        cipher = _stream_cipher(stream_key, header, counter, final)
+        cipher.decrypt(chunk[:length], output=plain[:length])
+        cipher.verify(chunk[length:])
+        dst.write(plain[:length])
+        total += length
+        counter += 1
+    return total
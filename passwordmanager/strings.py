@@ -15,6 +15,10 @@ SHOW_REQUEST = """Enter characters to show seperated by a space.
 Leave blank for all."""
 ENTER_SUCCESS = """Password recognised."""
 ENTER_FAIL = """Password not recognised."""
+HANDLE_FAIL = """Password name not found."""
+HANDLE_AMBIGUOUS = """Several password names match, be more specific."""
+HANDLE_PICK = """Number: """
+EXPORT_MISMATCH = """Export passwords don't match."""
 CREATE_SUCCESS = """Password created, copied to clipboard."""
 CREATE_FAIL = """Password NOT created."""
 COPY_SUCCESS = """Password copied to clipboard."""
@@ -23,3 +27,4 @@ DELETE_FAIL = """Password NOT deleted."""
 CHANGE_SUCCESS = """Master password accepted."""
 CHANGE_FAIL = """Master password NOT changed."""
 READY = """Ready."""
+BUSY = """Working..."""
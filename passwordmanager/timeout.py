@@ -2,41 +2,126 @@
 """
 timeout.py
 
-Re-triggerable timeout with callback.
+Deadline scheduler, and a re-triggerable timeout with callbacks.
 
 Tom Clayton - 2021
 """
 
 import time
+import heapq
 import threading
+import traceback
 
-RESOLUTION = 1 # in s
+class Scheduler(object):
+    """Runs callbacks at named deadlines on one background thread.
+
+    Deadlines are kept in a heap and the thread waits on a condition
+    until the earliest is due, so it only wakes when a deadline fires
+    or an earlier one is set. Setting a deadline that already exists
+    replaces it; the old heap entry is skipped when it comes up.
+    The thread is started when the first deadline is set."""
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap = [] # (time, sequence, name)
+        self.deadlines = {} # name -> (time, sequence, callback)
+        self.sequence = 0
+        self.thread = None
+        self.wakeups = 0
+
+    def set(self, name, delay, callback):
+        """Call callback, on the scheduler thread, delay seconds from now.
+
+        Arguments:
+        name -- the deadline, replacing any with the same name.
+        delay -- in seconds.
+        callback -- function taking no arguments."""
+        when = time.monotonic() + delay
+        with self.condition:
+            self.sequence += 1
+            self.deadlines[name] = (when, self.sequence, callback)
+            earliest = not self.heap or when < self.heap[0][0]
+            heapq.heappush(self.heap, (when, self.sequence, name))
+            if len(self.heap) > 2 * len(self.deadlines) + 16:
+                self.heap = [(at, number, key) for key, (at, number, _)
+                             in self.deadlines.items()]
+                heapq.heapify(self.heap)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            elif earliest:
+                self.condition.notify()
+
+    def cancel(self, name):
+        """Remove deadline name if it is set."""
+        with self.condition:
+            self.deadlines.pop(name, None)
+
+    def remaining(self, name):
+        """Return seconds until deadline name, or None if it isn't set."""
+        with self.condition:
+            deadline = self.deadlines.get(name)
+        if deadline is None:
+            return None
+        return max(deadline[0] - time.monotonic(), 0)
+
+    def _due(self):
+        """Return the callback of a deadline that is due and remove it,
+        or the seconds to wait for the next one (None for no deadlines).
+        Call holding the condition."""
+        while self.heap:
+            when, sequence, name = self.heap[0]
+            deadline = self.deadlines.get(name)
+            if deadline is None or deadline[1] != sequence:
+                heapq.heappop(self.heap)
+                continue
+            wait = when - time.monotonic()
+            if wait > 0:
+                return None, wait
+            heapq.heappop(self.heap)
+            del self.deadlines[name]
+            return deadline[2], None
+        return None, None
+
+    def _run(self):
+        """Wait for deadlines and run their callbacks."""
+        while True:
+            with self.condition:
+                callback, wait = self._due()
+                while callback is None:
+                    self.condition.wait(wait)
+                    self.wakeups += 1
+                    callback, wait = self._due()
+            try:
+                callback()
+            except Exception:
+                traceback.print_exc()
 
 class Timeout(object):
-    def __init__(self, timeout, callback):
+    """Calls its callbacks timeout seconds after the last trigger."""
+    def __init__(self, timeout, callback, scheduler=None, name="timeout"):
+        """Arguments:
+        timeout -- in seconds.
+        callback -- function taking no arguments.
+        scheduler -- Scheduler to run on, a new one by default.
+        name -- the deadline's name in scheduler."""
         self.callbacks = [callback]
         self.timeout = timeout
-        self.timer = 0
-        thread = threading.Thread(target=self.check, daemon=True)
-        thread.start()
-        
+        self.scheduler = scheduler or Scheduler()
+        self.name = name
 
     def trigger(self):
         """Start/re-trigger the timeout."""
-        self.timer = time.time() + self.timeout
+        self.scheduler.set(self.name, self.timeout, self.expire)
+
+    def cancel(self):
+        """Stop the timeout without calling the callbacks."""
+        self.scheduler.cancel(self.name)
 
     def add_callback(self, callback):
         """add a callback."""
         self.callbacks.append(callback)
 
-    def check(self):
-        """Check time out and setup recurring check."""
-        while(True):
-            time.sleep(RESOLUTION)
-            if self.timer and time.time() > self.timer:
-                self.timer = 0
-                for callback in self.callbacks:
-                    callback()       
-
-
-    
+    def expire(self):
+        """Call the callbacks."""
+        for callback in self.callbacks:
+            callback()
@@ -0,0 +1,228 @@
+
+"""
+transfer.py
+
+Importing passwords exported by other password managers, and encrypted
+exports of the database.
+
+Imports are read a row at a time. CSV files are recognised by their
+header, which names the handle and password columns as KeePass,
+Bitwarden, browsers and pman itself do. JSON lines files hold one
+{"handle": ..., "password": ...} object per line, as pman batch prints.
+JSON documents (a Bitwarden export, or a list of objects) have to be
+loaded whole.
+
+An export is a key header followed by an encrypted stream of JSON lines,
+written and read a chunk at a time.
+"""
+
+import io
+import os
+import csv
+import json
+
+from passwordmanager.securestrings import derive_key, read_file_header, \
+        encrypt_stream, decrypt_stream
+
+HANDLE_COLUMNS = ("handle", "name", "title", "account")
+PASSWORD_COLUMNS = ("password", "login_password")
+FORMATS = ("csv", "jsonl", "json", "pman")
+POLICIES = ("skip", "replace", "rename")
+
+def _column(fieldnames, names):
+    """Return the first field in fieldnames matching names, ignoring
+    case."""
+    fields = {field.strip().lower(): field for field in fieldnames or ()}
+    for name in names:
+        if name in fields:
+            return fields[name]
+    raise ValueError(f"no {' or '.join(names)} column")
+
+def read_csv(fo):
+    """Yield (handle, password) from a CSV file with a header row."""
+    reader = csv.DictReader(fo)
+    handle = _column(reader.fieldnames, HANDLE_COLUMNS)
+    password = _column(reader.fieldnames, PASSWORD_COLUMNS)
+    for row in reader:
+        if row[handle] and row[password]:
+            yield row[handle], row[password]
+
+def _entry(item):
+    """Return (handle, password) from a JSON object, None if it has no
+    password. Raises ValueError if item isn't an object or its handle or
+    password isn't a string."""
+    if not isinstance(item, dict):
+        raise ValueError("import item isn't an object")
+    item = {key.lower(): value for key, value in item.items()}
+    login = item.get("login") or {}
+    if not isinstance(login, dict):
+        raise ValueError("import item's login isn't an object")
+    handle = next((item[name] for name in HANDLE_COLUMNS if item.get(name)),
+                  None)
+    password = item.get("password") or login.get("password")
+    if handle and password:
+        if not isinstance(handle, str) or not isinstance(password, str):
+            raise ValueError("import item's handle or password isn't a "
+                             "string")
+        return handle, password
+    return None
+
+def read_jsonl(fo):
+    """Yield (handle, password) from a file of JSON objects, one a line."""
+    for line in fo:
+        if line.strip():
+            entry = _entry(json.loads(line))
+            if entry:
+                yield entry
+
+def read_json(fo):
+    """Yield (handle, password) from a JSON document, a list of objects
+    or an object with an "items" list."""
+    document = json.load(fo)
+    if isinstance(document, dict):
+        document = document.get("items", [])
+    if not isinstance(document, list):
+        raise ValueError("import isn't a list of objects")
+    for item in document:
+        entry = _entry(item)
+        if entry:
+            yield entry
+
+def guess_format(filename):
+    """Return the import format for filename."""
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension in FORMATS:
+        return extension
+    with open(filename, "rb") as fo:
+        if read_file_header(fo) is not None:
+            return "pman"
+    return "csv"
+
+def read_entries(filename, format=None, password=None):
+    """Yield (handle, password) from an import file.
+
+    Arguments:
+    filename -- the file.
+    format -- one of FORMATS, guessed from filename if None.
+    password -- the password of a pman export."""
+    format = format or guess_format(filename)
+    if format == "pman":
+        with open(filename, "rb") as fo:
+            yield from read_export(fo, password)
+        return
+    readers = {"csv": read_csv, "jsonl": read_jsonl, "json": read_json}
+    with open(filename, newline="", encoding="utf-8-sig") as fo:
+        yield from readers[format](fo)
+
+def merge(entries, existing, policy="skip"):
+    """Decide what to write for imported entries. Later entries for the
+    same handle replace earlier ones, except with the rename policy.
+
+    Arguments:
+    entries -- iterable of (handle, password).
+    existing -- collection of the handles already in the database.
+    policy -- for handles that exist: "skip" them, "replace" them, or
+              "rename" the import to "handle (2)", "handle (3)"...
+    Returns:
+    ({handle: password} to write, report dictionary of counts)."""
+    if policy not in POLICIES:
+        raise ValueError(f"unknown policy {policy}")
+    passwords = {}
+    report = {"read": 0, "added": 0, "replaced": 0, "skipped": 0,
+              "renamed": 0}
+    for handle, password in entries:
+        report["read"] += 1
+        if handle in existing or (policy == "rename" and handle in passwords):
+            if policy == "skip":
+                report["skipped"] += 1
+                continue
+            if policy == "rename":
+                number = 2
+                while f"{handle} ({number})" in existing \
+                        or f"{handle} ({number})" in passwords:
+                    number += 1
+                handle = f"{handle} ({number})"
+                report["renamed"] += 1
+            elif handle not in passwords:
+                report["replaced"] += 1
+        elif handle not in passwords:
+            report["added"] += 1
+        passwords[handle] = password
+    return passwords, report
+
+class LineStream(io.RawIOBase):
+    """A readable binary stream of JSON lines made as it is read."""
+    def __init__(self, entries):
+        """Arguments:
+        entries -- iterable of (handle, password)."""
+        self.entries = iter(entries)
+        self.buffer = bytearray()
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, view):
+        while len(self.buffer) < len(view):
+            entry = next(self.entries, None)
+            if entry is None:
+                break
+            self.buffer += json.dumps({"handle": entry[0],
+                                       "password": entry[1]}).encode() + b"\n"
+            self.count += 1
+        count = min(len(view), len(self.buffer))
+        view[:count] = self.buffer[:count]
+        del self.buffer[:count]
+        return count
+
+class LineSink(object):
+    """A writable stream collecting (handle, password) from JSON lines."""
+    def __init__(self):
+        self.entries = []
+        self.partial = b""
+
+    def write(self, data):
+        lines = (self.partial + bytes(data)).split(b"\n")
+        self.partial = lines.pop()
+        for line in lines:
+            item = json.loads(line)
+            self.entries.append((item["handle"], item["password"]))
+        return len(data)
+
+def write_export(entries, dst, password):
+    """Write entries to dst encrypted with a key derived from password.
+
+    Arguments:
+    entries -- iterable of (handle, password).
+    dst -- binary file object.
+    password -- the export password.
+    Returns:
+    the number of entries written."""
+    key = derive_key(password)
+    dst.write(key.header())
+    source = LineStream(entries)
+    encrypt_stream(source, dst, key)
+    return source.count
+
+def read_export(src, password):
+    """Return the entries of an export written by write_export. Raises
+    ValueError if password is wrong or the export is damaged.
+
+    Arguments:
+    src -- binary file object.
+    password -- the export password.
+    Returns:
+    list of (handle, password)."""
+    header = read_file_header(src)
+    if header is None:
+        raise ValueError("not a pman export")
+    version, salt, log_n, r, p, size, check = header
+    key = derive_key(password, salt, log_n, r, p)
+    key.verify(header)
+    sink = LineSink()
+    decrypt_stream(src, sink, key)
+    if sink.partial:
+        raise ValueError("truncated export")
+    return sink.entries
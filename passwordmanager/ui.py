@@ -6,15 +6,16 @@ ui.py
 Graphical User Interface.
 """
 
+import traceback
 from tkinter import Tk, StringVar, messagebox
 
-from passwordmanager.timeout import Timeout
 from passwordmanager.controller import MainController
 from passwordmanager.strings import *
 from passwordmanager.main_window import MainWindow
 from passwordmanager.dialogues import *
+from passwordmanager.worker import Worker
 
-TIMEOUT_RES = 100
+DISPLAY_TIMEOUT = 10 # in seconds, before a shown password is hidden
 
 class GUI(object):
     """The graphical user interface for the app."""
@@ -24,51 +25,73 @@ class GUI(object):
         self.master = StringVar()
         self.master.trace('w', self.on_keypress)
         self.main_window = MainWindow(self.root, self.master, self.on_command)
+        self.worker = Worker(self.root.after)
+        self.generation = 0 # incremented on timeout to drop late results
         self.handles = None
         self.current_dialogue = None
-        self.timeout_state = 0
-        self.monitor_timeout()
+        self.root.bind('<<Timeout>>', self.on_timeout)
+        self.root.bind('<<DialogueTimeout>>', self.on_dialogue_timeout)
+        self.controller.timeout.add_callback(self.push('<<Timeout>>'))
         self.main_window.disable_all_buttons()
         self.main_window.set_statusbar(READY)
         if not self.controller.db_exists:
             MasterEntryDialogue(self.root, self.change_master)
 
-    def monitor_timeout(self):
-        """Monitor timeout for change to zero"""
-        new_state = self.controller.timeout.timer
-        if not new_state and new_state != self.timeout_state:
-            self.on_timeout()
-        self.timeout_state = new_state
-        self.root.after(TIMEOUT_RES, self.monitor_timeout)
+    def push(self, event):
+        """Return a function for scheduler deadlines that sends event to
+        the main loop, which handles it on the Tk thread."""
+        def callback():
+            self.root.event_generate(event, when='tail')
+        return callback
 
-    def on_timeout(self):
+    def on_timeout(self, *args):
         """Destroy current dialogue and empty all fields."""
-        if self.current_dialogue:
-            self.main_window.set_statusbar(
-                self.current_dialogue.on_timeout()
-            )
-            self.current_dialogue = None # check for memory leak
+        self.worker.cancel()
+        self.generation += 1
+        self.on_dialogue_timeout()
 
         self.master.set("")
         self.handles = None
         self.main_window.fill_box([])
         self.main_window.disable_all_buttons()
 
-    def on_keypress(self, *args):
-        """trigger/re-trigger timeout."""
-        self.controller.timeout.trigger()
+    def on_dialogue_timeout(self, *args):
+        """Destroy current dialogue."""
+        self.controller.scheduler.cancel("dialogue")
+        if self.current_dialogue:
+            self.main_window.set_statusbar(
+                self.current_dialogue.on_timeout()
+            )
+            self.current_dialogue = None # check for memory leak
 
-    def _new_dialogue(self, dialogue):
-        """Create a new dialogue and wait for it to finish."""
+    def on_keypress(self, *args):
+        """trigger/re-trigger timeout. Clearing the master entry on
+        timeout doesn't start another."""
+        if self.master.get():
+            self.controller.timeout.trigger()
+
+    def _new_dialogue(self, dialogue, timeout=None):
+        """Create a new dialogue and wait for it to finish.
+
+        Arguments:
+        dialogue -- the dialogue.
+        timeout -- seconds before the dialogue is closed, by default it
+                   stays until the database is locked."""
         self.main_window.disable_all_buttons()
         self.current_dialogue = dialogue
+        if timeout is not None:
+            self.controller.scheduler.set(
+                "dialogue", timeout, self.push('<<DialogueTimeout>>'))
         self.root.wait_window(dialogue.window)
+        self.controller.scheduler.cancel("dialogue")
         self.current_dialogue = None
         self.show_handles()
 
     def show_handles(self):
         """Fill handle box. Enable relevant buttons"""
         self.main_window.disable_all_buttons()
+        if self.worker.busy:
+            return
         if self.handles is not None:
             self.main_window.fill_box(self.handles)
             self.main_window.enable_non_selection_buttons()
@@ -77,10 +100,7 @@ class GUI(object):
                 
     def on_command(self, command):
         """Call releveant method for command."""
-        try:
-            handle = self.handles[self.main_window.box.curselection()[0]]
-        except IndexError:
-            pass
+        handle = self.main_window.selected()
         
         self.controller.timeout.trigger()
 
@@ -101,21 +121,48 @@ class GUI(object):
 
         self.show_handles()
 
+    def _on_error(self, generation, fail):
+        """Return a worker on_error callback that gives the buttons back
+        and shows fail, or that the handle is gone, if a call raises."""
+        def on_error(error):
+            if not isinstance(error, KeyError):
+                traceback.print_exception(type(error), error,
+                                          error.__traceback__)
+            if generation != self.generation:
+                return
+            self.show_handles()
+            self.main_window.set_statusbar(
+                HANDLE_FAIL if isinstance(error, KeyError) else fail
+            )
+        return on_error
+
+    def _run(self, func, args, success, fail):
+        """Run a controller call returning handles on the worker thread.
+        Show the handles and a status message when it finishes."""
+        generation = self.generation
+
+        def on_done(handles):
+            if generation != self.generation:
+                return
+            self.handles = handles
+            self.show_handles()
+            self.main_window.set_statusbar(
+                success if handles is not None else fail
+            )
+
+        self.worker.submit(func, args, on_done,
+                           self._on_error(generation, fail))
+        self.main_window.disable_all_buttons()
+        self.main_window.set_statusbar(BUSY)
+
     def on_master_entry(self, master):
         """Check password correct and recive handles."""
-        self.handles = self.controller.list(master)
-        if self.handles is not None:
-            self.main_window.set_statusbar(ENTER_SUCCESS)
-        else:
-            self.main_window.set_statusbar(ENTER_FAIL)
+        self._run(self.controller.list, (master,), ENTER_SUCCESS, ENTER_FAIL)
 
     def on_get(self, handle):
         """Get chosen password, recieve updated list of handles."""
-        self.handles = self.controller.get(handle, self.master.get())
-        if self.handles is not None:
-            self.main_window.set_statusbar(COPY_SUCCESS)
-        else:
-            self.main_window.set_statusbar(ENTER_FAIL) 
+        self._run(self.controller.get, (handle, self.master.get()),
+                  COPY_SUCCESS, ENTER_FAIL)
 
     def on_show(self, handle):
         """Display 'password display' dialog window."""
@@ -124,7 +171,8 @@ class GUI(object):
                                     self.controller.get_chars,
                                     handle,
                                     self.master.get()
-                                )
+                                ),
+                           DISPLAY_TIMEOUT
                            )
 
     def on_new(self, handle):
@@ -139,17 +187,9 @@ class GUI(object):
 
     def on_options(self, handle, options):
         """Send options to password creator"""
-        self.handles = self.controller.create(
-                                            handle,
-                                            options,
-                                            self.master.get()
-                                        )
-        
-        if self.handles is not None:
-            self.show_handles()
-            self.main_window.set_statusbar(CREATE_SUCCESS)
-        else:
-            self.main_window.set_statusbar(CREATE_FAIL)
+        self._run(self.controller.create,
+                  (handle, options, self.master.get()),
+                  CREATE_SUCCESS, CREATE_FAIL)
 
     def on_delete(self, handle):
         """Display delete dialogue."""
@@ -164,12 +204,8 @@ class GUI(object):
         
     def delete_password(self, handle):
         """Delete password."""
-        self.handles = self.controller.delete(handle, self.master.get())
-        if self.handles is not None:
-            self.show_handles()
-            self.main_window.set_statusbar(DELETE_SUCCESS)
-        else:
-            self.main_window.set_statusbar(DELETE_FAIL)
+        self._run(self.controller.delete, (handle, self.master.get()),
+                  DELETE_SUCCESS, DELETE_FAIL)
     
     def on_change(self):
         """Display master entry dialogue"""
@@ -177,16 +213,27 @@ class GUI(object):
         
     def change_master(self, new_master):
         """Change the master password."""
-        result = self.controller.change_master(
-                                            new_master,
-                                            self.master.get()
-                                        )
-        if result:
-            self.master.set(new_master)
-            self.on_master_entry(new_master)
-            self.main_window.set_statusbar(CHANGE_SUCCESS)
-        else:
-            self.main_window.set_statusbar(CHANGE_FAIL)
+        def change(new_master, old_master):
+            if self.controller.change_master(new_master, old_master):
+                return self.controller.list(new_master)
+
+        generation = self.generation
+
+        def on_done(handles):
+            if generation != self.generation:
+                return
+            if handles is not None:
+                self.master.set(new_master)
+                self.handles = handles
+            self.show_handles()
+            self.main_window.set_statusbar(
+                CHANGE_SUCCESS if handles is not None else CHANGE_FAIL
+            )
+
+        self.worker.submit(change, (new_master, self.master.get()), on_done,
+                           self._on_error(generation, CHANGE_FAIL))
+        self.main_window.disable_all_buttons()
+        self.main_window.set_statusbar(BUSY)
  
 def main():
     ui = GUI()
@@ -0,0 +1,91 @@
+"""
+worker.py
+
+Runs slow calls, such as controller operations, on a background thread
+so a user interface's main loop keeps running.
+
+Results are handed back through a scheduling function such as Tk's
+root.after, so callbacks always run on the main loop's thread.
+"""
+
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL = 20 # in ms, how often results are checked for when busy
+
+class Worker(object):
+    """Runs one call at a time on a background thread.
+
+    A call submitted while another is running waits for it. Only the
+    latest waiting call is kept: submitting again replaces it, so
+    repeated commands are coalesced rather than queued up."""
+    def __init__(self, schedule, poll_interval=POLL_INTERVAL):
+        """Arguments:
+        schedule -- function(delay in ms, callback) that runs callback
+                    on the main loop, e.g. root.after.
+        poll_interval -- ms between checks for a finished call."""
+        self.schedule = schedule
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.results = queue.Queue()
+        self.running = False
+        self.waiting = None
+
+    @property
+    def busy(self):
+        """Return whether a call is running or waiting."""
+        return self.running or self.waiting is not None
+
+    def submit(self, func, args, on_done, on_error=None):
+        """Run func(*args) on the background thread, then on_done(result)
+        on the main loop. Call from the main loop.
+
+        If func raises, on_error(exception) is called on the main loop
+        instead of on_done, or without on_error the exception is raised
+        again there."""
+        self.waiting = (func, args, on_done, on_error)
+        if not self.running:
+            self._start()
+
+    def cancel(self):
+        """Forget the waiting call, if any. A running call can't be
+        stopped but its on_done or on_error is still called."""
+        self.waiting = None
+
+    def _start(self):
+        """Start the waiting call and poll for its result."""
+        func, args, on_done, on_error = self.waiting
+        self.waiting = None
+        self.running = True
+        self.executor.submit(self._call, func, args, on_done, on_error)
+        self.schedule(self.poll_interval, self._poll)
+
+    def _call(self, func, args, on_done, on_error):
+        """Run on the background thread."""
+        try:
+            self.results.put((on_done, on_error, func(*args), None))
+        except Exception as e:
+            self.results.put((on_done, on_error, None, e))
+
+    def _poll(self):
+        """Run on the main loop: deliver a finished result, then start
+        the waiting call or keep polling."""
+        try:
+            on_done, on_error, result, error = self.results.get_nowait()
+        except queue.Empty:
+            self.schedule(self.poll_interval, self._poll)
+            return
+        self.running = False
+        if self.waiting is not None:
+            self._start()
+        if error is None:
+            on_done(result)
+        elif on_error is not None:
+            on_error(error)
+        else:
+            raise error
+
+    def shutdown(self):
+        """Stop the background thread once the running call finishes."""
+        self.waiting = None
+        self.executor.shutdown(wait=False)
@@ -14,7 +14,10 @@ setup(
         'pycryptodome',
     ],
     entry_points={
-        'console_scripts':['pman=passwordmanager.controller:main']
+        'console_scripts':[
+            'pman=passwordmanager.cli:main',
+            'pman-agent=passwordmanager.agent:main',
+        ]
     },
 )
 
@@ -0,0 +1,61 @@
+
+import os
+import stat
+import threading
+import pytest
+import passwordmanager.agent as agent
+import passwordmanager.database as database
+import passwordmanager.securestrings as securestrings
+from passwordmanager.controller import MainController
+
+def test_agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(securestrings, "SCRYPT_LOG_N", 4)
+    controller = MainController()
+    controller.db = database.Database(str(tmp_path / "testdb"))
+    controller.db.save({"test_handle": [0, "test_password"]}, "test_master")
+    path = str(tmp_path / "agent" / "agent.sock")
+    server = agent.Agent(path, controller=controller)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600, \
+                "socket readable by other users"
+        get = {"op": "password", "handle": "test_handle"}
+        assert agent.request(get, path) == {"ok": False, "error": "locked"}
+        assert agent.request(dict(get, master="wrong"), path)["error"] \
+                == "password"
+        assert agent.request(dict(get, master="test_master"), path) == \
+                {"ok": True, "password": "test_password"}
+        assert agent.request(get, path)["password"] == "test_password", \
+                "agent didn't stay unlocked"
+        assert agent.request(dict(get, master="wrong"), path)["error"] \
+                == "password"
+        assert agent.request(get, path)["password"] == "test_password", \
+                "wrong master locked the agent"
+        assert agent.request({"op": "password", "handle": "missing"},
+                             path)["error"] == "handle"
+        assert agent.request({"op": "list"}, path)["handles"] == \
+                ["test_handle"]
+        assert agent.request({"op": "lock"}, path) == {"ok": True}
+        assert agent.request(get, path)["error"] == "locked"
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not os.path.exists(path), "socket not removed"
+    assert agent.request(get, path) is None
+
+def test_agent_directory(tmp_path):
+    directory = tmp_path / "agent"
+    directory.mkdir(mode=0o700)
+    os.chmod(directory, 0o777)
+    path = str(directory / "agent.sock")
+    with pytest.raises(OSError):
+        agent.Agent(path, controller=MainController())
+    with pytest.raises(OSError):
+        agent.request({"op": "ping"}, path)
+    os.chmod(directory, 0o700)
+    assert agent.request({"op": "ping"}, path) is None
+    link = tmp_path / "link"
+    link.symlink_to(directory)
+    with pytest.raises(OSError):
+        agent.request({"op": "ping"}, str(link / "agent.sock"))
@@ -0,0 +1,75 @@
+from passwordmanager import audit
+from passwordmanager.audit import Auditor, entropy, WEAK_BITS, DAY
+from passwordmanager.entry import Entry
+from passwordmanager.records import IndexEntry
+from passwordmanager.password_creator import PasswordCreator
+
+NOW = 1.7e9
+
+def test_entropy():
+    assert entropy("") == 0
+    assert entropy("password1") < WEAK_BITS, "common password not weak"
+    assert entropy("abcdefghijklmnopqrstuvwxyz") < entropy("qzmvkxwj"), \
+            "run not discounted"
+    assert entropy("aaaaaaaaaaaaaaaaaaaa") < WEAK_BITS, "repeats not weak"
+    password = PasswordCreator().create((16, True, True, True))
+    assert entropy(password) > WEAK_BITS, "generated password weak"
+
+def test_audit():
+    entries = {
+        "first": Entry("first", "shared_Secret_9", modified=NOW),
+        "second": Entry("second", "shared_Secret_9", modified=NOW),
+        "weak": Entry("weak", "abc123", created=NOW - 400 * DAY),
+        "strong": Entry("strong", "q7#Vd9!mZ2$kLp4&", modified=NOW),
+        "legacy": Entry("legacy", "x8@Nw3%tRb6^Yc1*"),
+    }
+    # the file: (offset, length) -> (record tag, entry)
+    file = {(offset, 10): (bytes([offset]), entry)
+            for offset, entry in enumerate(entries.values())}
+    index = {handle: IndexEntry(0, offset, 10)
+             for offset, handle in enumerate(entries)}
+    reads = []
+
+    def read(position):
+        entry = file[position.offset, position.length][1]
+        reads.append(entry.handle)
+        return entry
+
+    def tag(position):
+        return file[position.offset, position.length][0]
+
+    auditor = Auditor(b"k" * 32)
+    report = auditor.audit(index, read, tag, NOW, 365 * DAY)
+    assert report["entries"] == 5
+    assert report["reused"] == [["first", "second"]], "reuse not found"
+    assert [item["handle"] for item in report["weak"]] == ["weak"]
+    assert report["old"] == [{"handle": "weak", "days": 400}]
+    assert report["undated"] == ["legacy"]
+    assert "abc123" not in repr(auditor.records) + repr(auditor.bits)
+
+    reads.clear()
+    assert auditor.audit(index, read, tag, NOW, 365 * DAY) == report
+    assert reads == [], "unchanged records read again"
+    file[2, 11] = (b"new", Entry("weak", "shared_Secret_9", modified=NOW))
+    index["weak"] = IndexEntry(0, 2, 11)
+    report = auditor.audit(index, read, tag, NOW, 365 * DAY)
+    assert reads == ["weak"], "only the changed record should be read"
+    assert report["reused"] == [["first", "second", "weak"]]
+    assert report["weak"] == [] and report["old"] == []
+
+    reads.clear()
+    file = {(offset + 1, 10): file[position.offset, position.length]
+            for offset, position in enumerate(index.values())}
+    index = {handle: IndexEntry(0, offset + 1, 10)
+             for offset, handle in enumerate(index)}
+    assert auditor.audit(index, read, tag, NOW)["entries"] == 5
+    assert reads == [], "moved records decrypted again"
+
+    # a rewritten file with other records where these were
+    file = {position: (b"other" + record_tag, Entry(
+                entry.handle, "aaaaaaaaaaaaaaaaaaaa", modified=NOW))
+            for position, (record_tag, entry) in file.items()}
+    report = auditor.audit(index, read, tag, NOW)
+    assert len(reads) == 5, "records at the same places taken as the same"
+    assert len(report["weak"]) == 5
+    assert audit.table(report).startswith("5 entries: 1 reused, 5 weak")
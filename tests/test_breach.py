@@ -0,0 +1,61 @@
+import io
+import random
+import hashlib
+from passwordmanager import breach
+from passwordmanager.breach import Corpus
+from passwordmanager.password_creator import PasswordCreator
+
+BREACHED = ["password", "123456", "letmein", "hunter2"]
+
+def dump(passwords, binary=False):
+    hashes = sorted(hashlib.sha1(password.encode()).digest()
+                    for password in passwords)
+    if binary:
+        return io.BytesIO(b"".join(hashes))
+    return io.BytesIO(b"".join(b"%s:%d\r\n" % (sha1.hex().upper().encode(), i)
+                               for i, sha1 in enumerate(hashes)))
+
+def test_corpus(tmp_path):
+    path = str(tmp_path / "corpus")
+    for binary in (False, True):
+        assert breach.convert(dump(BREACHED + BREACHED[:1], binary), path,
+                              binary) == 4
+        with Corpus(path) as corpus:
+            assert len(corpus) == 4
+            for password in BREACHED:
+                assert password in corpus, f"{password} not found"
+            for password in ("Password", "", "q7#Vd9!mZ2$kLp4&"):
+                assert password not in corpus, f"{password} found"
+            assert breach.check([("a", "hunter2"), ("b", "other")],
+                                corpus) == ["a"]
+
+def test_corpus_errors(tmp_path):
+    path = str(tmp_path / "corpus")
+    unsorted = io.BytesIO(b"".join(
+            reversed(dump(BREACHED).getvalue().splitlines(True))))
+    try:
+        breach.convert(unsorted, path)
+        assert False, "unsorted dump converted"
+    except ValueError:
+        pass
+    breach.convert(io.BytesIO(), path)
+    with Corpus(path) as corpus:
+        assert "password" not in corpus, "found in empty corpus"
+    with open(path, "ab") as fo:
+        fo.write(b"x")
+    try:
+        Corpus(path)
+        assert False, "truncated corpus opened"
+    except ValueError:
+        pass
+
+def test_password_creator(tmp_path):
+    options = (8, True, True, True)
+    first = PasswordCreator(random.Random(1).randbytes).create(options)
+    path = str(tmp_path / "corpus")
+    breach.convert(dump([first]), path)
+    with Corpus(path) as corpus:
+        creator = PasswordCreator(random.Random(1).randbytes, corpus)
+        passwords = creator.create_many(options, 3)
+    assert first not in passwords, "breached password created"
+    assert len(passwords) == 3
@@ -0,0 +1,186 @@
+
+import json
+import hashlib
+import pytest
+import passwordmanager.cli as cli
+import passwordmanager.database as database
+import passwordmanager.securestrings as securestrings
+import passwordmanager.profiling as profiling
+from passwordmanager.controller import MainController
+
+clipboard = []
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(securestrings, "SCRYPT_LOG_N", 4)
+    monkeypatch.setenv("PMAN_AGENT_SOCK", str(tmp_path / "no-agent.sock"))
+    monkeypatch.setattr(cli.getpass, "getpass",
+                        lambda prompt=None: "test_master")
+    db = database.Database(str(tmp_path / "testdb"))
+    db.save({"first": [0, "first_password"],
+             "second-handle": [0, "it's secret"]}, "test_master")
+
+    controllers = []
+
+    def controller():
+        controller = MainController()
+        controller.db = db
+        controllers.append(controller)
+        return controller
+
+    monkeypatch.setattr(cli, "controller", controller)
+    monkeypatch.setattr(MainController, "_copy_to_clipboard",
+                        lambda self, password: clipboard.append(password))
+    clipboard.clear()
+    yield db
+    for controller in controllers:
+        controller.lock()
+
+def test_get(db, capsys, monkeypatch):
+    assert not cli.main(["pman", "first"])
+    assert clipboard == ["first_password"]
+    assert not cli.main(["pman", "secnd"]), "misspelled handle not found"
+    assert clipboard[-1] == "it's secret"
+    assert capsys.readouterr().out == \
+            "second-handle: Password copied to clipboard.\n"
+    assert cli.main(["pman", "nothing"]) == 1
+    assert capsys.readouterr().out == "Password name not found.\n"
+
+def test_get_ambiguous(db, capsys, monkeypatch):
+    db.add_handle("second-handle2", "other", "test_master")
+    monkeypatch.setattr(cli.sys.stdin, "isatty", lambda: False)
+    assert cli.main(["pman", "second"]) == 1, "ambiguous handle resolved"
+    assert capsys.readouterr().out.split("\n")[:2] == \
+            ["1) second-handle", "2) second-handle2"]
+    monkeypatch.setattr(cli.sys.stdin, "isatty", lambda: True)
+    monkeypatch.setattr("builtins.input", lambda prompt: "2")
+    assert not cli.main(["pman", "second"])
+    assert clipboard == ["other"], "picked handle not used"
+
+def test_batch(db, capsys):
+    assert cli.main(["pman", "batch", "first", "second-handle"]) == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.split("\n")
+             if line]
+    assert lines == [{"handle": "first", "password": "first_password"},
+                     {"handle": "second-handle", "password": "it's secret"}]
+    assert sorted(db.get_handles("test_master")) == \
+            [(1, "first"), (1, "second-handle")], "popularity not saved"
+    assert db.journal.read() == {}, "batch used the journal"
+
+def test_batch_env(db, capsys, monkeypatch):
+    monkeypatch.setattr(cli.sys, "stdin", ["second-handle\n", "missing\n"])
+    assert cli.main(["pman", "batch", "--format", "env"]) == 1
+    assert capsys.readouterr().out.split("\n")[:2] == \
+            ["SECOND_HANDLE='it'\"'\"'s secret'",
+             "# missing: Password name not found."]
+
+def test_rotate(db, capsys, monkeypatch):
+    db.add_handle("second-other", "old", "test_master")
+    saves = []
+    append = db.records.append
+    monkeypatch.setattr(db.records, "append",
+                        lambda *args: saves.append(1) or append(*args))
+    assert cli.main(["pman", "rotate", "--match", "second-*", "--length",
+                     "10", "--show-passwords", "first", "missing"]) == 1
+    report = json.loads(capsys.readouterr().out)
+    assert report["rotated"] == ["first", "second-handle", "second-other"]
+    assert report["missing"] == ["missing"]
+    assert len(saves) == 1, "rotation saved more than once"
+    for handle, password in report["passwords"].items():
+        assert len(password) == 10
+        assert db.get_password(handle, "test_master") == password, \
+                f"{handle} not renewed"
+    with pytest.raises(SystemExit):
+        cli.main(["pman", "rotate", "--length", "1000000", "first"])
+
+def test_import(db, capsys, tmp_path):
+    export = tmp_path / "bitwarden.csv"
+    export.write_text("folder,favorite,type,name,notes,login_uri,"
+                      "login_username,login_password\n"
+                      ",,login,first,,,me,imported\n"
+                      ",,login,new,,,me,\"with,comma\"\n"
+                      ",,note,no password,,,,\n")
+    assert cli.main(["pman", "import", "--policy", "rename", str(export)]) \
+            == 0
+    assert json.loads(capsys.readouterr().out) == {
+            "read": 2, "added": 1, "replaced": 0, "skipped": 0, "renamed": 1}
+    assert db.get_password("first (2)", "test_master") == "imported"
+    assert db.get_password("new", "test_master") == "with,comma"
+    malformed = tmp_path / "malformed.json"
+    malformed.write_text("[1, 2]")
+    assert cli.main(["pman", "import", str(malformed)]) == 1
+    assert "isn't an object" in capsys.readouterr().err
+
+def test_export(db, capsys, tmp_path):
+    export = str(tmp_path / "export.pman")
+    assert cli.main(["pman", "export", export]) == 0
+    assert json.loads(capsys.readouterr().out) == {"exported": 2}
+    with open(export, "rb") as fo:
+        assert b"first_password" not in fo.read(), "export not encrypted"
+    db.delete_handle("first", "test_master")
+    assert cli.main(["pman", "import", "--policy", "replace", export]) == 0
+    assert json.loads(capsys.readouterr().out)["added"] == 1
+    assert db.get_password("first", "test_master") == "first_password"
+
+def test_top(db, capsys):
+    assert cli.main(["pman", "batch", "second-handle"]) == 0
+    capsys.readouterr()
+    assert cli.main(["pman", "top", "-n", "1"]) == 0
+    assert capsys.readouterr().out == "second-handle\n"
+    assert cli.main(["pman", "top"]) == 0
+    assert capsys.readouterr().out == "second-handle\nfirst\n"
+
+def test_audit(db, capsys):
+    db.add_handle("copy", "first_password", "test_master")
+    db.add_handle("pin", "1234", "test_master")
+    assert cli.main(["pman", "audit", "--format", "json"]) == 1
+    report = json.loads(capsys.readouterr().out)
+    assert report["reused"] == [["copy", "first"]]
+    assert [item["handle"] for item in report["weak"]] == ["pin"]
+    assert report["undated"] == ["first", "second-handle"]
+    assert cli.main(["pman", "audit"]) == 1
+    assert capsys.readouterr().out.startswith(
+            "4 entries: 1 reused, 1 weak, 0 old\n")
+
+def test_breach_check(db, capsys, tmp_path):
+    dump = tmp_path / "dump.txt"
+    corpus = str(tmp_path / "corpus")
+    dump.write_text("".join(sorted(
+        hashlib.sha1(password.encode()).hexdigest().upper() + ":3\n"
+        for password in ("first_password", "123456"))))
+    assert cli.main(["pman", "breach-check", "--corpus", corpus,
+                     "--convert", str(dump)]) == 0
+    assert json.loads(capsys.readouterr().out)["converted"] == 2
+    assert cli.main(["pman", "breach-check", "--corpus", corpus,
+                     "--format", "json"]) == 1
+    assert json.loads(capsys.readouterr().out) == {"breached": ["first"]}
+    assert cli.main(["pman", "breach-check", "--corpus",
+                     str(tmp_path / "missing")]) == 1
+    assert cli.main(["pman", "breach-check", "--corpus", corpus,
+                     "--convert", str(tmp_path / "missing")]) == 1
+    dump.write_text("".join(reversed(dump.read_text().splitlines(True))))
+    assert cli.main(["pman", "breach-check", "--corpus", corpus,
+                     "--convert", str(dump)]) == 1
+    assert "isn't sorted" in capsys.readouterr().err
+
+def test_bad_corpus(db, capsys, tmp_path, monkeypatch):
+    corpus = tmp_path / "corpus"
+    corpus.write_bytes(b"PMBR")
+    monkeypatch.setenv("PMAN_BREACH_CORPUS", str(corpus))
+    assert cli.main(["pman", "top"]) == 0
+    with pytest.warns(UserWarning, match="breached"):
+        assert cli.main(["pman", "rotate", "first"]) == 0
+
+def test_profile(db, capsys):
+    try:
+        assert not cli.main(["pman", "--profile", "first"])
+        profiling.print_summary()
+    finally:
+        profiling.disable()
+    err = capsys.readouterr().err.splitlines()
+    operations = [json.loads(line) for line in err if line.startswith("{")]
+    assert [item["op"] for item in operations] == ["match", "get"]
+    assert {"kdf", "read", "decrypt", "parse", "lock wait"} \
+            <= set(operations[0]["stages"]), "stages not recorded"
+    assert any(line.startswith("get ") for line in err), "no summary"
+    assert profiling.stage("kdf") is profiling.NULL, "still profiling"
@@ -0,0 +1,111 @@
+
+import os
+import pytest
+import passwordmanager.database as database
+import passwordmanager.securestrings as securestrings
+import passwordmanager.fileutils as fileutils
+import passwordmanager.keyslots as keyslots
+from passwordmanager.entry import Entry
+from passwordmanager.records import IndexEntry
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(securestrings, "SCRYPT_LOG_N", 4)
+    db = database.Database(str(tmp_path / "testdb"))
+    db.save({"old_handle": [0, "old_password"]}, "test_master")
+    return db
+
+def state(db):
+    """Return the passwords the database decrypts to."""
+    data = db.load("test_master")
+    return {handle: entry[1] for handle, entry in data.items()}
+
+def read(filename):
+    with open(filename, 'rb') as fo:
+        return fo.read()
+
+def write(filename, data):
+    with open(filename, 'wb') as fo:
+        fo.write(data)
+
+def test_torn_append(db):
+    old_state = state(db)
+    old = read(db.filename)
+    db.add_handle("new_handle", "new_password", "test_master")
+    new_state = state(db)
+    new = read(db.filename)
+    assert new.startswith(old), "append rewrote the file"
+
+    for length in range(len(old), len(new) + 1):
+        write(db.filename, new[:length])
+        assert state(db) == (new_state if length == len(new) else old_state), \
+                f"crash after {length} bytes lost the database"
+
+    write(db.filename, new[:len(new) - 1])
+    db.add_handle("other_handle", "other_password", "test_master")
+    assert state(db) == dict(old_state, other_handle="other_password"), \
+            "append after a crash failed"
+
+def test_failed_rewrite(db, monkeypatch):
+    old_state = state(db)
+    old = read(db.filename)
+
+    def crash(*args):
+        raise OSError("crash")
+
+    for function in ("replace", "fsync"):
+        with monkeypatch.context() as patch:
+            patch.setattr(fileutils.os, function, crash)
+            with pytest.raises(OSError):
+                db.change_master("test_master", "new_master", rekey=True)
+        assert read(db.filename) == old, f"crash in {function} changed file"
+        assert state(db) == old_state
+        assert not [name for name in os.listdir(os.path.dirname(db.filename))
+                    if name.endswith(".tmp")], "temporary file left behind"
+
+    def entries():
+        yield Entry("new_handle", "new_password"), IndexEntry()
+        raise OSError("crash")
+
+    with pytest.raises(OSError):
+        db.records.write(keyslots.new_data_key(), entries(),
+                         keyslots.make_table([]))
+    assert read(db.filename) == old, "crash during write changed file"
+
+def test_backups(db):
+    db.records.backups = 2
+    first = read(db.filename)
+    db.change_master("test_master", "second_master", rekey=True)
+    second = read(db.filename)
+    db.change_master("second_master", "test_master", rekey=True)
+    assert read(db.filename + ".1") == second, "newest backup not kept"
+    assert read(db.filename + ".2") == first, "oldest backup not kept"
+    db.change_master("test_master", "second_master", rekey=True)
+    assert not os.path.exists(db.filename + ".3"), "too many backups kept"
+
+def test_failed_slot_change(db, monkeypatch):
+    old = read(db.filename)
+    old_state = state(db)
+    for crash_at in (1, 2):
+        calls = []
+
+        def crash(fd):
+            calls.append(fd)
+            if len(calls) == crash_at:
+                raise OSError("crash")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(fileutils.os, "fsync", crash)
+            with pytest.raises(OSError):
+                db.change_master("test_master", "new_master")
+        masters = []
+        for master in ("test_master", "new_master"):
+            try:
+                assert db.load(master) == {"old_handle": [0, "old_password"]}
+                masters.append(master)
+            except database.PasswordError:
+                pass
+        assert masters, f"crash at sync {crash_at} locked the database"
+        assert len(read(db.filename)) == len(old), "slot change grew file"
+        write(db.filename, old)
+    assert state(db) == old_state
@@ -1,5 +1,14 @@
 
+import os
+import json
+import time
+import threading
 import passwordmanager.database as database
+import passwordmanager.records as records
+import passwordmanager.securestrings as securestrings
+import passwordmanager.keyslots as keyslots
+import passwordmanager.frecency as frecency
+from passwordmanager.entry import Entry
 
 def test_database():
     db = database.Database("tests/testdb")
@@ -8,7 +17,360 @@ def test_database():
     assert db.get_password("test_handle", "test_master") == "test_password", \
             "incorret password returned"
 
+def test_session():
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handle("test_handle", "test_password")
+    assert session.get_password("test_handle") == "test_password", \
+            "incorret password returned"
+    assert session.get_handles() == [(1, "test_handle")], \
+            "popularity not incremented"
+    assert session.matches("test_master") and not session.matches("wrong")
+    try:
+        session.get_password("missing")
+        assert False, "missing handle returned a password"
+    except database.HandleError:
+        pass
+    assert session.match("test_hnadle")[0][1] == "test_handle", \
+            "misspelled handle not matched"
+    session.lock()
+    assert not session.unlocked, "session not locked"
+    try:
+        session.get_handles()
+        assert False, "locked session returned handles"
+    except database.PasswordError:
+        pass
+    assert db.get_handles("test_master") == [(1, "test_handle")], \
+            "session changes not saved"
+
+def test_popularity_journal():
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    db.add_handle("test_handle", "test_password", "test_master")
+    with open("tests/testdb", "rb") as fo:
+        saved = fo.read()
+    for i in range(3):
+        db.get_password("test_handle", "test_master")
+    with open("tests/testdb", "rb") as fo:
+        assert fo.read() == saved, "lookup rewrote the database"
+    session = db.unlock("test_master")
+    assert session.get_handles() == [(3, "test_handle")], \
+            "journalled increments not merged"
+    session.lock()
+    assert db.journal.read() == {}, "journal not cleared on lock"
+    assert db.get_handles("test_master") == [(3, "test_handle")], \
+            "increments not saved"
+
+def test_wrong_master():
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    try:
+        db.unlock("wrong_master")
+        assert False, "unlocked with wrong master"
+    except database.PasswordError:
+        pass
+
+def test_legacy_upgrade():
+    db = database.Database("tests/testdb")
+    legacy = securestrings.legacy_key("test_master")
+    data = {"test_handle": [2, "test_password"]}
+    securestrings.save_string("tests/testdb", legacy, json.dumps(data))
+    session = db.unlock("test_master")
+    session.lock()
+    assert not db.records.load_key("test_master").legacy, \
+            "legacy database not upgraded"
+    assert db.records.is_current(), "legacy database not converted"
+    assert db.get_password("test_handle", "test_master") == "test_password", \
+            "incorret password returned"
+
+def cbc_frame(fo, key, kind, data):
+    payload = securestrings.encrypt(data, key)
+    fo.write(records.FRAME.pack(len(payload), kind))
+    fo.write(payload)
+    return records.FRAME.size + len(payload)
+
+def write_cbc_records(version, record, index):
+    key = securestrings.derive_key("test_master")
+    with open("tests/testdb", "wb") as fo:
+        fo.write(key.header(version, check=False))
+        offset = fo.tell()
+        length = cbc_frame(fo, key, records.RECORD, record)
+        position = fo.tell()
+        cbc_frame(fo, key, records.INDEX, index(offset, length))
+        fo.write(records.TRAILER.pack(records.TRAILER_MAGIC, position))
+
+def check_records_upgrade():
+    db = database.Database("tests/testdb")
+    assert db.load("test_master") == {"test_handle": [3, "test_password"]}
+    session = db.unlock("test_master")
+    assert db.records.is_current(), "old records not converted"
+    assert session.get_handles() == [(3, "test_handle")], \
+            "popularity lost in upgrade"
+    assert session.get_password("test_handle") == "test_password", \
+            "incorret password returned"
+    session.lock()
+    try:
+        db.unlock("wrong_master")
+        assert False, "unlocked with wrong master"
+    except database.PasswordError:
+        pass
+
+def test_json_records_upgrade():
+    write_cbc_records(
+        records.JSON_VERSION,
+        json.dumps(["test_handle", "test_password"]).encode(),
+        lambda offset, length: json.dumps(
+            {"test_handle": [3, offset, length]}).encode())
+    check_records_upgrade()
+
+def test_cbc_records_upgrade():
+    write_cbc_records(
+        records.CBC_VERSION,
+        Entry("test_handle", "test_password").pack(),
+        lambda offset, length: records.pack_index(
+            {"test_handle": records.IndexEntry(3, offset, length)},
+            frecency=False))
+    check_records_upgrade()
+
+def test_master_key_records_upgrade():
+    db = database.Database("tests/testdb")
+    key = securestrings.derive_key("test_master")
+    with open("tests/testdb", "wb") as fo:
+        fo.write(key.header(records.MASTER_KEY_VERSION))
+        offset = fo.tell()
+        length = db.records._write_frame(
+            fo, key, records.RECORD,
+            Entry("test_handle", "test_password").pack())
+        position = fo.tell()
+        db.records._write_frame(fo, key, records.INDEX, records.pack_index(
+            {"test_handle": records.IndexEntry(3, offset, length)},
+            frecency=False))
+        fo.write(records.TRAILER.pack(records.TRAILER_MAGIC, position))
+    check_records_upgrade()
+
+def test_slots_records_upgrade():
+    db = database.Database("tests/testdb")
+    data_key = keyslots.new_data_key()
+    slot = keyslots.make_slot(keyslots.MASTER, data_key,
+                              securestrings.derive_key("test_master"))
+    with open("tests/testdb", "wb") as fo:
+        fo.write(data_key.header(records.SLOTS_VERSION))
+        fo.write(keyslots.make_table([slot]))
+        offset = fo.tell()
+        length = db.records._write_frame(
+            fo, data_key, records.RECORD,
+            Entry("test_handle", "test_password").pack())
+        position = fo.tell()
+        db.records._write_frame(fo, data_key, records.INDEX,
+            records.pack_index(
+                {"test_handle": records.IndexEntry(3, offset, length)},
+                frecency=False))
+        fo.write(records.TRAILER.pack(records.TRAILER_MAGIC, position))
+    check_records_upgrade()
+    assert db.records.load_key("test_master").salt == data_key.salt, \
+            "records re-encrypted to add frecency"
+
+def test_top(monkeypatch):
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handles({"old": "old_password", "new": "new_password",
+                         "unused": "unused_password"})
+    now = time.time()
+    monkeypatch.setattr(database.time, "time",
+                        lambda: now - 10 * frecency.HALF_LIFE)
+    for i in range(5):
+        session.get_password("old")
+    monkeypatch.setattr(database.time, "time", lambda: now)
+    session.get_password("new")
+    assert session.top() == ["new", "old", "unused"], \
+            "old uses not decayed"
+    for i in range(5):
+        session.get_password("old")
+    assert session.top() == ["old", "new", "unused"]
+    session.lock()
+    session = db.unlock("test_master")
+    assert session.top(2) == ["old", "new"], "frecency not saved"
+    session.delete_handle("new")
+    session.add_handle("added", "added_password")
+    assert session.top() == ["old", "added", "unused"], \
+            "ranking not updated by writes"
+    session.lock()
+
+def test_change_master():
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handle("test_handle", "test_password")
+    session.get_password("test_handle")
+    size = os.path.getsize("tests/testdb")
+    session.change_master("new_master")
+    assert os.path.getsize("tests/testdb") == size, "records rewritten"
+    assert session.matches("new_master"), "session not moved to new master"
+    session.lock()
+    try:
+        db.unlock("test_master")
+        assert False, "unlocked with old master"
+    except database.PasswordError:
+        pass
+    session = db.unlock("new_master")
+    assert session.get_handles() == [(1, "test_handle")], \
+            "popularity lost in change"
+    session.change_master("test_master", rekey=True)
+    session.lock()
+    assert db.load("test_master") == {"test_handle": [1, "test_password"]}
+
+def test_entries():
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handle("test_handle", "first_password")
+    session.edit_entry("test_handle", username="me", tags=["work"])
+    session.add_handle("test_handle", "second_password")
+    session.get_password("test_handle")
+    entry = session.get_entry("test_handle")
+    assert (entry.password, entry.username, entry.tags) == \
+            ("second_password", "me", ["work"]), "details not kept"
+    assert [old for replaced, old in entry.history] == ["first_password"], \
+            "old password not kept"
+    assert entry.created <= entry.modified <= entry.last_used, \
+            "times not recorded"
+    session.lock()
+
+def test_compaction(monkeypatch):
+    monkeypatch.setattr(records, "COMPACT_MIN", 0)
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handle("other_handle", "other_password")
+    for i in range(20):
+        session.add_handle("test_handle", f"test_password{i}")
+    session.delete_handle("other_handle")
+    assert os.path.getsize("tests/testdb") < 4096, "database not compacted"
+    assert session.get_password("test_handle") == "test_password19", \
+            "incorret password returned"
+    session.lock()
+    assert db.load("test_master") == {"test_handle": [1, "test_password19"]}
+
+def test_compaction_rate(monkeypatch):
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handles({f"handle{i}": f"password{i}" for i in range(500)})
+    assert os.path.getsize("tests/testdb") > records.COMPACT_MIN
+    compactions = []
+    compact = records.RecordFile.compact
+    monkeypatch.setattr(records.RecordFile, "compact",
+                        lambda self, *args: compactions.append(1)
+                                            or compact(self, *args))
+    for i in range(20):
+        session.add_handle(f"added{i}", f"added_password{i}")
+    session.lock()
+    assert len(compactions) <= 10, "index counted as garbage"
+
+def test_concurrent_readers(monkeypatch):
+    monkeypatch.setattr(records, "COMPACT_MIN", 0)
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handles({f"stable{i}": f"password{i}" for i in range(10)})
+    errors = []
+    writing = threading.Event()
+
+    def reader():
+        try:
+            while writing.is_set():
+                for i in range(10):
+                    assert session.get_password(f"stable{i}") == \
+                            f"password{i}", "incorret password returned"
+                handles = [handle for uses, handle in session.get_handles()]
+                assert {f"stable{i}" for i in range(10)} <= set(handles), \
+                        "handle missing from snapshot"
+                assert "stable3" in [handle for score, handle
+                                     in session.match("stable3")], \
+                        "handle not matched"
+        except Exception as error:
+            errors.append(error)
+
+    writing.set()
+    threads = [threading.Thread(target=reader) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(30):
+            session.add_handle(f"churn{i}", f"churn_password{i}")
+            session.add_handle("stable0", "password0")
+            if i % 3 == 2:
+                session.delete_handle(f"churn{i - 1}")
+    finally:
+        writing.clear()
+        for thread in threads:
+            thread.join()
+    assert not errors, errors[0]
+    uses = dict((handle, count) for count, handle in session.get_handles())
+    session.lock()
+    assert dict((handle, count) for count, handle
+                in db.get_handles("test_master")) == uses, \
+            "lookups lost"
+
+def test_lock_while_reading():
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handles({f"handle{i}": f"password{i}" for i in range(5)})
+    passwords = session.passwords()
+    assert next(passwords) == ("handle0", "password0")
+    session.lock()
+    assert len(list(passwords)) == 4, "snapshot changed under its reader"
+
+def test_lock_during_read():
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    for read in ("top", "audit"):
+        session = db.unlock("test_master")
+        current = session._current
+
+        def locked_after():
+            snapshot = current()
+            session.lock()
+            return snapshot
+
+        session._current = locked_after
+        try:
+            getattr(session, read)()
+            assert False, f"{read} ran on a locked session"
+        except database.PasswordError:
+            pass
+
+def test_snapshot_files(monkeypatch):
+    monkeypatch.setattr(records, "COMPACT_MIN", 0)
+    db = database.Database("tests/testdb")
+    db.create_database("test_master")
+    session = db.unlock("test_master")
+    session.add_handles({f"handle{i}": f"password{i}" for i in range(5)})
+    passwords = session.passwords()
+    assert next(passwords) == ("handle0", "password0")
+    old = session.snapshot.file
+    for i in range(5):
+        session.add_handle("handle4", f"changed{i}")
+    assert session.snapshot.file is not old, "file not compacted"
+    assert not old.closed, "file closed under its reader"
+    assert len(list(passwords)) == 4
+    assert old.closed, "replaced file left open"
+    file = session.snapshot.file
+    session.lock()
+    assert file.closed, "file left open by lock"
+
 if __name__ == "__main__":
     test_database()
+    test_session()
+    test_popularity_journal()
+    test_wrong_master()
+    test_legacy_upgrade()
+    test_json_records_upgrade()
+    test_cbc_records_upgrade()
+    test_master_key_records_upgrade()
+    test_change_master()
+    test_entries()
     print("test passed")
-
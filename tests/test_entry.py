@@ -0,0 +1,21 @@
+
+import pytest
+from passwordmanager.entry import Entry, HISTORY_SIZE
+
+def test_pack():
+    entry = Entry("bänk", "pässword", "me", "https://example.com",
+                  "line one\nline two", ["money", "€"], 1.5, 2.5, 3.5,
+                  [(2.0, "older")])
+    assert Entry.unpack(entry.pack()) == entry, "entry changed by packing"
+    assert Entry.unpack(memoryview(Entry("a", "b").pack())) == Entry("a", "b")
+    with pytest.raises(ValueError):
+        Entry.unpack(entry.pack()[:-3])
+
+def test_history():
+    entry = Entry("handle", "password0")
+    for i in range(1, HISTORY_SIZE + 5):
+        entry.set_password(f"password{i}", now=i)
+    entry.set_password(entry.password, now=100)
+    assert len(entry.history) == HISTORY_SIZE
+    assert entry.history[-1] == (HISTORY_SIZE + 4, f"password{HISTORY_SIZE + 3}")
+    assert entry.modified == 100
@@ -0,0 +1,35 @@
+import random
+from passwordmanager import frecency
+from passwordmanager.frecency import Ranking, NEVER, HALF_LIFE, EPOCH
+
+def test_decay():
+    now = EPOCH + 1000 * HALF_LIFE
+    score = frecency.bump(NEVER, now)
+    assert abs(frecency.decayed(score, now) - 1) < 1e-9
+    assert abs(frecency.decayed(score, now + HALF_LIFE) - 0.5) < 1e-9, \
+            "use not halved after half life"
+    score = frecency.bump(score, now, 3)
+    assert abs(frecency.decayed(score, now) - 4) < 1e-9, "uses not added"
+    old = frecency.initial(100, now - 10 * HALF_LIFE)
+    assert old < frecency.weight(now), "old uses outrank a new one"
+    assert frecency.initial(0, now) == NEVER
+
+def test_ranking():
+    rng = random.Random(1)
+    scores = {f"handle{i}": rng.random() for i in range(200)}
+    ranking = Ranking(scores)
+    for i in range(500):
+        handle = f"handle{rng.randrange(220)}"
+        if rng.random() < 0.1:
+            ranking.remove(handle)
+            scores.pop(handle, None)
+        else:
+            scores[handle] = rng.random()
+            ranking.set(handle, scores[handle])
+    expected = sorted(scores, key=lambda handle: (-scores[handle], handle))
+    assert ranking.top() == expected, "ranking out of order"
+    assert ranking.top(5) == expected[:5]
+    assert len(ranking) == len(scores)
+    handle = expected[-1]
+    ranking.bump(handle, EPOCH + 100 * HALF_LIFE)
+    assert ranking.top(1) == [handle], "used handle not moved to the top"
@@ -0,0 +1,80 @@
+
+import time
+import random
+import passwordmanager.password_creator as password_creator
+from collections import Counter
+from math import factorial, prod
+from passwordmanager.password_creator import PasswordCreator, \
+        CHARACTER_CLASS, LOWER, UPPER, DIGITS, SPECIAL
+
+SAMPLES = 20000
+# chi-square values exceeded with probability 0.001
+CRITICAL = {5: 20.52, 9: 27.88, 25: 52.62}
+
+def chi_square(observed, expected):
+    return sum((observed.get(key, 0) - count) ** 2 / count
+               for key, count in expected.items())
+
+def test_classes():
+    creator = PasswordCreator()
+    assert "9" in DIGITS
+    for options in ([8, 1, 1, 1], [4, 1, 1, 1], [12, 0, 1, 0]):
+        for password in creator.create_many(options, 200):
+            classes = {CHARACTER_CLASS[c] for c in password}
+            assert len(password) == options[0]
+            assert classes == {chars for chars, on in
+                               zip((LOWER, UPPER, DIGITS, SPECIAL),
+                                   [1] + options[1:]) if on}, \
+                    f"{password} has the wrong classes"
+
+def test_long():
+    start = time.perf_counter()
+    for length in (password_creator.TABLE_LENGTH + 1, 1000):
+        for password in PasswordCreator().create_many([length, 1, 1, 1], 20):
+            assert len(password) == length
+            assert len({CHARACTER_CLASS[c] for c in password}) == 4
+    assert time.perf_counter() - start < 1, "long passwords slow"
+
+def test_uniform():
+    check_uniform(PasswordCreator(random.Random(15).randbytes))
+
+def test_uniform_untabulated(monkeypatch):
+    monkeypatch.setattr(password_creator, "TABLE_LENGTH", 0)
+    check_uniform(PasswordCreator(random.Random(16).randbytes))
+
+def check_uniform(creator):
+    sizes = (len(LOWER), len(UPPER), len(DIGITS), len(SPECIAL))
+    length = 6
+    passwords = creator.create_many([length, 1, 1, 1], SAMPLES)
+
+    # how many characters of each class, against the share of all valid
+    # passwords having those counts
+    observed = Counter(tuple(sum(CHARACTER_CLASS[c] == chars for c in p)
+                             for chars in (LOWER, UPPER, DIGITS, SPECIAL))
+                       for p in passwords)
+    weights = {}
+    for a in range(1, length):
+        for b in range(1, length - a):
+            for c in range(1, length - a - b):
+                counts = (a, b, c, length - a - b - c)
+                weights[counts] = factorial(length) \
+                        // prod(map(factorial, counts)) \
+                        * prod(s ** n for s, n in zip(sizes, counts))
+    total = sum(weights.values())
+    expected = {k: SAMPLES * w / total for k, w in weights.items()}
+    assert len(expected) == 10
+    assert chi_square(observed, expected) < CRITICAL[9], \
+            "class counts not uniform"
+
+    # characters within a class
+    letters = Counter(c for p in passwords for c in p if c in LOWER)
+    n = sum(letters.values())
+    assert chi_square(letters, {c: n / 26 for c in LOWER}) < CRITICAL[25], \
+            "lower case letters not uniform"
+
+    # the position of the one guaranteed special character
+    first = Counter(p.index(next(c for c in p if c in SPECIAL))
+                    for p in passwords if sum(c in SPECIAL for c in p) == 1)
+    n = sum(first.values())
+    assert chi_square(first, {i: n / length for i in range(length)}) \
+            < CRITICAL[5], "special character position biased"
@@ -0,0 +1,40 @@
+
+import multiprocessing
+import passwordmanager.database as database
+import passwordmanager.securestrings as securestrings
+
+PROCESSES = 6
+OPERATIONS = 20
+
+def worker(filename, number):
+    db = database.Database(filename)
+    session = db.unlock("test_master")
+    for i in range(OPERATIONS):
+        session.add_handle(f"handle{number}-{i}", f"password{number}-{i}")
+        assert session.get_password("shared_handle") == "shared_password"
+    session.lock(flush=number % 2)
+
+def test_concurrent_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(securestrings, "SCRYPT_LOG_N", 4)
+    monkeypatch.setattr(database, "JOURNAL_BATCH", 7)
+    db = database.Database(str(tmp_path / "testdb"))
+    db.save({"shared_handle": [0, "shared_password"]}, "test_master")
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=worker, args=(db.filename, number))
+                 for number in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0, "worker failed"
+
+    data = db.unlock("test_master")
+    handles = dict((handle, popularity)
+                   for popularity, handle in data.get_handles())
+    assert len(handles) == PROCESSES * OPERATIONS + 1, "added handle lost"
+    assert handles["shared_handle"] == PROCESSES * OPERATIONS, \
+            "popularity increment lost"
+    for number in range(PROCESSES):
+        assert data.get_password(f"handle{number}-0") == f"password{number}-0"
+    data.lock(flush=False)
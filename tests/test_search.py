@@ -0,0 +1,35 @@
+
+from passwordmanager.search import HandleIndex
+
+HANDLES = ["GitHub", "gmail", "bank", "work github", "Gitlab"]
+
+def test_search():
+    index = HandleIndex(HANDLES)
+    assert index.search("") == HANDLES
+    assert index.search("g") == ["GitHub", "gmail", "work github", "Gitlab"]
+    assert index.search("gi") == ["GitHub", "work github", "Gitlab"]
+    assert index.search("git") == ["GitHub", "work github", "Gitlab"]
+    assert index.search("gith") == ["GitHub", "work github"]
+    assert index.search("lab") == ["Gitlab"]
+    assert index.search("xyz") == []
+
+def test_update():
+    index = HandleIndex(HANDLES)
+    index.search("git")
+    index.update(["Gitlab", "bank", "new git"])
+    assert index.search("git") == ["Gitlab", "new git"], \
+            "index not updated"
+    assert "GitHub" not in index.lower, "removed handle still indexed"
+
+def test_match():
+    index = HandleIndex(HANDLES + ["github"])
+    assert index.match("GitHub")[0] == (3, "GitHub"), "exact match not first"
+    assert [handle for score, handle in index.match("gitlab")][:1] == \
+            ["Gitlab"], "case insensitive match not first"
+    assert index.match("gihtub")[0][1] in ("GitHub", "github"), \
+            "misspelling not matched"
+    assert "bank" not in [handle for score, handle in index.match("gihtub")]
+    popularity = {"GitHub": 0, "github": 50, "work github": 0}
+    assert index.match("githu", lambda h: popularity.get(h, 0))[0][1] == "github", \
+            "popularity not used to rank"
+    assert index.match("") == []
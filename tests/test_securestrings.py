@@ -0,0 +1,80 @@
+
+import io
+import passwordmanager.securestrings as securestrings
+
+def test_seal():
+    key = securestrings.derive_key("test_master", log_n=10)
+    other = securestrings.derive_key("other_master", log_n=10)
+    sealed = securestrings.seal(b"secret", key, b"kind")
+    assert securestrings.unseal(sealed, key, b"kind") == b"secret", \
+            "sealed data not unsealed"
+    tampered = bytearray(sealed)
+    tampered[securestrings.NONCE_SIZE] ^= 1
+    for data, data_key, associated in ((sealed, other, b"kind"),
+                                       (bytes(tampered), key, b"kind"),
+                                       (sealed, key, b"other"),
+                                       (sealed[:-1], key, b"kind")):
+        try:
+            securestrings.unseal(data, data_key, associated)
+            assert False, "changed data unsealed"
+        except ValueError:
+            pass
+
+def test_key_check(tmp_path):
+    filename = str(tmp_path / "string")
+    securestrings.save_string(filename, "test_master", "secret")
+    key = securestrings.load_key(filename, "test_master")
+    assert securestrings.load_string(filename, key) == "secret", \
+            "string not loaded"
+    try:
+        securestrings.load_key(filename, "wrong_master")
+        assert False, "wrong password not rejected by key check"
+    except ValueError:
+        pass
+
+def test_cbc_string(tmp_path):
+    filename = str(tmp_path / "string")
+    key = securestrings.derive_key("test_master")
+    with open(filename, "wb") as fo:
+        fo.write(key.header(1, check=False))
+        fo.write(securestrings.encrypt(b"secret", key))
+    assert securestrings.load_string(filename, "test_master") == "secret", \
+            "string in the older format not loaded"
+
+def stream_round_trip(data, key, chunk_size=16):
+    encrypted = io.BytesIO()
+    securestrings.encrypt_stream(io.BytesIO(data), encrypted, key, chunk_size)
+    decrypted = io.BytesIO()
+    securestrings.decrypt_stream(io.BytesIO(encrypted.getvalue()),
+                                 decrypted, key)
+    return encrypted.getvalue(), decrypted.getvalue()
+
+def test_stream():
+    key = securestrings.derive_key("test_master", log_n=10)
+    for size in (0, 1, 15, 16, 17, 64, 100):
+        data = bytes(range(256))[:size]
+        encrypted, decrypted = stream_round_trip(data, key)
+        assert decrypted == data, f"stream of {size} bytes not decrypted"
+
+def test_stream_rejects_changes():
+    key = securestrings.derive_key("test_master", log_n=10)
+    other = securestrings.derive_key("other_master", log_n=10)
+    encrypted, decrypted = stream_round_trip(b"x" * 40, key)
+    tampered = bytearray(encrypted)
+    tampered[securestrings.STREAM_HEADER.size + 8] ^= 1
+    for stream, stream_key in ((encrypted, other),
+                               (bytes(tampered), key),
+                               (encrypted[:-1], key),
+                               (encrypted[:-16 - 8 - 5], key)):
+        try:
+            securestrings.decrypt_stream(io.BytesIO(stream), io.BytesIO(),
+                                         stream_key)
+            assert False, "changed stream decrypted"
+        except ValueError:
+            pass
+
+if __name__ == "__main__":
+    test_seal()
+    test_stream()
+    test_stream_rejects_changes()
+    print("test passed")
@@ -0,0 +1,29 @@
+
+import sys
+import subprocess
+
+HEAVY = ("pyperclip", "Crypto", "tkinter")
+
+def imported_after(code):
+    """Return which heavy modules are imported after running code in a
+    new interpreter."""
+    check = code + f"""
+import sys, threading
+print(",".join(name for name in {HEAVY!r} if name in sys.modules))
+print(threading.active_count())
+"""
+    output = subprocess.run([sys.executable, "-c", check], check=True,
+                            capture_output=True, text=True).stdout.split("\n")
+    return [name for name in output[0].split(",") if name], int(output[1])
+
+def test_cli_imports():
+    modules, threads = imported_after(
+        "import passwordmanager.cli, passwordmanager.agent")
+    assert modules == [], f"pman imported {modules} before they were needed"
+
+def test_controller_imports():
+    modules, threads = imported_after(
+        "from passwordmanager.controller import MainController\n"
+        "MainController()")
+    assert modules == ["Crypto"], f"controller imported {modules}"
+    assert threads == 1, "timeout thread started before it was needed"
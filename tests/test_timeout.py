@@ -0,0 +1,70 @@
+
+import time
+import threading
+from passwordmanager.timeout import Scheduler, Timeout
+
+LATE = 0.5 # seconds a deadline may fire late by on a loaded machine
+
+def test_accuracy():
+    scheduler = Scheduler()
+    fired = {}
+    done = threading.Event()
+
+    def record(name):
+        def callback():
+            fired[name] = time.monotonic()
+            if len(fired) == 3:
+                done.set()
+        return callback
+
+    start = time.monotonic()
+    for name, delay in (("lock", 0.15), ("clipboard", 0.05),
+                        ("dialogue", 0.1)):
+        scheduler.set(name, delay, record(name))
+    assert done.wait(2), "deadlines didn't fire"
+    assert sorted(fired, key=fired.get) == ["clipboard", "dialogue", "lock"]
+    for name, delay in (("clipboard", 0.05), ("dialogue", 0.1),
+                        ("lock", 0.15)):
+        late = fired[name] - start - delay
+        assert late >= 0, f"{name} fired {-late:.4f} s early"
+        assert late < LATE, f"{name} fired {late:.4f} s late"
+
+def test_idle_wakeups():
+    scheduler = Scheduler()
+    fired = threading.Event()
+    scheduler.set("clipboard", 0.05, fired.set)
+    assert fired.wait(1)
+    time.sleep(0.05)
+    wakeups = scheduler.wakeups
+    time.sleep(0.3)
+    assert scheduler.wakeups == wakeups, "scheduler woke while idle"
+    assert wakeups <= 2, f"{wakeups} wakeups for one deadline"
+
+def test_reset_and_cancel():
+    scheduler = Scheduler()
+    calls = []
+    timeout = Timeout(0.05, lambda: calls.append("lock"), scheduler, "lock")
+    timeout.add_callback(lambda: calls.append("clear"))
+    for i in range(20):
+        timeout.trigger()
+    scheduler.set("dialogue", 0.02, lambda: calls.append("dialogue"))
+    scheduler.cancel("dialogue")
+    assert scheduler.remaining("dialogue") is None
+    time.sleep(0.2)
+    assert calls == ["lock", "clear"], "retriggered timeout fired wrongly"
+    assert scheduler.wakeups <= 3, "retriggering woke the scheduler"
+    assert len(scheduler.heap) == 0, "stale deadlines left in the heap"
+
+def test_clipboard_timeout(monkeypatch):
+    import pyperclip
+    from passwordmanager import controller
+    copied = []
+    monkeypatch.setattr(pyperclip, "copy", copied.append)
+    main = controller.MainController(controller.CLIPBOARD_TIMEOUT * 10)
+    main._copy_to_clipboard("secret")
+    assert copied == ["secret"]
+    assert main.scheduler.remaining("clipboard") <= \
+            controller.CLIPBOARD_TIMEOUT, "clipboard kept for the lock timeout"
+    assert main.scheduler.remaining("lock") > controller.CLIPBOARD_TIMEOUT
+    main.scheduler.cancel("clipboard")
+    main.scheduler.cancel("lock")
@@ -0,0 +1,52 @@
+
+import io
+import json
+import pytest
+import passwordmanager.securestrings as securestrings
+from passwordmanager import transfer
+
+def test_merge():
+    entries = [("a", "1"), ("b", "2"), ("a", "3"), ("c", "4")]
+    existing = {"b", "c", "c (2)"}
+    assert transfer.merge(entries, existing, "skip") == (
+            {"a": "3"},
+            {"read": 4, "added": 1, "replaced": 0, "skipped": 2,
+             "renamed": 0})
+    assert transfer.merge(entries, existing, "replace")[0] == \
+            {"a": "3", "b": "2", "c": "4"}
+    assert transfer.merge(entries, existing, "rename")[0] == \
+            {"a": "1", "b (2)": "2", "a (2)": "3", "c (3)": "4"}
+    with pytest.raises(ValueError):
+        transfer.merge(entries, existing, "overwrite")
+
+def test_json_formats():
+    lines = io.StringIO('{"handle": "a", "password": "1"}\n\n'
+                        '{"handle": "b", "password": ""}\n')
+    assert list(transfer.read_jsonl(lines)) == [("a", "1")]
+    bitwarden = {"items": [{"name": "site", "login": {"password": "pw"}},
+                           {"name": "card", "type": 3}]}
+    assert list(transfer.read_json(io.StringIO(json.dumps(bitwarden)))) == \
+            [("site", "pw")]
+    keepass = io.StringIO('"Group","Title","Username","Password"\n'
+                          '"Root","mail","me","secret"\n')
+    assert list(transfer.read_csv(keepass)) == [("mail", "secret")]
+    for document in ('[1, 2]', '["a"]', '{"items": 3}', '7',
+                     '[{"name": "site", "password": 5}]',
+                     '[{"name": ["site"], "password": "pw"}]',
+                     '[{"name": "site", "login": "pw"}]'):
+        with pytest.raises(ValueError):
+            list(transfer.read_json(io.StringIO(document)))
+    with pytest.raises(ValueError):
+        list(transfer.read_jsonl(io.StringIO('"a"\n')))
+
+def test_export_stream(monkeypatch):
+    monkeypatch.setattr(securestrings, "SCRYPT_LOG_N", 4)
+    monkeypatch.setattr(securestrings, "CHUNK_SIZE", 100)
+    entries = [(f"handle{i}", f"pass\n\"{i}\"") for i in range(50)]
+    fo = io.BytesIO()
+    assert transfer.write_export(iter(entries), fo, "export") == 50
+    fo.seek(0)
+    assert transfer.read_export(fo, "export") == entries
+    fo.seek(0)
+    with pytest.raises(ValueError):
+        transfer.read_export(fo, "wrong")
@@ -0,0 +1,83 @@
+
+import time
+import heapq
+import itertools
+import pytest
+from passwordmanager.worker import Worker
+
+class Loop(object):
+    """Stand in for Tk's main loop. Runs callbacks scheduled with after
+    on this thread and records how long each one stalls the loop."""
+    def __init__(self):
+        self.queue = []
+        self.order = itertools.count()
+        self.stalls = []
+
+    def after(self, delay, callback):
+        heapq.heappush(self.queue, (time.monotonic() + delay / 1000,
+                                    next(self.order), callback))
+
+    def call(self, callback, *args):
+        start = time.perf_counter()
+        callback(*args)
+        self.stalls.append(time.perf_counter() - start)
+
+    def run(self, until, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not until():
+            assert time.monotonic() < deadline, "main loop timed out"
+            if self.queue and self.queue[0][0] <= time.monotonic():
+                self.call(heapq.heappop(self.queue)[2])
+            else:
+                time.sleep(0.001)
+
+def slow(value, seconds=0.2):
+    time.sleep(seconds)
+    return value
+
+def test_worker_does_not_stall():
+    loop = Loop()
+    worker = Worker(loop.after)
+    results = []
+    loop.call(worker.submit, slow, ("done",), results.append)
+    assert worker.busy
+    loop.run(lambda: results)
+    assert results == ["done"]
+    assert not worker.busy
+    assert max(loop.stalls) < 0.05, "worker stalled the main loop"
+
+def test_worker_coalesces():
+    loop = Loop()
+    worker = Worker(loop.after)
+    results = []
+    for value in ("first", "second", "third"):
+        worker.submit(slow, (value, 0.05), results.append)
+    loop.run(lambda: not worker.busy)
+    assert results == ["first", "third"], "waiting calls not coalesced"
+
+def test_worker_raises_on_main_loop():
+    loop = Loop()
+    worker = Worker(loop.after)
+
+    def fail():
+        raise KeyError("missing")
+
+    worker.submit(fail, (), None)
+    with pytest.raises(KeyError):
+        loop.run(lambda: False)
+    assert not worker.busy
+
+def test_worker_reports_errors():
+    loop = Loop()
+    worker = Worker(loop.after)
+    results = []
+    errors = []
+
+    def fail():
+        raise KeyError("missing")
+
+    worker.submit(fail, (), results.append, errors.append)
+    worker.submit(slow, ("next", 0.05), results.append, errors.append)
+    loop.run(lambda: not worker.busy)
+    assert results == ["next"], "waiting call not run after an error"
+    assert [type(error) for error in errors] == [KeyError]